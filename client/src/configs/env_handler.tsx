@@ -1,5 +1,3 @@
 export const API_URL = import.meta.env.VITE_API_URL;
 
-export const BUILD_MACHINE_URL = import.meta.env.VITE_BUILD_MACHINE_URL;
-
 export const GOOGLE_CLIENT_ID = import.meta.env.VITE_GOOGLE_CLIENT_ID;
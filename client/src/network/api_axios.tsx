@@ -1,12 +1,8 @@
 import axios from "axios";
 import { toast } from "react-toastify";
-import { API_URL, BUILD_MACHINE_URL } from "../configs/env_handler";
+import { API_URL } from "../configs/env_handler";
 import { ProjectType } from "../dtos/project_types";
 
-const buildMachineInstance = axios.create({
-  baseURL: BUILD_MACHINE_URL,
-});
-
 const instance = axios.create({
   baseURL: API_URL,
 });
@@ -19,14 +15,6 @@ instance.interceptors.request.use((config) => {
   return config;
 });
 
-buildMachineInstance.interceptors.request.use((config) => {
-  const session = localStorage.getItem("apiToken");
-  if (session) {
-    config.headers.Authorization = `Bearer ${session}`;
-  }
-  return config;
-});
-
 instance.interceptors.response.use(
   (response) => {
     return response;
@@ -39,18 +27,6 @@ instance.interceptors.response.use(
   },
 );
 
-buildMachineInstance.interceptors.response.use(
-  (response) => {
-    return response;
-  },
-  (error) => {
-    if (error.response?.status !== 401 && error.response?.data?.detail) {
-      toast.error(error.response.data.detail);
-    }
-    return Promise.reject(error);
-  },
-);
-
 export async function isAuthenticated() {
   const token = localStorage.getItem("apiToken");
 
@@ -270,21 +246,85 @@ export async function deleteProject(id: string) {
   return response.data;
 }
 
-export async function deployProject(
-  presignedUrl: string,
-  projectName: string,
-  region: string,
-  projectId: string,
-  databaseName: string,
-) {
-  const response = await buildMachineInstance.post("/project-build", {
-    presigned_url: presignedUrl,
-    project_name: projectName,
-    region: region,
-    project_id: projectId,
-    database_name: databaseName,
+export type BuildJob = {
+  id: string;
+  status: string;
+  result: { deployment_url: string; database_uri: string } | null;
+  error: string | null;
+};
+
+export async function deployProject(id: string): Promise<BuildJob> {
+  const response = await instance.post(`/v1/project/build/${id}`);
+  return response.data.job;
+}
+
+export async function getBuild(jobId: string): Promise<BuildJob> {
+  const response = await instance.get(`/v1/project/build/${jobId}`);
+  return response.data.job;
+}
+
+// Follows the server-sent events of a deploy and resolves with the finished job
+export async function followBuild(
+  jobId: string,
+  onEvent: (event: string, data: Record<string, unknown>) => void = () => {},
+): Promise<BuildJob> {
+  const token = localStorage.getItem("apiToken");
+  const response = await fetch(`${API_URL}/v1/project/build/${jobId}/logs`, {
+    headers: {
+      Authorization: `Bearer ${token}`,
+    },
   });
-  return response.data;
+
+  const reader = response.body?.getReader();
+  if (!response.ok || !reader) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  try {
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) {
+        break;
+      }
+
+      buffer += decoder.decode(value, { stream: true });
+      const messages = buffer.split("\n\n");
+      buffer = messages.pop() || "";
+
+      for (const message of messages) {
+        let event = "message";
+        let data = "";
+        for (const line of message.split("\n")) {
+          if (line.startsWith("event: ")) {
+            event = line.slice(7);
+          } else if (line.startsWith("data: ")) {
+            data += line.slice(6);
+          }
+        }
+        if (!data) {
+          continue;
+        }
+
+        const payload = JSON.parse(data);
+        onEvent(event, payload);
+        if (event === "error" && !payload.id) {
+          // Reported by the API itself, the build could not be followed
+          throw new Error(payload.detail || "Build machine unavailable");
+        }
+        if (event === "done" || event === "error") {
+          return payload as BuildJob;
+        }
+      }
+    }
+  } finally {
+    reader.releaseLock();
+  }
+
+  // The stream broke off before the build finished
+  return getBuild(jobId);
 }
 
 export async function getUser() {
@@ -11,6 +11,7 @@ import {
   generateBackendRequirements,
   checkProjectS3,
   deployProject,
+  followBuild,
 } from "../network/api_axios";
 import axios from "axios";
 import { useFetchOnce } from "../hooks/useFetchOnce";
@@ -711,38 +712,36 @@ export const Project = () => {
   const handleDeploy = async () => {
     setIsDeploying(true);
     try {
-      const response = await getProject(id || "");
-      if (response && response.project && response.project.s3_presigned_url) {
-        const deployResponse = await deployProject(
-          response.project.s3_presigned_url,
-          response.project.name,
-          response.project.region,
-          response.project._id,
-          response.project.database_name,
-        );
-        if (deployResponse.status === "success") {
-          const baseUrl = deployResponse.deployment_url;
-          console.log("Base URL:", baseUrl);
-
-          // Set the base URL immediately
-          setFinalDeploymentUrl(baseUrl);
-          setDeploymentUrls({
-            deployment_url: baseUrl,
-            database_uri: deployResponse.database_uri,
-          });
+      const job = await deployProject(id || "");
+      const build = await followBuild(job.id, (event, data) => {
+        if (event === "log") {
+          console.log("Build:", data.line);
+        }
+      });
+      if (build.status === "succeeded" && build.result) {
+        const baseUrl = build.result.deployment_url;
+        console.log("Base URL:", baseUrl);
 
-          // Show modal first
-          setShowUrlsModal(true);
+        // Set the base URL immediately
+        setFinalDeploymentUrl(baseUrl);
+        setDeploymentUrls({
+          deployment_url: baseUrl,
+          database_uri: build.result.database_uri,
+        });
 
-          // Then check for /api/docs
-          try {
-            const finalUrl = await checkApiDocs(baseUrl);
-            console.log("Final URL:", finalUrl);
-            setFinalDeploymentUrl(finalUrl);
-          } catch (error) {
-            console.error("Error checking /api/docs:", error);
-          }
+        // Show modal first
+        setShowUrlsModal(true);
+
+        // Then check for /api/docs
+        try {
+          const finalUrl = await checkApiDocs(baseUrl);
+          console.log("Final URL:", finalUrl);
+          setFinalDeploymentUrl(finalUrl);
+        } catch (error) {
+          console.error("Error checking /api/docs:", error);
         }
+      } else {
+        throw new Error(build.error || "Deployment failed");
       }
     } catch (error) {
       console.error("Deployment failed:", error);
@@ -1,20 +1,90 @@
+import asyncio
+import time
 import uuid
 from abc import ABC, abstractmethod
 from typing import Any, List, Optional, Tuple
 
 import google.generativeai as genai
-from agents.utils import LLMClient, LLMProvider, ModelConfig
-from config.env_handler import LANGFUSE_HOST, LANGFUSE_PUBLIC_KEY, LANGFUSE_SECRET_KEY
+from agents.response_cache import ResponseCache, response_cache
+from agents.utils import LLMClient, LLMProvider, ModelConfig, llm_router
+from config.env_handler import (
+    LANGFUSE_HOST,
+    LANGFUSE_PUBLIC_KEY,
+    LANGFUSE_SECRET_KEY,
+    LLM_FIRST_TOKEN_TIMEOUT_SECONDS,
+    LLM_REQUEST_TIMEOUT_SECONDS,
+)
 from config.logger import logger
 from dtos.agent import AgentOptions
+from fastapi import HTTPException, status
 from fastapi.responses import StreamingResponse
 from langfuse import Langfuse
 from langfuse.decorators import langfuse_context, observe
-from openai import OpenAI
+from openai import AsyncOpenAI
+from services.admission_controller import Ticket, admission_controller
+from services.quota_service import quota_service
+from services.usage_meter import usage_meter
+from utils.token_counter import count_tokens
 
 # Token limits
 MAX_INPUT_TOKENS = 4_096_000
 MAX_OUTPUT_TOKENS = 32_768
+# Prompts longer than this are tokenized in a worker thread
+TOKENIZE_IN_THREAD_CHARS = 100_000
+
+
+def _gemini_usage(response) -> Tuple[int, int]:
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return 0, 0
+    return usage.prompt_token_count or 0, usage.candidates_token_count or 0
+
+
+async def _replay(chunks: List[str]):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _cache_stream(stream, key: str, context: str, cache_input: str, model: str, input_tokens: int):
+    """Pass a response stream through and cache it once it completed."""
+    chunks = []
+    async for chunk in stream:
+        chunks.append(chunk)
+        yield chunk
+    output = "".join(chunks)
+    if output:
+        response_cache.put(key, context, cache_input, chunks, model, input_tokens, count_tokens(output, model))
+
+
+class _StreamAttempt:
+    """One model's stream while the router waits for a first token."""
+
+    def __init__(self, model: str, reserved: int, ticket: Ticket):
+        self.model = model
+        # The admission slot on the model's provider, held until the attempt is closed
+        self.ticket = ticket
+        # Set once a hedge was tried for this attempt
+        self.hedged = False
+        # Filled from the final stream events, the estimate stays charged if they never arrive
+        self.usage = {"input": reserved, "output": 0}
+        self.stream = None
+        self.first_chunk: Optional[asyncio.Task] = None
+        self.started = 0.0
+
+    def start(self, stream):
+        self.stream = stream
+        self.started = time.monotonic()
+        self.first_chunk = asyncio.ensure_future(stream.__anext__())
+
+    async def close(self):
+        try:
+            if self.first_chunk is not None and not self.first_chunk.done():
+                self.first_chunk.cancel()
+                await asyncio.gather(self.first_chunk, return_exceptions=True)
+            await self.stream.aclose()
+        finally:
+            self.ticket.release()
+
 
 class Agent(ABC):
     @property
@@ -27,8 +97,10 @@ class Agent(ABC):
 
     llm_client = LLMClient()
 
-    def __init__(self, langfuse_session_id: str):
+    def __init__(self, langfuse_session_id: str, user_id: Optional[str] = None):
         self.langfuse_session_id = langfuse_session_id
+        # Token usage is charged to this user when set
+        self.user_id = user_id
 
     @abstractmethod
     def chat(
@@ -54,152 +126,414 @@ class Agent(ABC):
         streaming: bool = False,
         json_mode: bool = False,
         max_tokens: Optional[int] = None,
+        cache_input: Optional[str] = None,
     ):
+        """
+        Ask the model, `cache_input` marks the response as cacheable. It should be the
+        part of the prompt that varies between requests, the similarity tier of the
+        response cache compares it against earlier inputs.
+        """
         if model is None:
             model = ModelConfig.DEFAULT_MODELS[LLMProvider.OPENAI]
 
         # Validate token limits
         if max_tokens is not None and max_tokens > MAX_OUTPUT_TOKENS:
             raise ValueError(f"Maximum output tokens cannot exceed {MAX_OUTPUT_TOKENS}")
-        
-        # Calculate approximate input tokens (rough estimation)
-        input_tokens = len(system_prompt.split()) + len(prompt.split())
+
+        # Estimated locally, oversized prompts are rejected before any network call
+        if len(system_prompt) + len(prompt) > TOKENIZE_IN_THREAD_CHARS:
+            input_tokens = await asyncio.to_thread(count_tokens, system_prompt + prompt, model)
+        else:
+            input_tokens = count_tokens(system_prompt + prompt, model)
         if input_tokens > MAX_INPUT_TOKENS:
             raise ValueError(f"Input tokens exceed maximum limit of {MAX_INPUT_TOKENS}")
 
-        provider = ModelConfig.get_model_provider(model)
-        logger.info(f"Using model: {model} from provider: {provider.value}")
-
-        langfuse_context.update_current_trace(
-            name=f"Agent - {self.name}",
-            metadata={
-                "model": model,
-                "streaming": streaming,
-            },
-            session_id=self.langfuse_session_id,
-        )
-
-        if streaming:
-            return await self._stream(system_prompt, prompt, model, json_mode, max_tokens)
-        return self._shoot(system_prompt, prompt, model, json_mode, max_tokens)
+        if cache_input is not None:
+            cache_context = ResponseCache.context_key(
+                self.name, self.user_id, model, system_prompt, json_mode, max_tokens
+            )
+            cache_key = ResponseCache.key(cache_context, prompt)
+            cached = response_cache.get(cache_key, cache_context, cache_input)
+            if cached is not None:
+                logger.info(f"Serving cached response for {self.name}")
+                # A cached response is charged like the call it replaces
+                await self._charge(cached.input_tokens + cached.output_tokens)
+                if streaming:
+                    return StreamingResponse(_replay(cached.chunks), media_type="text/plain")
+                return cached.text
 
-    async def _stream(self, system_prompt: str, prompt: str, model: str, json_mode: bool, max_tokens: int):
-        provider = ModelConfig.get_model_provider(model)
-        client = self.llm_client.get_client(provider, streaming=True)
+        candidates = llm_router.candidates(model)
+        provider = ModelConfig.get_model_provider(candidates[0])
+        logger.info(f"Using model: {candidates[0]} from provider: {provider.value}")
 
+        # Waits in the fair queue until the provider's rate limits and the user's concurrency allow the call,
+        # failover and hedge attempts are admitted against their own provider by the router
+        ticket = await admission_controller.acquire(self.user_id, provider, input_tokens, max_tokens)
         try:
-            async def event_generator():
-                logger.info(
-                    f"Attempting to ask: {prompt}",
-                )
+            # Reserve the estimate, the usage reported by the provider settles it afterwards
+            await self._charge(input_tokens)
 
-                if provider == LLMProvider.OPENAI:
-                    openai_client: OpenAI = client
-                    async with openai_client.beta.chat.completions.stream(
-                        messages=[
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": prompt},
-                        ],
-                        model=model,
-                        **({"response_format": {"type": "json_object"}} if json_mode else {}),
-                        **({"max_tokens": max_tokens} if max_tokens is not None else {}),
-                    ) as stream:
-                        async for event in stream:
-                            if event.type == "content.delta":
-                                yield event.delta
-
-                elif provider == LLMProvider.ANTHROPIC:
-                    anthropic_client = client
-                    message = await anthropic_client.messages.create(
-                        messages=[
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": prompt},
-                        ],
-                        model=model,
-                        max_tokens=4096,
-                        stream=True,
-                    )
-                    async for event in message:
-                        if event.type == "content_block_delta":
-                            yield event.delta.text
-                elif provider == LLMProvider.GEMINI:
-                    gemini_model = genai.GenerativeModel(model)
-                    chat = gemini_model.start_chat(history=[])
-                    if system_prompt:
-                        chat.send_message(system_prompt)
-                    
-                    response = await chat.send_message_async(
-                        prompt,
-                        stream=True,
-                        generation_config=genai.types.GenerationConfig(
-                            **({"max_output_tokens": max_tokens} if max_tokens is not None else {}),
-                        )
+            langfuse_context.update_current_trace(
+                name=f"Agent - {self.name}",
+                metadata={
+                    "model": model,
+                    "streaming": streaming,
+                },
+                session_id=self.langfuse_session_id,
+            )
+
+            if streaming:
+                # The slot is held until the stream has been consumed
+                response = await self._stream(
+                    system_prompt, prompt, model, json_mode, max_tokens, input_tokens, candidates, ticket
+                )
+                if cache_input is not None:
+                    response.body_iterator = _cache_stream(
+                        response.body_iterator, cache_key, cache_context, cache_input, model, input_tokens
                     )
-                    async for chunk in response:
-                        if chunk.text:
-                            yield chunk.text
-                else:
-                    raise ValueError(f"Unknown model provider: {provider}")
+                return response
 
-            return StreamingResponse(
-                event_generator(),
-                media_type="text/plain",
+            response = await self._shoot(
+                system_prompt, prompt, model, json_mode, max_tokens, input_tokens, candidates, ticket
             )
+        except BaseException:
+            ticket.release()
+            raise
+        ticket.release()
 
-        except Exception as e:
-            error_message = f"{str(e.__class__.__name__)}: {str(e)}"
-            logger.error(f"Agent Response Error: {error_message}")
-            raise Exception(f"An error occurred while processing your request: {error_message}")
+        if cache_input is not None and response:
+            response_cache.put(
+                cache_key, cache_context, cache_input, [response], model, input_tokens, count_tokens(response, model)
+            )
+        return response
 
-    def _shoot(self, system_prompt: str, prompt: str, model: str, json_mode: bool, max_tokens: int):
-        provider = ModelConfig.get_model_provider(model)
-        client = self.llm_client.get_client(provider, streaming=False)
+    async def _charge(self, tokens: int):
+        if self.user_id and not await quota_service.charge(self.user_id, tokens):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="You have reached the maximum number of tokens, please upgrade your subscription",
+            )
+
+    def _record_usage(self, model: str, input_tokens: int, output_tokens: int, reserved: int):
+        logger.info(f"Token usage for {model}: {input_tokens} input, {output_tokens} output")
+        usage_meter.record(self.user_id, model, input_tokens, output_tokens, reserved)
+
+    @staticmethod
+    def _response_error(error: Exception) -> Exception:
+        error_message = f"{str(error.__class__.__name__)}: {str(error)}"
+        logger.error(f"Agent Response Error: {error_message}")
+        return Exception(f"An error occurred while processing your request: {error_message}")
+
+    async def _stream(
+        self,
+        system_prompt: str,
+        prompt: str,
+        model: str,
+        json_mode: bool,
+        max_tokens: int,
+        reserved: int = 0,
+        candidates: Optional[List[str]] = None,
+        ticket: Optional[Ticket] = None,
+    ):
+        logger.info(
+            f"Attempting to ask: {prompt}",
+        )
+        return StreamingResponse(
+            self._routed_stream(system_prompt, prompt, model, json_mode, max_tokens, reserved, candidates, ticket),
+            media_type="text/plain",
+        )
+
+    async def _routed_stream(
+        self,
+        system_prompt: str,
+        prompt: str,
+        model: str,
+        json_mode: bool,
+        max_tokens: int,
+        reserved: int,
+        candidates: Optional[List[str]] = None,
+        ticket: Optional[Ticket] = None,
+    ):
+        """
+        Stream from the first candidate model that produces a token.
+
+        A candidate that fails or times out before its first token is replaced by
+        the next one. When the first token takes longer than the provider's p95,
+        the next candidate is started as a hedge and whichever stream starts first
+        is kept. Once tokens flow the stream is committed to its model.
+
+        `ticket` admits the first candidate, every other attempt is admitted
+        against the provider it calls. A hedge only starts if that provider can
+        take it right away.
+        """
+        candidates = list(candidates or llm_router.candidates(model))
+        attempts: List[_StreamAttempt] = []
+        winner: Optional[_StreamAttempt] = None
+        last_error: Optional[Exception] = None
+
+        async def start_next(hedge: bool = False) -> bool:
+            nonlocal ticket
+            candidate = candidates[0]
+            if ticket is None:
+                provider = ModelConfig.get_model_provider(candidate)
+                if hedge:
+                    ticket = await admission_controller.try_acquire(self.user_id, provider, reserved, max_tokens)
+                    if ticket is None:
+                        logger.info(f"Not hedging {self.name} request on {candidate}, {provider.value} is busy")
+                        return False
+                else:
+                    ticket = await admission_controller.acquire(self.user_id, provider, reserved, max_tokens)
+            candidates.pop(0)
+            if candidate != model:
+                logger.warning(f"Routing {self.name} request from {model} to {candidate}")
+            attempt = _StreamAttempt(candidate, reserved, ticket)
+            ticket = None
+            attempt.start(self._stream_model(system_prompt, prompt, candidate, json_mode, max_tokens, attempt.usage))
+            attempts.append(attempt)
+            return True
 
         try:
-            logger.info(
-                f"Attempting to ask: {prompt}",
-            )
-            logger.info(f"Max tokens: {max_tokens}")
-            if provider == LLMProvider.OPENAI:
-                openai_client: OpenAI = client
-                response = openai_client.chat.completions.create(
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": prompt},
-                    ],
-                    model=model,
-                    **({"response_format": {"type": "json_object"}} if json_mode else {}),
-                    **({"max_tokens": max_tokens} if max_tokens is not None else {}),
+            await start_next()
+            while winner is None:
+                if not attempts:
+                    if not candidates:
+                        raise self._response_error(last_error)
+                    llm_router.failovers += 1
+                    await start_next()
+                    continue
+
+                now = time.monotonic()
+                deadlines = [attempt.started + LLM_FIRST_TOKEN_TIMEOUT_SECONDS for attempt in attempts]
+                hedge_delay = (
+                    llm_router.hedge_delay(attempts[0].model)
+                    if len(attempts) == 1 and candidates and not attempts[0].hedged
+                    else None
                 )
-                return response.choices[0].message.content
-            elif provider == LLMProvider.ANTHROPIC:
-                anthropic_client = client
-                response = anthropic_client.messages.create(
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": prompt},
-                    ],
-                    model=model,
-                    max_tokens=4096,
+                if hedge_delay is not None:
+                    deadlines.append(attempts[0].started + hedge_delay)
+                done, _ = await asyncio.wait(
+                    [attempt.first_chunk for attempt in attempts],
+                    timeout=max(min(deadlines) - now, 0),
+                    return_when=asyncio.FIRST_COMPLETED,
                 )
-                return response.content[0].text
-            elif provider == LLMProvider.GEMINI:
-                gemini_model = genai.GenerativeModel(model)
-                chat = gemini_model.start_chat(history=[])
-                if system_prompt:
-                    chat.send_message(system_prompt)
-                
-                response = chat.send_message(
-                    prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        **({"max_output_tokens": max_tokens} if max_tokens is not None else {}),
-                    )
+
+                if not done:
+                    now = time.monotonic()
+                    timed_out = [
+                        attempt for attempt in attempts if now - attempt.started >= LLM_FIRST_TOKEN_TIMEOUT_SECONDS
+                    ]
+                    for attempt in timed_out:
+                        last_error = asyncio.TimeoutError(f"No first token from {attempt.model}")
+                        llm_router.record_failure(attempt.model, last_error)
+                        attempts.remove(attempt)
+                        await attempt.close()
+                    if hedge_delay is not None and len(attempts) == 1 and now - attempts[0].started >= hedge_delay:
+                        attempts[0].hedged = True
+                        if await start_next(hedge=True):
+                            llm_router.hedges += 1
+                    continue
+
+                for attempt in list(attempts):
+                    if attempt.first_chunk not in done or winner is not None:
+                        continue
+                    error = attempt.first_chunk.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        winner = attempt
+                        continue
+                    llm_router.record_failure(attempt.model, error)
+                    attempts.remove(attempt)
+                    await attempt.close()
+                    if not llm_router.should_fail_over(error):
+                        raise self._response_error(error)
+                    logger.warning(f"{attempt.model} failed before its first token: {str(error)}")
+                    last_error = error
+
+            for attempt in attempts:
+                if attempt is not winner:
+                    await attempt.close()
+            if winner is not attempts[0]:
+                llm_router.hedge_wins += 1
+            attempts = [winner]
+            llm_router.record_success(winner.model, time.monotonic() - winner.started, first_token=True)
+
+            if winner.first_chunk.exception() is None:
+                yield winner.first_chunk.result()
+                try:
+                    async for chunk in winner.stream:
+                        yield chunk
+                except Exception as e:
+                    llm_router.record_failure(winner.model, e)
+                    raise self._response_error(e)
+        finally:
+            if ticket is not None:
+                ticket.release()
+            for attempt in attempts:
+                await attempt.close()
+            if winner is not None:
+                self._record_usage(winner.model, winner.usage["input"], winner.usage["output"], reserved)
+
+    async def _stream_model(
+        self, system_prompt: str, prompt: str, model: str, json_mode: bool, max_tokens: int, usage: dict
+    ):
+        """Stream one model's response, filling `usage` from the final stream events."""
+        provider = ModelConfig.get_model_provider(model)
+        client = self.llm_client.get_client(provider)
+
+        if provider == LLMProvider.OPENAI:
+            openai_client: AsyncOpenAI = client
+            async with openai_client.beta.chat.completions.stream(
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt},
+                ],
+                model=model,
+                stream_options={"include_usage": True},
+                **({"response_format": {"type": "json_object"}} if json_mode else {}),
+                **({"max_tokens": max_tokens} if max_tokens is not None else {}),
+            ) as stream:
+                async for event in stream:
+                    if event.type == "content.delta":
+                        yield event.delta
+                    elif event.type == "chunk" and event.chunk.usage:
+                        usage["input"] = event.chunk.usage.prompt_tokens
+                        usage["output"] = event.chunk.usage.completion_tokens
+
+        elif provider == LLMProvider.ANTHROPIC:
+            anthropic_client = client
+            message = await anthropic_client.messages.create(
+                system=system_prompt,
+                messages=[
+                    {"role": "user", "content": prompt},
+                ],
+                model=model,
+                max_tokens=4096,
+                stream=True,
+            )
+            async for event in message:
+                if event.type == "content_block_delta":
+                    yield event.delta.text
+                elif event.type == "message_start":
+                    usage["input"] = event.message.usage.input_tokens
+                elif event.type == "message_delta":
+                    usage["output"] = event.usage.output_tokens
+        elif provider == LLMProvider.GEMINI:
+            gemini_model = genai.GenerativeModel(model)
+            chat = gemini_model.start_chat(history=[])
+            system_usage = (0, 0)
+            if system_prompt:
+                system_response = await chat.send_message_async(system_prompt)
+                system_usage = _gemini_usage(system_response)
+
+            response = await chat.send_message_async(
+                prompt,
+                stream=True,
+                generation_config=genai.types.GenerationConfig(
+                    **({"max_output_tokens": max_tokens} if max_tokens is not None else {}),
+                ),
+            )
+            async for chunk in response:
+                if chunk.text:
+                    yield chunk.text
+            input_tokens, output_tokens = _gemini_usage(response)
+            usage["input"] = system_usage[0] + input_tokens
+            usage["output"] = system_usage[1] + output_tokens
+        else:
+            raise ValueError(f"Unknown model provider: {provider}")
+
+    async def _shoot(
+        self,
+        system_prompt: str,
+        prompt: str,
+        model: str,
+        json_mode: bool,
+        max_tokens: int,
+        reserved: int = 0,
+        candidates: Optional[List[str]] = None,
+        ticket: Optional[Ticket] = None,
+    ):
+        """Ask the candidates in turn, `ticket` admits the first one and every failover is admitted on its own."""
+        logger.info(
+            f"Attempting to ask: {prompt}",
+        )
+        logger.info(f"Max tokens: {max_tokens}")
+
+        candidates = candidates or llm_router.candidates(model)
+        for index, candidate in enumerate(candidates):
+            if candidate != model:
+                logger.warning(f"Routing {self.name} request from {model} to {candidate}")
+            if ticket is None:
+                provider = ModelConfig.get_model_provider(candidate)
+                ticket = await admission_controller.acquire(self.user_id, provider, reserved, max_tokens)
+            started = time.monotonic()
+            try:
+                text, input_tokens, output_tokens = await asyncio.wait_for(
+                    self._shoot_model(system_prompt, prompt, candidate, json_mode, max_tokens),
+                    timeout=LLM_REQUEST_TIMEOUT_SECONDS,
                 )
-                return response.text
-            else:
-                raise ValueError(f"Unknown model provider: {provider}")
-
-        except Exception as e:
-            error_message = f"{str(e.__class__.__name__)}: {str(e)}"
-            logger.error(f"Agent Response Error: {error_message}")
-            raise Exception(f"An error occurred while processing your request: {error_message}")
+            except Exception as e:
+                llm_router.record_failure(candidate, e)
+                if index == len(candidates) - 1 or not llm_router.should_fail_over(e):
+                    raise self._response_error(e)
+                logger.warning(f"{candidate} failed, failing over: {str(e)}")
+                llm_router.failovers += 1
+                continue
+            finally:
+                ticket.release()
+                ticket = None
+
+            llm_router.record_success(candidate, time.monotonic() - started)
+            self._record_usage(candidate, input_tokens, output_tokens, reserved)
+            return text
+
+    async def _shoot_model(
+        self, system_prompt: str, prompt: str, model: str, json_mode: bool, max_tokens: int
+    ) -> Tuple[str, int, int]:
+        """Ask one model, returns the response text with its input and output tokens."""
+        provider = ModelConfig.get_model_provider(model)
+        client = self.llm_client.get_client(provider)
+
+        if provider == LLMProvider.OPENAI:
+            openai_client: AsyncOpenAI = client
+            response = await openai_client.chat.completions.create(
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt},
+                ],
+                model=model,
+                **({"response_format": {"type": "json_object"}} if json_mode else {}),
+                **({"max_tokens": max_tokens} if max_tokens is not None else {}),
+            )
+            return (
+                response.choices[0].message.content,
+                response.usage.prompt_tokens,
+                response.usage.completion_tokens,
+            )
+        elif provider == LLMProvider.ANTHROPIC:
+            anthropic_client = client
+            response = await anthropic_client.messages.create(
+                system=system_prompt,
+                messages=[
+                    {"role": "user", "content": prompt},
+                ],
+                model=model,
+                max_tokens=4096,
+            )
+            return response.content[0].text, response.usage.input_tokens, response.usage.output_tokens
+        elif provider == LLMProvider.GEMINI:
+            gemini_model = genai.GenerativeModel(model)
+            chat = gemini_model.start_chat(history=[])
+            input_tokens, output_tokens = 0, 0
+            if system_prompt:
+                system_response = await chat.send_message_async(system_prompt)
+                input_tokens, output_tokens = _gemini_usage(system_response)
+
+            response = await chat.send_message_async(
+                prompt,
+                generation_config=genai.types.GenerationConfig(
+                    **({"max_output_tokens": max_tokens} if max_tokens is not None else {}),
+                ),
+            )
+            prompt_tokens, completion_tokens = _gemini_usage(response)
+            return response.text, input_tokens + prompt_tokens, output_tokens + completion_tokens
+        else:
+            raise ValueError(f"Unknown model provider: {provider}")
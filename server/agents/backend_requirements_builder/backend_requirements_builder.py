@@ -16,8 +16,8 @@ class BackendRequirementsAgent(Agent):
     def name(self) -> str:
         return AgentType.BACKEND_REQUIREMENTS
 
-    def __init__(self, langfuse_session_id: str):
-        super().__init__(langfuse_session_id)
+    def __init__(self, langfuse_session_id: str, user_id: Optional[str] = None):
+        super().__init__(langfuse_session_id, user_id)
         self.system_prompt = ""
         self.agent_prompt = ""
 
@@ -40,4 +40,5 @@ class BackendRequirementsAgent(Agent):
             model=model,
             streaming=options.streaming,
             json_mode=False,
+            cache_input=message,
         )
@@ -1,4 +1,4 @@
-from typing import Any, List, Tuple
+from typing import Any, List, Optional, Tuple
 
 from agents.agent import Agent
 from agents.agent_factory import AgentType
@@ -73,8 +73,8 @@ class EnchantUserPromptAgent(Agent):
     def name(self) -> str:
         return AgentType.ENCHANT_USER_PROMPT
 
-    def __init__(self, langfuse_session_id: str):
-        super().__init__(langfuse_session_id)
+    def __init__(self, langfuse_session_id: str, user_id: Optional[str] = None):
+        super().__init__(langfuse_session_id, user_id)
         self.system_prompt = ""
         self.agent_prompt = ""
 
@@ -97,4 +97,5 @@ class EnchantUserPromptAgent(Agent):
             model=model,
             streaming=options.streaming,
             max_tokens=options.max_tokens,
+            cache_input=message,
         )
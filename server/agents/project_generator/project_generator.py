@@ -249,8 +249,8 @@ class ProjectGeneratorAgent(Agent):
     def name(self) -> str:
         return AgentType.PROJECT_GENERATOR
 
-    def __init__(self, langfuse_session_id: str):
-        super().__init__(langfuse_session_id)
+    def __init__(self, langfuse_session_id: str, user_id: Optional[str] = None):
+        super().__init__(langfuse_session_id, user_id)
         self.system_prompt = ""
         self.agent_prompt = ""
 
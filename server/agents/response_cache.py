@@ -0,0 +1,175 @@
+import hashlib
+import math
+import re
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, NamedTuple, Optional
+
+from agents.utils import ModelConfig
+from config.env_handler import (
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+    RESPONSE_CACHE_SIZE,
+    RESPONSE_CACHE_TTL_SECONDS,
+)
+
+WHITESPACE = re.compile(r"\s+")
+NGRAM_SIZE = 3
+# Bounds the work of a similarity lookup on a large cache
+SIMILARITY_SCAN_LIMIT = 256
+
+
+def normalize(text: str) -> str:
+    return WHITESPACE.sub(" ", text).strip().casefold()
+
+
+def embed(text: str) -> Dict[str, float]:
+    """Unit-length bag of character trigrams, cheap enough to compute on every request."""
+    text = f" {normalize(text)} "
+    counts = Counter(text[i : i + NGRAM_SIZE] for i in range(max(len(text) - NGRAM_SIZE + 1, 1)))
+    norm = math.sqrt(sum(count * count for count in counts.values()))
+    return {ngram: count / norm for ngram, count in counts.items()}
+
+
+def cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(ngram, 0.0) for ngram, weight in a.items())
+
+
+class CachedResponse(NamedTuple):
+    chunks: List[str]
+    context: str
+    vector: Dict[str, float]
+    model: str
+    input_tokens: int
+    output_tokens: int
+    expires_at: float
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+
+class ResponseCache:
+    """
+    LRU/TTL cache of LLM responses for agents whose output only depends on the prompt.
+
+    The exact tier is keyed by a hash of the user, the normalized prompts, the model
+    and the generation options, so a new prompt version never hits old entries and
+    responses are never shared between users. The opt-in similarity tier compares
+    the user's input against entries of the same context (agent, user, model, system
+    prompt and options) by cosine similarity of their trigram vectors and is
+    disabled with the default threshold of 0. Streamed responses keep their
+    chunks so a hit replays the same stream.
+    """
+
+    def __init__(
+        self,
+        max_size: int = RESPONSE_CACHE_SIZE,
+        ttl: int = RESPONSE_CACHE_TTL_SECONDS,
+        similarity_threshold: float = RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self.dollars_saved = 0.0
+
+    @staticmethod
+    def _hash(*parts) -> str:
+        return hashlib.sha256("\x00".join(str(part) for part in parts).encode()).hexdigest()
+
+    @classmethod
+    def context_key(
+        cls,
+        agent: str,
+        user_id: Optional[str],
+        model: str,
+        system_prompt: str,
+        json_mode: bool,
+        max_tokens: Optional[int],
+    ) -> str:
+        return cls._hash(agent, user_id, model, normalize(system_prompt), json_mode, max_tokens)
+
+    @classmethod
+    def key(cls, context: str, prompt: str) -> str:
+        return cls._hash(context, normalize(prompt))
+
+    def get(self, key: str, context: str, cache_input: str) -> Optional[CachedResponse]:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= now:
+            del self._entries[key]
+            entry = None
+        if entry is not None:
+            self.exact_hits += 1
+        elif self.similarity_threshold > 0:
+            key, entry = self._most_similar(context, embed(cache_input), now)
+            if entry is not None:
+                self.similar_hits += 1
+
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.tokens_saved += entry.input_tokens + entry.output_tokens
+        self.dollars_saved += ModelConfig.get_cost(entry.model, entry.input_tokens, entry.output_tokens)
+        return entry
+
+    def _most_similar(self, context: str, vector: Dict[str, float], now: float):
+        best_key, best_entry, best_score = None, None, self.similarity_threshold
+        scanned = 0
+        for key in reversed(self._entries):
+            entry = self._entries[key]
+            if entry.context != context or entry.expires_at <= now:
+                continue
+            score = cosine(vector, entry.vector)
+            if score >= best_score:
+                best_key, best_entry, best_score = key, entry, score
+            scanned += 1
+            if scanned >= SIMILARITY_SCAN_LIMIT:
+                break
+        return best_key, best_entry
+
+    def put(
+        self,
+        key: str,
+        context: str,
+        cache_input: str,
+        chunks: List[str],
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+    ):
+        self._entries[key] = CachedResponse(
+            chunks=chunks,
+            context=context,
+            vector=embed(cache_input) if self.similarity_threshold > 0 else {},
+            model=model,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            expires_at=time.monotonic() + self.ttl,
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.similar_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            "tokens_saved": self.tokens_saved,
+            "dollars_saved": round(self.dollars_saved, 4),
+        }
+
+
+response_cache = ResponseCache()
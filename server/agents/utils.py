@@ -1,5 +1,9 @@
+import asyncio
 import os
+import time
+from collections import deque
 from enum import Enum
+from typing import Dict, List, Optional
 
 import google.generativeai as genai
 import openai
@@ -9,6 +13,12 @@ from config.env_handler import (
     GOOGLE_API_KEY,
     LANGFUSE_PUBLIC_KEY,
     LANGFUSE_SECRET_KEY,
+    LLM_COOLDOWN_SECONDS,
+    LLM_ERROR_RATE_THRESHOLD,
+    LLM_FAILOVER,
+    LLM_HEDGE_MIN_DELAY_SECONDS,
+    LLM_HEDGING,
+    LLM_STATS_WINDOW,
     OPENAI_API_KEY,
 )
 from langfuse import Langfuse
@@ -40,10 +50,11 @@ class LLMClient:
             secret_key=LANGFUSE_SECRET_KEY,
         )
 
-    def get_client(self, provider: LLMProvider, streaming: bool = False):
+    def get_client(self, provider: LLMProvider):
+        """Return the async client for a provider, agents must never block the event loop."""
         clients = {
-            LLMProvider.OPENAI: self.openai_async if streaming else self.openai,
-            LLMProvider.ANTHROPIC: (self.anthropic_async if streaming else self.anthropic),
+            LLMProvider.OPENAI: self.openai_async,
+            LLMProvider.ANTHROPIC: self.anthropic_async,
             LLMProvider.GEMINI: self.gemini,
         }
         return clients[provider]
@@ -56,6 +67,32 @@ class ModelConfig:
         LLMProvider.GEMINI: "gemini-2.0-flash",
     }
 
+    # USD per million input and output tokens, matched by the longest model name prefix
+    PRICING = {
+        "gpt-4o-mini": (0.15, 0.60),
+        "gpt-4o": (2.50, 10.00),
+        "gpt-4.1-nano": (0.10, 0.40),
+        "gpt-4.1-mini": (0.40, 1.60),
+        "gpt-4.1": (2.00, 8.00),
+        "claude-3-opus": (15.00, 75.00),
+        "claude-3-5-haiku": (0.80, 4.00),
+        "claude-3-5-sonnet": (3.00, 15.00),
+        "claude-3-7-sonnet": (3.00, 15.00),
+        "claude-sonnet-4": (3.00, 15.00),
+        "gemini-2.0-flash": (0.10, 0.40),
+        "gemini-2.5-flash": (0.30, 2.50),
+        "gemini-2.5-pro": (1.25, 10.00),
+        "gemini-1.5-pro": (1.25, 5.00),
+    }
+
+    @staticmethod
+    def get_cost(model_name: str, input_tokens: int, output_tokens: int) -> float:
+        prefixes = [prefix for prefix in ModelConfig.PRICING if model_name.startswith(prefix)]
+        if not prefixes:
+            return 0.0
+        input_price, output_price = ModelConfig.PRICING[max(prefixes, key=len)]
+        return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
     @staticmethod
     def get_model_provider(model_name: str) -> LLMProvider:
         if model_name.startswith("gpt"):
@@ -66,3 +103,162 @@ class ModelConfig:
             return LLMProvider.GEMINI
         else:
             raise ValueError(f"Unknown model provider for model: {model_name}")
+
+
+# Errors worth retrying on another provider, matched by status code or by class name
+FAILOVER_STATUS_CODES = {408, 429, 500, 502, 503, 504, 529}
+FAILOVER_ERRORS = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "DeadlineExceeded",
+    "InternalServerError",
+    "OverloadedError",
+    "RateLimitError",
+    "ResourceExhausted",
+    "ServiceUnavailable",
+    "TooManyRequests",
+}
+# Samples needed before latency percentiles are trusted
+MIN_LATENCY_SAMPLES = 20
+
+
+def _error_status(error: Exception) -> Optional[int]:
+    code = getattr(error, "status_code", None) or getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def _percentile(samples, pct: float) -> Optional[float]:
+    if len(samples) < MIN_LATENCY_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class ProviderStats:
+    """Rolling latency and error window of one provider."""
+
+    def __init__(self, window: int = LLM_STATS_WINDOW):
+        self.first_token_latencies = deque(maxlen=window)
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    @property
+    def degraded(self) -> bool:
+        return time.monotonic() < self.cooldown_until or (
+            len(self.outcomes) >= 5 and self.error_rate > LLM_ERROR_RATE_THRESHOLD
+        )
+
+    def stats(self) -> dict:
+        p95_first_token = _percentile(self.first_token_latencies, 95)
+        p95 = _percentile(self.latencies, 95)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate, 4),
+            "degraded": self.degraded,
+            "p95_first_token_seconds": round(p95_first_token, 3) if p95_first_token is not None else None,
+            "p95_latency_seconds": round(p95, 3) if p95 is not None else None,
+        }
+
+
+class LLMRouter:
+    """
+    Picks the model that serves a request and when to fail over or hedge.
+
+    The requested model goes first unless its provider is degraded, either
+    cooling down after a rate limit or failing more than the error-rate
+    threshold over the rolling window. Equivalent models of the other
+    configured providers follow, healthiest and fastest first.
+    """
+
+    # Models of similar capability and price on the other providers
+    EQUIVALENT_MODELS = {
+        "gpt-4o-mini": ["gemini-2.0-flash", "claude-3-5-haiku-latest"],
+        "gpt-4o": ["claude-3-7-sonnet-latest", "gemini-2.5-pro"],
+        "claude-3-5-haiku-latest": ["gpt-4o-mini", "gemini-2.0-flash"],
+        "claude-3-7-sonnet-latest": ["gpt-4o", "gemini-2.5-pro"],
+        "claude-3-opus-latest": ["gpt-4o", "gemini-2.5-pro"],
+        "gemini-2.0-flash": ["gpt-4o-mini", "claude-3-5-haiku-latest"],
+        "gemini-2.5-pro": ["gpt-4o", "claude-3-7-sonnet-latest"],
+    }
+    API_KEYS = {
+        LLMProvider.OPENAI: OPENAI_API_KEY,
+        LLMProvider.ANTHROPIC: ANTHROPIC_API_KEY,
+        LLMProvider.GEMINI: GOOGLE_API_KEY,
+    }
+
+    def __init__(self):
+        self.providers: Dict[LLMProvider, ProviderStats] = {provider: ProviderStats() for provider in LLMProvider}
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _stats(self, model: str) -> ProviderStats:
+        return self.providers[ModelConfig.get_model_provider(model)]
+
+    def candidates(self, model: str) -> List[str]:
+        if not LLM_FAILOVER:
+            return [model]
+        models = [model] + [
+            equivalent
+            for equivalent in self.EQUIVALENT_MODELS.get(model, [])
+            if self.API_KEYS[ModelConfig.get_model_provider(equivalent)]
+        ]
+
+        def rank(candidate: str):
+            stats = self._stats(candidate)
+            p95 = _percentile(stats.first_token_latencies, 95)
+            return stats.degraded, candidate != model, p95 if p95 is not None else float("inf")
+
+        return sorted(models, key=rank)
+
+    @staticmethod
+    def should_fail_over(error: Exception) -> bool:
+        if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+            return True
+        return _error_status(error) in FAILOVER_STATUS_CODES or error.__class__.__name__ in FAILOVER_ERRORS
+
+    def hedge_delay(self, model: str) -> Optional[float]:
+        """Seconds to wait for a first token before hedging, None until enough samples exist."""
+        if not LLM_HEDGING:
+            return None
+        p95 = _percentile(self._stats(model).first_token_latencies, 95)
+        return max(p95, LLM_HEDGE_MIN_DELAY_SECONDS) if p95 is not None else None
+
+    def record_success(self, model: str, latency: float, first_token: bool = False):
+        stats = self._stats(model)
+        stats.calls += 1
+        stats.outcomes.append(True)
+        (stats.first_token_latencies if first_token else stats.latencies).append(latency)
+
+    def record_failure(self, model: str, error: Exception):
+        stats = self._stats(model)
+        stats.calls += 1
+        stats.errors += 1
+        stats.outcomes.append(False)
+        if _error_status(error) == 429 or error.__class__.__name__ in ("RateLimitError", "ResourceExhausted"):
+            response = getattr(error, "response", None)
+            retry_after = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+            try:
+                cooldown = float(retry_after)
+            except (TypeError, ValueError):
+                cooldown = LLM_COOLDOWN_SECONDS
+            stats.cooldown_until = time.monotonic() + cooldown
+
+    def stats(self) -> dict:
+        return {
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "providers": {provider.value: stats.stats() for provider, stats in self.providers.items()},
+        }
+
+
+llm_router = LLMRouter()
@@ -5,7 +5,7 @@ from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from middleware.error_handler import create_error_handler
 from middleware.exception_handlers import handle_validation_exception
-from routes import auth, chat, project
+from routes import auth, chat, metrics, project
 
 app = FastAPI(
     lifespan=lifespan,
@@ -48,6 +48,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 app.include_router(auth.router, prefix="/v1/auth", tags=["Auth"])
 app.include_router(project.router, prefix="/v1/project", tags=["Projects"])
 app.include_router(chat.router, prefix="/v1/chat", tags=["Chat"])
+app.include_router(metrics.router, prefix="/v1/metrics", tags=["Metrics"])
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,27 +1,37 @@
-import glob
-import io
-import os
-import re
-import shutil
-import subprocess
-import tempfile
-import time
-import uuid
-import zipfile
+from contextlib import asynccontextmanager
+from typing import Optional
 
-import aiohttp
-from dotenv import load_dotenv
 from dtos.project import ProjectData
-from fastapi import Depends, FastAPI, status
+from fastapi import Depends, FastAPI, Header, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from fastapi.security import HTTPBearer
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from services.analysis_cache import analysis_cache
+from services.build_queue import build_queue
+from services.core_notifier import core_notifier
+from services.dependency_cache import dependency_cache
+from services.deploy_config import deploy_config_transformer
+from services.genezio_session import GenezioSessionError, genezio_session
+from services.log_stream import stream_job_events
+from services.workspace import workspace_manager
 
-load_dotenv()
+security = HTTPBearer()
 
-token = os.getenv("GENEZIO_TOKEN")
 
-security = HTTPBearer()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await workspace_manager.start()
+    await dependency_cache.start()
+    analysis_cache.load()
+    await genezio_session.start()
+    await core_notifier.start()
+    await build_queue.start()
+    yield
+    await build_queue.stop()
+    await core_notifier.stop()
+    await genezio_session.stop()
+    await workspace_manager.stop()
+
 
 app = FastAPI(
     title="Build Machine",
@@ -35,6 +45,7 @@ app = FastAPI(
         "url": "https://github.com/cristim67/bachelor-project",
         "email": "miloiuc4@gmail.com",
     },
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -49,42 +60,31 @@ app.add_middleware(
 async def health():
     return JSONResponse(status_code=status.HTTP_200_OK, content={"status": "ok"})
 
-@app.get("/genezio-login")
-async def genezio_login():
-    print("Running genezio login...")
-    print(f"Using token: {token[:10]}...")  # Only print first 10 chars for security
-    
-    result = subprocess.run(
-        ["genezio", "login", token], 
-        capture_output=True, 
-        text=True, 
-        env={"CI": "true", **os.environ}
+@app.get("/stats")
+async def stats():
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "status": "ok",
+            "analysis_cache": analysis_cache.stats(),
+            "builds": build_queue.stats(),
+            "core_notifier": core_notifier.stats(),
+            "dependency_cache": dependency_cache.stats(),
+            "deploy_config": deploy_config_transformer.stats(),
+            "genezio_session": genezio_session.stats(),
+            "workspaces": workspace_manager.stats(),
+        },
     )
-    print("Login stdout:", result.stdout)
-    if result.stderr:
-        print("Login stderr:", result.stderr)
-    if result.returncode != 0:
-        print(f"Login failed with return code: {result.returncode}")
-        return JSONResponse(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            content={"status": "error", "message": f"Login failed: {result.stderr}"}
-        )
 
-    print("Running genezio account...")
-    account_result = subprocess.run(
-        ["genezio", "account"], 
-        capture_output=True, 
-        text=True, 
-        env={"CI": "true", **os.environ}
-    )
-    print("Account stdout:", account_result.stdout)
-    if account_result.stderr:
-        print("Account stderr:", account_result.stderr)
-    if account_result.returncode != 0:
-        print(f"Account check failed with return code: {account_result.returncode}")
+@app.get("/genezio-login")
+async def genezio_login():
+    """Log the shared genezio session in again."""
+    try:
+        login_result, account_result = await genezio_session.login()
+    except GenezioSessionError as e:
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            content={"status": "error", "message": f"Account check failed: {account_result.stderr}"}
+            content={"status": "error", "message": str(e)}
         )
 
     return JSONResponse(
@@ -92,302 +92,67 @@ async def genezio_login():
         content={
             "status": "ok", 
             "result": {
-                "login_output": result.stdout,
+                "login_output": login_result.stdout,
                 "account_output": account_result.stdout
             }
         }
     )
 
-def cleanup_tmp():
-    """Clean up /tmp directory."""
-    try:
-        genezio_tmp = "/tmp/genezio-*"
-        for dir_path in glob.glob(genezio_tmp):
-            try:
-                shutil.rmtree(dir_path)
-                print(f"Cleaned up genezio temp dir: {dir_path}")
-            except Exception as e:
-                print(f"Error cleaning up {dir_path}: {str(e)}")
-
-        app_tmp = "/tmp/tmp*"
-        for dir_path in glob.glob(app_tmp):
-            try:
-                shutil.rmtree(dir_path)
-                print(f"Cleaned up app temp dir: {dir_path}")
-            except Exception as e:
-                print(f"Error cleaning up {dir_path}: {str(e)}")
-    except Exception as e:
-        print(f"Error during cleanup: {str(e)}")
-
 @app.post("/project-build")
-async def project_build(request: ProjectData, credentials: HTTPBearer = Depends(security)):
-    presigned_url = request.presigned_url
-    project_name = request.project_name
-    region = request.region
-    project_id = request.project_id
-    database_name = request.database_name
-    
-    max_retries = 3
-    retry_count = 0
-    
-    while retry_count < max_retries:
-        try:
-            cleanup_tmp()
-            
-            temp_dir = tempfile.mkdtemp() + str(uuid.uuid4())
-            async with aiohttp.ClientSession() as session:
-                async with session.get(presigned_url) as response:
-                    if response.status != 200:
-                        raise Exception(f"Failed to download from S3: {response.status}")
-                    project_zip = await response.read()
-        
-            with zipfile.ZipFile(io.BytesIO(project_zip), "r") as zip_ref:
-                zip_ref.extractall(temp_dir)
-
-            code_zip_path = os.path.join(temp_dir, "code", "code.zip")
-            with zipfile.ZipFile(code_zip_path, "r") as code_zip_ref:
-                code_zip_ref.extractall(os.path.join(temp_dir, "code"))
-
-            print("Project directory tree after unzip:")
-            tree_result = subprocess.run(["tree", temp_dir, "-L", "2"], capture_output=True, text=True, env={"CI": "true", **os.environ})
-            print(tree_result.stdout)
-            if tree_result.stderr:
-                print("Tree errors:", tree_result.stderr)
-        
-            code_dir = os.path.join(temp_dir, "code")
-            print(f"Checking code directory at: {code_dir}")
-            if not os.path.exists(code_dir):
-                raise Exception(f"Code directory not found at {code_dir}")
-            
-            print(f"Code directory contents:")
-            for item in os.listdir(code_dir):
-                print(f"- {item}")
-
-            print(f"Running genezio analyze in directory: {code_dir}")
-            print(f"Project name: {project_name}")
-            print(f"Region: {region}")
-            
-            if not project_name or not isinstance(project_name, str):
-                raise Exception(f"Invalid project name: {project_name}")
-            if not region or not isinstance(region, str):
-                raise Exception(f"Invalid region: {region}")
-            
-            try:
-                print("Running genezio login with token:", token[:10] + "...")  # Only print first 10 chars
-                login_result = subprocess.run(
-                    ["genezio", "login", token], 
-                    capture_output=True, 
-                    text=True, 
-                    env={"CI": "true", **os.environ}
-                )
-                print("Login stdout:", login_result.stdout)
-                if login_result.stderr:
-                    print("Login stderr:", login_result.stderr)
-                if login_result.returncode != 0:
-                    raise Exception(f"Login failed with return code {login_result.returncode}: {login_result.stderr}")
+async def project_build(request: ProjectData, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """
+    Deploy a project and wait for the result, the build runs on the worker pool.
 
-                print("Running genezio account command:")
-                account_result = subprocess.run(
-                    ["genezio", "account"], 
-                    capture_output=True, 
-                    text=True, 
-                    env={"CI": "true", **os.environ}
-                )
-                print("Account stdout:", account_result.stdout)
-                if account_result.stderr:
-                    print("Account stderr:", account_result.stderr)
-                if account_result.returncode != 0:
-                    raise Exception(f"Account check failed with return code {account_result.returncode}: {account_result.stderr}")
+    Kept for older clients, new ones submit to /builds and follow /builds/{id}/logs.
+    """
+    job = build_queue.submit(request, credentials.credentials)
+    await job.wait_finished()
 
-                print("Running genezio analyze command with:")
-                print(f"Command: genezio analyze --name {project_name} --region {region}")
-                print(f"Working directory: {code_dir}")
-                print(f"Environment variables: CI=true, GENEZIO_TOKEN=***, GENEZIO_NO_TELEMETRY=1, HOME=/tmp")
-                
-                analyze_result = subprocess.run(
-                    ["genezio", "analyze", "--name", project_name, "--region", region], 
-                    capture_output=True, 
-                    text=True,
-                    cwd=code_dir,
-                    env={"CI": "true",
-                         "GENEZIO_TOKEN": token,
-                         "GENEZIO_NO_TELEMETRY": "1",
-                         "HOME":"/tmp"}
-                )
-                print("Analyze stdout:", analyze_result.stdout)
-                if analyze_result.stderr:
-                    print("Analyze stderr:", analyze_result.stderr)
-                if analyze_result.returncode != 0:
-                    raise Exception(f"Analyze failed with return code {analyze_result.returncode}: {analyze_result.stderr}")
-            except Exception as e:
-                print(f"Error during genezio analyze: {str(e)}")
-                raise
-
-            yaml_path = os.path.join(code_dir, "genezio.yaml")
-            print(f"Checking for genezio.yaml at: {yaml_path}")
-            if not os.path.exists(yaml_path):
-                raise Exception(f"genezio.yaml not found at {yaml_path}")
-
-            print(f"Reading genezio.yaml from: {yaml_path}")
-            with open(yaml_path, "r") as f:
-                yaml_content = f.read()
-                print("\nOriginal YAML content:")
-                print(yaml_content)
-                
-                print(f"\nUsing database name from request: {database_name}")
-                
-                db_name_matches = re.finditer(r'(services:\s+databases:\s+- name:\s*)[^\n]+', yaml_content)
-                print("\nDatabase name matches:")
-                for match in db_name_matches:
-                    print(f"Found: '{match.group(0)}'")
-                
-                yaml_content = re.sub(
-                    r'(services:\s+databases:\s+- name:\s*)[^\n]+',
-                    r'\1' + database_name,
-                    yaml_content
-                )
-                
-                uri_matches = re.finditer(r'(\${{services\.databases\.)[^\.]+(\.uri}})', yaml_content)
-                print("\nURI reference matches:")
-                for match in uri_matches:
-                    print(f"Found: '{match.group(0)}'")
-                
-                yaml_content = re.sub(
-                    r'(\${{services\.databases\.)[^\.]+(\.uri}})',
-                    r'\1' + database_name + r'\2',
-                    yaml_content
-                )
-                
-                print("\nModified YAML content:")
-                print(yaml_content)
-
-                with open(yaml_path, "w") as f:
-                    f.write(yaml_content)
-
-            print("Cat genezio.yaml file:")
-            with open(yaml_path, "r") as f:
-                print(f.read())
-
-            print("Running genezio deploy...")
-            while retry_count < max_retries:
-                deploy_result = subprocess.run(["genezio", "deploy"], 
-                                             capture_output=True, 
-                                             text=True,
-                                             cwd= code_dir,
-                                             env={"CI": "true",
-                                                  "GENEZIO_TOKEN": token,
-                                                  "GENEZIO_NO_TELEMETRY": "1",
-                                                  "HOME":"/tmp"})
-                print("Deploy output:", deploy_result.stdout)
-                if deploy_result.stderr:
-                    print("Deploy errors:", deploy_result.stderr)
-                
-                if "ENOSPC" in deploy_result.stdout or "ENOSPC" in deploy_result.stderr:
-                    if retry_count < max_retries - 1:
-                        print("No space left on device. Cleaning /tmp and retrying...")
-                        cleanup_tmp()
-                        retry_count += 1
-                        time.sleep(2) 
-                        continue
-                    else:
-                        raise Exception("No space left on device after multiple retries")
-                
-                break
-
-            unique_id = uuid.uuid4()
-            env_file_path = os.path.join("/tmp", f".env.{unique_id}")
-            print("Running genezio getenv...")
-            print(f"Command will write to: {env_file_path}")
-            getenv_result = subprocess.run(["genezio", "getenv", 
-                                          "--projectName", project_name,
-                                          "--output", f".env.{unique_id}",
-                                          "--format", "env"],
-                                         capture_output=True, 
-                                         text=True,
-                                         cwd="/tmp",
-                                         env={"CI": "true",
-                                              "GENEZIO_TOKEN": token,
-                                              "GENEZIO_NO_TELEMETRY": "1",
-                                              "HOME": "/tmp"})
-            print("Getenv return code:", getenv_result.returncode)
-            print("Getenv stdout:", getenv_result.stdout)
-            if getenv_result.stderr:
-                print("Getenv stderr:", getenv_result.stderr)
-            
-            if os.path.exists(env_file_path):
-                print(f"Environment file was created at: {env_file_path}")
-                with open(env_file_path, 'r') as f:
-                    print("File contents:", f.read())
-            else:
-                print(f"Environment file was NOT created at: {env_file_path}")
-
-            deploy_url_match = re.search(r'https://[a-zA-Z0-9-]+\.eu-central-1\.cloud\.genez\.io', deploy_result.stdout)
-            deploy_url_match_dev = re.search(r'https://[a-zA-Z0-9-]+\.dev-fkt\.cloud\.genez\.io', deploy_result.stdout)
-            deploy_url = deploy_url_match.group(0) if deploy_url_match else deploy_url_match_dev.group(0) if deploy_url_match_dev else None
-
-            # Extract genezio project ID from the deploy output
-            genezio_project_id_match = re.search(r'https://app\.genez\.io/project/([a-f0-9-]+)/', deploy_result.stdout)
-            genezio_project_id = genezio_project_id_match.group(1) if genezio_project_id_match else None
-
-            db_uri = None
-            if os.path.exists(env_file_path):
-                try:
-                    with open(env_file_path, 'r') as f:
-                        content = f.read()
-                        db_uri_match = re.search(r'(mongodb\+srv://[^\s]+|postgresql://[^\s]+)', content)
-                        if db_uri_match:
-                            db_uri = db_uri_match.group(1)
-                except Exception as e:
-                    print(f"Error reading environment file: {str(e)}")
-
-            if not deploy_url:
-                raise Exception("Failed to extract deployment URL from output")
-
-            print("Deploy URL:", deploy_url)
-            print("DB URI:", db_uri)
-            print("Genezio Project ID:", genezio_project_id)
-            async with aiohttp.ClientSession() as session:
-                data = {"deployment_url": deploy_url}
-                if db_uri:
-                    data["database_uri"] = db_uri
-                if genezio_project_id:
-                    data["genezio_project_id"] = genezio_project_id
-
-                async with session.put(f"{os.getenv('CORE_API_URL') or 'http://host.docker.internal:8080'}/v1/project/update/{project_id}/deployment-url", 
-                                    json=data,
-                                    headers={"Authorization": f"Bearer {credentials.credentials}"}) as response:
-                    if response.status != 200:
-                        raise Exception(f"Failed to update project in the database: {response.status}")
+    if job.status != "succeeded":
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
+            content={"status": "error", "job_id": job.id, "message": job.error}
+        )
 
-            return JSONResponse(
-                status_code=status.HTTP_200_OK, 
-                content={
-                    "status": "success",
-                    "deployment_url": deploy_url,
-                    "database_uri": db_uri,
-                }
-            )
+    return JSONResponse(
+        status_code=status.HTTP_200_OK, 
+        content={
+            "status": "success",
+            "job_id": job.id,
+            "deployment_url": job.result["deployment_url"],
+            "database_uri": job.result["database_uri"],
+        }
+    )
 
-        except Exception as e:
-            error_str = str(e)
-            print(f"Error during deployment (attempt {retry_count + 1}/{max_retries}): {error_str}")
-            
-            if "ENOSPC" in error_str and retry_count < max_retries - 1:
-                print("No space left on device. Cleaning /tmp and retrying...")
-                cleanup_tmp()
-                retry_count += 1
-                time.sleep(2) 
-                continue
-            else:
-                return JSONResponse(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, 
-                    content={"status": "error", "message": error_str}
-                )
-        finally:
-            cleanup_tmp()
+@app.post("/builds")
+async def submit_build(request: ProjectData, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    job = build_queue.submit(request, credentials.credentials)
+    return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"status": "queued", "job": job.to_dict()})
+
+@app.get("/builds/{job_id}")
+async def get_build(job_id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    job = build_queue.get(job_id, credentials.credentials)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Build not found")
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"status": "ok", "job": job.to_dict()})
+
+@app.get("/builds/{job_id}/logs")
+async def build_logs(
+    job_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    last_event_id: Optional[str] = Header(None),
+):
+    """Server-sent events with the build log and the deploy results as soon as they are printed."""
+    job = build_queue.get(job_id, credentials.credentials)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Build not found")
+    return StreamingResponse(
+        stream_job_events(job, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 if __name__ == "__main__":
     import uvicorn
 
-    cleanup_tmp()
     uvicorn.run(app, host="0.0.0.0", port=8081)
\ No newline at end of file
@@ -0,0 +1,28 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+GENEZIO_TOKEN = os.getenv("GENEZIO_TOKEN")
+CORE_API_URL = os.getenv("CORE_API_URL") or "http://host.docker.internal:8080"
+BUILD_WORKERS = int(os.getenv("BUILD_WORKERS", os.cpu_count() or 2))
+BUILD_JOB_TTL_SECONDS = int(os.getenv("BUILD_JOB_TTL_SECONDS", 3600))
+GENEZIO_COMMAND_TIMEOUT_SECONDS = int(os.getenv("GENEZIO_COMMAND_TIMEOUT_SECONDS", 900))
+BUILD_WORKSPACE_ROOT = os.getenv("BUILD_WORKSPACE_ROOT", "/tmp/build-workspaces")
+# Keep workspaces in memory, only worth it on instances with RAM to spare
+BUILD_WORKSPACE_TMPFS = os.getenv("BUILD_WORKSPACE_TMPFS", "false").lower() == "true"
+BUILD_WORKSPACE_QUOTA_BYTES = int(os.getenv("BUILD_WORKSPACE_QUOTA_BYTES", 1024 * 1024 * 1024))
+BUILD_WORKSPACE_MAX_AGE_SECONDS = int(os.getenv("BUILD_WORKSPACE_MAX_AGE_SECONDS", 3600))
+BUILD_WORKSPACE_JANITOR_SECONDS = int(os.getenv("BUILD_WORKSPACE_JANITOR_SECONDS", 60))
+GENEZIO_SESSION_CHECK_SECONDS = int(os.getenv("GENEZIO_SESSION_CHECK_SECONDS", 600))
+DEPENDENCY_CACHE_DIR = os.getenv("DEPENDENCY_CACHE_DIR", "/tmp/build-dependency-cache")
+DEPENDENCY_CACHE_MAX_BYTES = int(os.getenv("DEPENDENCY_CACHE_MAX_BYTES", 5 * 1024 * 1024 * 1024))
+ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR", "/tmp/build-analysis-cache")
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", 1000))
+NOTIFY_OUTBOX_DIR = os.getenv("NOTIFY_OUTBOX_DIR", "/tmp/build-outbox")
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", 10))
+NOTIFY_RETRY_BASE_SECONDS = float(os.getenv("NOTIFY_RETRY_BASE_SECONDS", 2))
+NOTIFY_RETRY_MAX_SECONDS = float(os.getenv("NOTIFY_RETRY_MAX_SECONDS", 300))
+NOTIFY_TIMEOUT_SECONDS = float(os.getenv("NOTIFY_TIMEOUT_SECONDS", 10))
+NOTIFY_MAX_CONNECTIONS = int(os.getenv("NOTIFY_MAX_CONNECTIONS", 20))
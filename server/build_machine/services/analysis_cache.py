@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import re
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from config.env_handler import ANALYSIS_CACHE_DIR, ANALYSIS_CACHE_MAX_ENTRIES
+from config.logger import logger
+
+IGNORED_DIRECTORIES = {"node_modules", ".git", ".genezio"}
+# What genezio analyze reads from package.json to detect the framework and the entry
+PACKAGE_FIELDS = ("type", "main", "module", "exports", "scripts", "dependencies", "devDependencies", "engines")
+ENTRY_POINT_NAMES = ("app.js", "app.mjs", "index.js", "index.mjs", "server.js", "server.mjs", "main.js", "main.mjs")
+SCRIPT_FILE_PATTERN = re.compile(r"[\w./-]+\.(?:js|mjs|cjs|ts)\b")
+
+
+def _read_package(code_dir: str) -> dict:
+    try:
+        with open(os.path.join(code_dir, "package.json"), "r") as f:
+            package = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return package if isinstance(package, dict) else {}
+
+
+def entry_points(code_dir: str, package: dict) -> List[str]:
+    """Files the project starts from: package.json main, files run by its scripts, conventional names."""
+    candidates = list(ENTRY_POINT_NAMES)
+    if isinstance(package.get("main"), str):
+        candidates.append(package["main"])
+    scripts = package.get("scripts")
+    if isinstance(scripts, dict):
+        for script in scripts.values():
+            if isinstance(script, str):
+                candidates.extend(SCRIPT_FILE_PATTERN.findall(script))
+
+    found = set()
+    for candidate in candidates:
+        path = os.path.normpath(candidate).replace(os.sep, "/")
+        if not path.startswith("..") and os.path.isfile(os.path.join(code_dir, path)):
+            found.add(path)
+    return sorted(found)
+
+
+def fingerprint(code_dir: str, project_name: str, region: str) -> str:
+    """
+    Structural fingerprint of a code tree as genezio analyze sees it.
+
+    It covers the file paths, the package.json fields analyze reads, the
+    content of the entry points and of an existing genezio.yaml, plus the
+    analyze arguments. Edits to any other file keep the fingerprint.
+    """
+    paths = []
+    for dir_path, dir_names, file_names in os.walk(code_dir):
+        dir_names[:] = [name for name in dir_names if name not in IGNORED_DIRECTORIES]
+        relative_dir = os.path.relpath(dir_path, code_dir)
+        for file_name in file_names:
+            paths.append(os.path.normpath(os.path.join(relative_dir, file_name)).replace(os.sep, "/"))
+
+    package = _read_package(code_dir)
+    hashed_files: Dict[str, str] = {}
+    for path in entry_points(code_dir, package) + (["genezio.yaml"] if "genezio.yaml" in paths else []):
+        with open(os.path.join(code_dir, path), "rb") as f:
+            hashed_files[path] = hashlib.sha256(f.read()).hexdigest()
+
+    structure = {
+        "project_name": project_name,
+        "region": region,
+        "paths": sorted(paths),
+        "package": {field: package[field] for field in PACKAGE_FIELDS if field in package},
+        "files": hashed_files,
+    }
+    return hashlib.sha256(json.dumps(structure, sort_keys=True).encode()).hexdigest()
+
+
+class AnalysisCache:
+    """
+    genezio.yaml files written by genezio analyze, keyed by the fingerprint of the analyzed tree.
+
+    Entries are files in `root`, so they survive restarts, and the least
+    recently used are removed beyond `max_entries`.
+    """
+
+    def __init__(self, root: str = ANALYSIS_CACHE_DIR, max_entries: int = ANALYSIS_CACHE_MAX_ENTRIES):
+        self.root = root
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.yaml")
+
+    def get(self, key: str) -> Optional[str]:
+        if key in self._entries:
+            try:
+                with open(self._path(key), "r") as f:
+                    source = f.read()
+                # Keeps the recency across restarts
+                os.utime(self._path(key))
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return source
+            except OSError:
+                del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, source: str):
+        os.makedirs(self.root, exist_ok=True)
+        staging = os.path.join(self.root, f".{key}.{uuid.uuid4().hex}")
+        with open(staging, "w") as f:
+            f.write(source)
+        os.replace(staging, self._path(key))
+        self._entries[key] = True
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            try:
+                os.remove(self._path(evicted))
+            except OSError:
+                pass
+
+    def load(self):
+        os.makedirs(self.root, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.root):
+            if entry.name.startswith("."):
+                os.remove(entry.path)
+            elif entry.name.endswith(".yaml"):
+                entries.append((entry.stat().st_mtime, entry.name[: -len(".yaml")]))
+        entries.sort()
+        for _, key in entries[: -self.max_entries or None]:
+            os.remove(self._path(key))
+        for _, key in entries[-self.max_entries :]:
+            self._entries[key] = True
+        logger.info(f"Loaded {len(self._entries)} cached analyses")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+analysis_cache = AnalysisCache()
@@ -0,0 +1,119 @@
+import asyncio
+import time
+import uuid
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from dtos.project import ProjectData
+
+FINISHED_STATUSES = ("succeeded", "failed")
+# Events kept per build, late subscribers miss the oldest log lines of very chatty builds
+MAX_EVENTS = 5000
+
+
+class BuildJob:
+    """One deploy of a project, with its events kept in memory for status and streaming."""
+
+    def __init__(self, data: ProjectData, credentials: str):
+        self.id = str(uuid.uuid4())
+        self.data = data
+        # The caller's bearer token, forwarded to the core API when the build finishes
+        self.credentials = credentials
+        self.status = "queued"
+        # (event, data) pairs, an event's id is its position counted from the first event of the build
+        self.events: List[Tuple[str, dict]] = []
+        self._first_event_id = 0
+        # Results picked out of the deploy output as soon as they show up
+        self.deployment: Dict[str, str] = {}
+        self.result: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # Seconds spent in each phase of the build, in the order they ran
+        self.phases: Dict[str, float] = {}
+        # Hit or miss of every cache the build looked up
+        self.cache: Dict[str, str] = {}
+        self._update = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def event_count(self) -> int:
+        return self._first_event_id + len(self.events)
+
+    def emit(self, event: str, data: dict):
+        self.events.append((event, data))
+        if len(self.events) > MAX_EVENTS:
+            dropped = len(self.events) - MAX_EVENTS
+            del self.events[:dropped]
+            self._first_event_id += dropped
+        self._notify()
+
+    def log(self, line: str):
+        self.emit("log", {"line": line})
+
+    @contextmanager
+    def phase(self, name: str):
+        self.emit("phase", {"name": name})
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+
+    def finish(self, status: str, result: Optional[dict] = None, error: Optional[str] = None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        self._notify()
+
+    def _notify(self):
+        update, self._update = self._update, asyncio.Event()
+        update.set()
+
+    async def wait_finished(self):
+        while not self.finished:
+            await self._update.wait()
+
+    async def follow(
+        self, after: int = -1, keepalive: Optional[float] = None
+    ) -> AsyncIterator[Optional[Tuple[int, str, dict]]]:
+        """
+        Yield (id, event, data) for every event after `after`, then new ones until the build finishes.
+
+        With `keepalive`, None is yielded whenever nothing happened for that many seconds.
+        """
+        next_id = after + 1
+        while True:
+            update = self._update
+            while next_id < self.event_count:
+                next_id = max(next_id, self._first_event_id)
+                event, data = self.events[next_id - self._first_event_id]
+                yield next_id, event, data
+                next_id += 1
+            if self.finished:
+                return
+            try:
+                await asyncio.wait_for(update.wait(), keepalive)
+            except asyncio.TimeoutError:
+                yield None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "project_id": self.data.project_id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "events": self.event_count,
+            "deployment": self.deployment,
+            "phases": {name: round(seconds, 3) for name, seconds in self.phases.items()},
+            "cache": self.cache,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from config.env_handler import BUILD_JOB_TTL_SECONDS, BUILD_WORKERS
+from config.logger import logger
+from dtos.project import ProjectData
+from services.build_job import BuildJob
+from services.project_builder import build_project
+
+# Finished builds the phase timings are computed over
+PHASE_WINDOW = 200
+
+
+class BuildQueue:
+    """
+    Runs deploys on a pool of concurrent workers.
+
+    Builds are queued in arrival order and `workers` of them run at the same
+    time, each in its own working directory. Finished jobs stay available for
+    status and log requests for `job_ttl` seconds.
+    """
+
+    def __init__(self, workers: int = BUILD_WORKERS, job_ttl: int = BUILD_JOB_TTL_SECONDS):
+        self.workers = workers
+        self.job_ttl = job_ttl
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._jobs: Dict[str, BuildJob] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._phase_samples: Dict[str, Deque[float]] = {}
+        self.succeeded = 0
+        self.failed = 0
+
+    def submit(self, data: ProjectData, credentials: str) -> BuildJob:
+        self._prune()
+        job = BuildJob(data, credentials)
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        logger.info(f"Queued build {job.id} for project {data.project_id}")
+        return job
+
+    def get(self, job_id: str, credentials: str) -> Optional[BuildJob]:
+        job = self._jobs.get(job_id)
+        if job is None or job.credentials != credentials:
+            return None
+        return job
+
+    def _prune(self):
+        expired_before = time.time() - self.job_ttl
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished_at < expired_before]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Started {self.workers} build workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                result = await build_project(job)
+                job.finish("succeeded", result=result)
+                self.succeeded += 1
+            except asyncio.CancelledError:
+                job.finish("failed", error="The build machine is shutting down")
+                raise
+            except Exception as e:
+                logger.error(f"Build {job.id} failed: {str(e)}")
+                job.log(f"Build failed: {str(e)}")
+                job.finish("failed", error=str(e))
+                self.failed += 1
+            for name, seconds in job.phases.items():
+                self._phase_samples.setdefault(name, deque(maxlen=PHASE_WINDOW)).append(seconds)
+
+    def phase_stats(self) -> dict:
+        stats = {}
+        for name, samples in self._phase_samples.items():
+            ordered = sorted(samples)
+            stats[name] = {
+                "count": len(ordered),
+                "avg_seconds": round(sum(ordered) / len(ordered), 3),
+                "p95_seconds": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3),
+            }
+        return stats
+
+    def stats(self) -> dict:
+        statuses = [job.status for job in self._jobs.values()]
+        return {
+            "workers": self.workers,
+            "queued": statuses.count("queued"),
+            "running": statuses.count("running"),
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "phases": self.phase_stats(),
+        }
+
+
+build_queue = BuildQueue()
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Dict, Optional, Set
+
+import aiohttp
+from config.env_handler import (
+    CORE_API_URL,
+    NOTIFY_MAX_ATTEMPTS,
+    NOTIFY_MAX_CONNECTIONS,
+    NOTIFY_OUTBOX_DIR,
+    NOTIFY_RETRY_BASE_SECONDS,
+    NOTIFY_RETRY_MAX_SECONDS,
+    NOTIFY_TIMEOUT_SECONDS,
+)
+from config.logger import logger
+
+# Client errors worth retrying, any other 4xx will not succeed later either
+RETRYABLE_CLIENT_ERRORS = (408, 429)
+IDLE_WAKEUP_SECONDS = 60
+
+
+class CoreNotifier:
+    """
+    Delivers deployment results to the core API, surviving its slow or restarting phases.
+
+    Every notification is written to an on-disk outbox before it is sent and
+    removed once the core API accepted it, failed deliveries are retried with
+    exponential backoff and jitter, across restarts of the build machine.
+    Requests go through one keep-alive session and carry the build id as
+    Idempotency-Key. Only the newest notification of a project is kept, so a
+    retried old build never overwrites the result of a newer one.
+    """
+
+    def __init__(
+        self,
+        outbox_dir: str = NOTIFY_OUTBOX_DIR,
+        max_attempts: int = NOTIFY_MAX_ATTEMPTS,
+        base_delay: float = NOTIFY_RETRY_BASE_SECONDS,
+        max_delay: float = NOTIFY_RETRY_MAX_SECONDS,
+    ):
+        self.outbox_dir = outbox_dir
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Idempotency key -> notification
+        self._pending: Dict[str, dict] = {}
+        self._in_flight: Set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.delivered = 0
+        self.retries = 0
+        self.dropped = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.outbox_dir, f"{key}.json")
+
+    def _persist(self, notification: dict):
+        staging = self._path(f".{notification['key']}")
+        # The outbox holds the caller's bearer token
+        with open(os.open(staging, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            json.dump(notification, f)
+        os.replace(staging, self._path(notification["key"]))
+
+    def _remove(self, key: str):
+        self._pending.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    async def notify(self, key: str, project_id: str, credentials: str, payload: dict) -> bool:
+        """Queue the deployment result of a build, returns whether the core API has it already."""
+        for pending in list(self._pending.values()):
+            if pending["project_id"] == project_id:
+                logger.info(f"Notification {pending['key']} is superseded by build {key}")
+                self._remove(pending["key"])
+
+        notification = {
+            "key": key,
+            "project_id": project_id,
+            "credentials": credentials,
+            "payload": payload,
+            "attempts": 0,
+            "next_attempt_at": time.time(),
+        }
+        self._persist(notification)
+        self._pending[key] = notification
+        return await self._deliver(notification)
+
+    async def _deliver(self, notification: dict) -> bool:
+        key = notification["key"]
+        self._in_flight.add(key)
+        try:
+            return await self._attempt(notification)
+        finally:
+            self._in_flight.discard(key)
+
+    async def _attempt(self, notification: dict) -> bool:
+        key = notification["key"]
+        try:
+            async with self._session.put(
+                f"{CORE_API_URL}/v1/project/update/{notification['project_id']}/deployment-url",
+                json=notification["payload"],
+                headers={"Authorization": f"Bearer {notification['credentials']}", "Idempotency-Key": key},
+            ) as response:
+                if response.status < 300:
+                    self._remove(key)
+                    self.delivered += 1
+                    return True
+                if response.status < 500 and response.status not in RETRYABLE_CLIENT_ERRORS:
+                    logger.error(f"Core API rejected notification {key}: {response.status}")
+                    self._remove(key)
+                    self.dropped += 1
+                    return False
+                error = f"status {response.status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            error = str(e) or type(e).__name__
+
+        if key not in self._pending:
+            # Superseded while the request was in flight
+            return False
+        notification["attempts"] += 1
+        if notification["attempts"] >= self.max_attempts:
+            logger.error(f"Giving up on notification {key} after {notification['attempts']} attempts: {error}")
+            self._remove(key)
+            self.dropped += 1
+            return False
+
+        delay = min(self.max_delay, self.base_delay * 2 ** (notification["attempts"] - 1))
+        notification["next_attempt_at"] = time.time() + delay * random.uniform(0.5, 1)
+        self._persist(notification)
+        self.retries += 1
+        logger.warning(f"Notification {key} failed ({error}), retry {notification['attempts']} in {delay:.0f}s")
+        self._wakeup.set()
+        return False
+
+    async def start(self):
+        os.makedirs(self.outbox_dir, exist_ok=True)
+        for entry in os.scandir(self.outbox_dir):
+            if entry.name.startswith("."):
+                os.remove(entry.path)
+                continue
+            try:
+                with open(entry.path, "r") as f:
+                    notification = json.load(f)
+                self._pending[notification["key"]] = notification
+            except (OSError, ValueError, KeyError) as e:
+                logger.error(f"Dropping unreadable notification {entry.name}: {str(e)}")
+                os.remove(entry.path)
+
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=NOTIFY_MAX_CONNECTIONS, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=NOTIFY_TIMEOUT_SECONDS),
+        )
+        self._task = asyncio.create_task(self._retry_loop())
+        logger.info(f"Loaded {len(self._pending)} pending notifications")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def _retry_loop(self):
+        while True:
+            now = time.time()
+            for notification in sorted(self._pending.values(), key=lambda item: item["next_attempt_at"]):
+                key = notification["key"]
+                if notification["next_attempt_at"] <= now and key in self._pending and key not in self._in_flight:
+                    await self._deliver(notification)
+
+            next_attempts = [notification["next_attempt_at"] for notification in self._pending.values()]
+            timeout = min([IDLE_WAKEUP_SECONDS] + [max(0, at - time.time()) for at in next_attempts])
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "delivered": self.delivered,
+            "retries": self.retries,
+            "dropped": self.dropped,
+        }
+
+
+core_notifier = CoreNotifier()
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from config.env_handler import DEPENDENCY_CACHE_DIR, DEPENDENCY_CACHE_MAX_BYTES
+from config.logger import logger
+from services.workspace import directory_size
+
+DEPENDENCY_FIELDS = ("dependencies", "devDependencies", "optionalDependencies", "peerDependencies", "overrides")
+
+
+def _link_or_copy(src: str, dst: str):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Cache and workspace are on different filesystems, e.g. a tmpfs workspace
+        shutil.copy2(src, dst)
+
+
+def _move_tree(src: str, dst: str):
+    try:
+        os.rename(src, dst)
+    except OSError:
+        shutil.copytree(src, dst, symlinks=True)
+        shutil.rmtree(src, ignore_errors=True)
+
+
+class DependencyCache:
+    """
+    Reuses installed node_modules across builds with the same dependencies.
+
+    A build's node_modules is moved into the cache after a successful deploy,
+    keyed by a hash of its lockfile, or of the dependency fields of
+    package.json when there is none. Later builds with the same key start
+    with a hard-linked copy, so the install in `genezio deploy` finds nothing
+    to do. npm's own download cache is shared as well and preferred over the
+    registry. Entries are evicted least recently used once the cache grows
+    past `max_bytes`.
+    """
+
+    def __init__(self, root: str = DEPENDENCY_CACHE_DIR, max_bytes: int = DEPENDENCY_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.modules_root = os.path.join(root, "node_modules")
+        self.npm_cache = os.path.join(root, "npm")
+        # key -> size in bytes, least recently used first
+        self._entries: OrderedDict = OrderedDict()
+        # Entries builds are copying from right now, never evicted
+        self._pinned: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    @staticmethod
+    def key(code_dir: str) -> Optional[str]:
+        lock_path = os.path.join(code_dir, "package-lock.json")
+        if os.path.exists(lock_path):
+            with open(lock_path, "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest()
+
+        package_path = os.path.join(code_dir, "package.json")
+        if not os.path.exists(package_path):
+            return None
+        try:
+            with open(package_path, "r") as f:
+                package = json.load(f)
+        except ValueError:
+            return None
+        dependencies = {field: package.get(field) for field in DEPENDENCY_FIELDS if package.get(field)}
+        return hashlib.sha256(json.dumps(dependencies, sort_keys=True).encode()).hexdigest()
+
+    def npm_env(self) -> Dict[str, str]:
+        return {
+            "npm_config_cache": self.npm_cache,
+            "npm_config_prefer_offline": "true",
+            "npm_config_audit": "false",
+            "npm_config_fund": "false",
+        }
+
+    async def restore(self, key: str, code_dir: str) -> bool:
+        """Give the build a copy of the cached node_modules, returns whether there was one."""
+        target = os.path.join(code_dir, "node_modules")
+        if key not in self._entries or os.path.exists(target):
+            self.misses += 1
+            return False
+
+        self._entries.move_to_end(key)
+        self._pinned[key] = self._pinned.get(key, 0) + 1
+        try:
+            await asyncio.to_thread(
+                shutil.copytree,
+                os.path.join(self.modules_root, key),
+                target,
+                symlinks=True,
+                copy_function=_link_or_copy,
+            )
+        except OSError as e:
+            logger.warning(f"Error restoring dependencies {key[:12]}: {str(e)}")
+            await asyncio.to_thread(shutil.rmtree, target, True)
+            self.misses += 1
+            return False
+        finally:
+            self._pinned[key] -= 1
+            if not self._pinned[key]:
+                del self._pinned[key]
+
+        # Keeps the recency across restarts
+        os.utime(os.path.join(self.modules_root, key))
+        self.hits += 1
+        return True
+
+    async def store(self, key: str, code_dir: str):
+        """Take over the build's node_modules, the workspace is removed right after anyway."""
+        source = os.path.join(code_dir, "node_modules")
+        if key in self._entries or not os.path.isdir(source):
+            return
+
+        staging = os.path.join(self.modules_root, f".{key}.{uuid.uuid4().hex}")
+        await asyncio.to_thread(_move_tree, source, staging)
+        size = await asyncio.to_thread(directory_size, staging)
+        if key in self._entries or size > self.max_bytes:
+            # Stored by a concurrent build, or too large to ever fit
+            await asyncio.to_thread(shutil.rmtree, staging, True)
+            return
+
+        os.rename(staging, os.path.join(self.modules_root, key))
+        self._entries[key] = size
+        await self._evict()
+
+    async def _evict(self):
+        total = sum(self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if key in self._pinned:
+                continue
+            total -= self._entries.pop(key)
+            self.evicted += 1
+            await asyncio.to_thread(shutil.rmtree, os.path.join(self.modules_root, key), True)
+
+    async def start(self):
+        os.makedirs(self.modules_root, exist_ok=True)
+        os.makedirs(self.npm_cache, exist_ok=True)
+
+        def scan():
+            entries = []
+            for entry in os.scandir(self.modules_root):
+                if entry.name.startswith("."):
+                    # Interrupted store
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    continue
+                entries.append((entry.stat().st_mtime, entry.name, directory_size(entry.path)))
+            return sorted(entries)
+
+        for _, key, size in await asyncio.to_thread(scan):
+            self._entries[key] = size
+        await self._evict()
+        logger.info(f"Loaded {len(self._entries)} cached dependency sets")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": sum(self._entries.values()),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evicted": self.evicted,
+        }
+
+
+dependency_cache = DependencyCache()
@@ -0,0 +1,102 @@
+import hashlib
+import re
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+import yaml
+from config.logger import logger
+
+DATABASE_URI_REFERENCE = re.compile(r"\${{\s*services\.databases\.([^.}\s]+)\.uri\s*}}")
+RENDER_CACHE_SIZE = 256
+
+
+class DeployConfigError(Exception):
+    pass
+
+
+class DeployConfig:
+    """A parsed genezio.yaml, changed structurally instead of through text substitutions."""
+
+    def __init__(self, document: dict):
+        self.document = document
+
+    @classmethod
+    def parse(cls, text: str) -> "DeployConfig":
+        try:
+            document = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise DeployConfigError(f"Invalid genezio.yaml: {str(e)}")
+        if not isinstance(document, dict):
+            raise DeployConfigError("Invalid genezio.yaml: expected a mapping")
+        return cls(document)
+
+    @property
+    def databases(self) -> List[dict]:
+        services = self.document.get("services") or {}
+        databases = services.get("databases") if isinstance(services, dict) else None
+        return [database for database in databases or [] if isinstance(database, dict)]
+
+    def rename_database(self, name: str):
+        """Give the project's database its reserved name and point every uri reference at it."""
+        databases = self.databases
+        if not databases:
+            return
+        old_name = databases[0].get("name")
+        databases[0]["name"] = name
+        if old_name and old_name != name:
+            self.document = self._replace_references(self.document, old_name, name)
+
+    def _replace_references(self, value: Any, old_name: str, name: str) -> Any:
+        if isinstance(value, dict):
+            return {key: self._replace_references(item, old_name, name) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._replace_references(item, old_name, name) for item in value]
+        if isinstance(value, str):
+            return DATABASE_URI_REFERENCE.sub(
+                lambda match: match.group(0).replace(old_name, name) if match.group(1) == old_name else match.group(0),
+                value,
+            )
+        return value
+
+    def render(self) -> str:
+        return yaml.safe_dump(self.document, sort_keys=False, default_flow_style=False)
+
+
+class DeployConfigTransformer:
+    """
+    Applies the build's substitutions to the genezio.yaml written by analyze.
+
+    Rendered configs are cached per project and source, so a redeploy with an
+    unchanged analysis does not parse and dump the file again.
+    """
+
+    def __init__(self, cache_size: int = RENDER_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._rendered: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def transform(self, source: str, project_id: str, database_name: str) -> str:
+        key = (project_id, database_name, hashlib.sha256(source.encode()).hexdigest())
+        rendered: Optional[str] = self._rendered.get(key)
+        if rendered is not None:
+            self._rendered.move_to_end(key)
+            self.hits += 1
+            return rendered
+
+        self.misses += 1
+        config = DeployConfig.parse(source)
+        config.rename_database(database_name)
+        rendered = config.render()
+        logger.debug(f"genezio.yaml of project {project_id}:\n{rendered}")
+
+        self._rendered[key] = rendered
+        while len(self._rendered) > self.cache_size:
+            self._rendered.popitem(last=False)
+        return rendered
+
+    def stats(self) -> dict:
+        return {"entries": len(self._rendered), "hits": self.hits, "misses": self.misses}
+
+
+deploy_config_transformer = DeployConfigTransformer()
@@ -0,0 +1,76 @@
+import asyncio
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from config.env_handler import GENEZIO_COMMAND_TIMEOUT_SECONDS, GENEZIO_TOKEN
+
+# Generated projects can print long lines, e.g. minified build output
+STREAM_LIMIT = 1024 * 1024
+
+
+@dataclass
+class CommandResult:
+    returncode: int
+    stdout: str
+    stderr: str
+
+
+def genezio_env(tmp_dir: Optional[str] = None) -> Dict[str, str]:
+    """Environment for CLI calls of a build, `tmp_dir` keeps the CLI's temporary files inside the job."""
+    env = {
+        "CI": "true",
+        "GENEZIO_TOKEN": GENEZIO_TOKEN or "",
+        "GENEZIO_NO_TELEMETRY": "1",
+        "HOME": "/tmp",
+        "PATH": os.environ.get("PATH", os.defpath),
+    }
+    if tmp_dir:
+        env["TMPDIR"] = tmp_dir
+    return env
+
+
+async def run_genezio(
+    args: List[str],
+    cwd: Optional[str] = None,
+    env: Optional[Dict[str, str]] = None,
+    on_line: Optional[Callable[[str], None]] = None,
+    timeout: float = GENEZIO_COMMAND_TIMEOUT_SECONDS,
+) -> CommandResult:
+    """
+    Run a genezio CLI command without blocking the event loop.
+
+    stdout and stderr are read line by line while the command runs, every line is
+    passed to `on_line` as it arrives. The process is killed when the command
+    times out or the calling task is cancelled.
+    """
+    process = await asyncio.create_subprocess_exec(
+        "genezio",
+        *args,
+        cwd=cwd,
+        env=env if env is not None else {"CI": "true", **os.environ},
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        limit=STREAM_LIMIT,
+    )
+    stdout: List[str] = []
+    stderr: List[str] = []
+
+    async def read(stream: asyncio.StreamReader, lines: List[str]):
+        async for raw_line in stream:
+            line = raw_line.decode(errors="replace").rstrip("\r\n")
+            lines.append(line)
+            if on_line:
+                on_line(line)
+
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(read(process.stdout, stdout), read(process.stderr, stderr), process.wait()), timeout
+        )
+    except BaseException:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+
+    return CommandResult(returncode=process.returncode, stdout="\n".join(stdout), stderr="\n".join(stderr))
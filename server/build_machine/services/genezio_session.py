@@ -0,0 +1,118 @@
+import asyncio
+import re
+import time
+from typing import Optional, Tuple
+
+from config.env_handler import GENEZIO_SESSION_CHECK_SECONDS, GENEZIO_TOKEN
+from config.logger import logger
+from services.genezio_cli import CommandResult, genezio_env, run_genezio
+
+AUTH_ERROR_PATTERN = re.compile(r"not logged in|unauthori[sz]ed|\b401\b|invalid token|genezio login", re.IGNORECASE)
+
+
+class GenezioSessionError(Exception):
+    pass
+
+
+class GenezioSession:
+    """
+    Keeps the genezio CLI logged in for all builds.
+
+    The CLI logs in once at startup and `genezio account` validates the session
+    every `check_interval` seconds in the background, so builds only spawn the
+    commands they actually need. A build that still hits an auth error marks
+    the session invalid and the next `ensure()` logs in again.
+    """
+
+    def __init__(self, check_interval: int = GENEZIO_SESSION_CHECK_SECONDS):
+        self.check_interval = check_interval
+        self._valid = False
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._last_check: Optional[float] = None
+        self.logins = 0
+        self.checks = 0
+        self.auth_failures = 0
+
+    @staticmethod
+    def is_auth_error(result: CommandResult) -> bool:
+        return result.returncode != 0 and bool(AUTH_ERROR_PATTERN.search(f"{result.stdout}\n{result.stderr}"))
+
+    async def login(self) -> Tuple[CommandResult, CommandResult]:
+        async with self._lock:
+            return await self._login()
+
+    async def _login(self) -> Tuple[CommandResult, CommandResult]:
+        self._valid = False
+        login_result = await run_genezio(["login", GENEZIO_TOKEN or ""], env=genezio_env())
+        self.logins += 1
+        if login_result.returncode != 0:
+            raise GenezioSessionError(f"Login failed with return code {login_result.returncode}: {login_result.stderr}")
+        account_result = await run_genezio(["account"], env=genezio_env())
+        if account_result.returncode != 0:
+            raise GenezioSessionError(
+                f"Account check failed with return code {account_result.returncode}: {account_result.stderr}"
+            )
+        self._valid = True
+        self._last_check = time.time()
+        logger.info("Logged in to genezio")
+        return login_result, account_result
+
+    async def ensure(self) -> bool:
+        """Make sure the CLI is logged in, returns whether that took a login."""
+        if self._valid:
+            return False
+        async with self._lock:
+            # Another build may have logged in while this one waited
+            if self._valid:
+                return False
+            await self._login()
+            return True
+
+    def invalidate(self):
+        self.auth_failures += 1
+        self._valid = False
+
+    async def check(self):
+        async with self._lock:
+            self.checks += 1
+            result = await run_genezio(["account"], env=genezio_env())
+            self._last_check = time.time()
+            if result.returncode == 0:
+                self._valid = True
+                return
+            logger.warning(f"genezio session is no longer valid: {result.stderr}")
+            await self._login()
+
+    async def start(self):
+        try:
+            await self.login()
+        except Exception as e:
+            # Builds retry the login, the machine still comes up
+            logger.error(f"Error logging in to genezio: {str(e)}")
+        self._task = asyncio.create_task(self._check_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _check_loop(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Error checking the genezio session: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "valid": self._valid,
+            "logins": self.logins,
+            "checks": self.checks,
+            "auth_failures": self.auth_failures,
+            "last_check": self._last_check,
+        }
+
+
+genezio_session = GenezioSession()
@@ -0,0 +1,81 @@
+import json
+import re
+from typing import AsyncIterator, Optional
+
+from services.build_job import BuildJob
+
+DEPLOY_URL_PATTERN = re.compile(r"https://[a-zA-Z0-9-]+\.(?:eu-central-1|dev-fkt)\.cloud\.genez\.io")
+GENEZIO_PROJECT_ID_PATTERN = re.compile(r"https://app\.genez\.io/project/([a-f0-9-]+)/")
+PROGRESS_MARKERS = [
+    ("installing", re.compile(r"npm (?:install|ci)\b|installing dependencies", re.IGNORECASE)),
+    ("bundling", re.compile(r"bundling", re.IGNORECASE)),
+    ("uploading", re.compile(r"uploading", re.IGNORECASE)),
+    ("deploying", re.compile(r"deploying", re.IGNORECASE)),
+    ("deployed", re.compile(r"successfully deployed|deployed successfully|was deployed", re.IGNORECASE)),
+]
+# Proxies close event streams that stay silent, e.g. during a long npm install
+KEEPALIVE_SECONDS = 15
+
+
+class DeployOutputParser:
+    """
+    Reads `genezio deploy` output line by line while the command runs.
+
+    Every line goes to the build's log. The deployment URL, the genezio
+    project id and the progress steps are emitted as events the moment their
+    line arrives, so subscribers learn the URL before the process exits.
+    """
+
+    def __init__(self, job: BuildJob):
+        self.job = job
+        self._steps = set()
+
+    @property
+    def deployment_url(self) -> Optional[str]:
+        return self.job.deployment.get("deployment_url")
+
+    @property
+    def genezio_project_id(self) -> Optional[str]:
+        return self.job.deployment.get("genezio_project_id")
+
+    def feed(self, line: str):
+        self.job.log(line)
+
+        if not self.deployment_url:
+            match = DEPLOY_URL_PATTERN.search(line)
+            if match:
+                self.job.deployment["deployment_url"] = match.group(0)
+                self.job.emit("deployment_url", {"url": match.group(0)})
+
+        if not self.genezio_project_id:
+            match = GENEZIO_PROJECT_ID_PATTERN.search(line)
+            if match:
+                self.job.deployment["genezio_project_id"] = match.group(1)
+                self.job.emit("genezio_project", {"id": match.group(1)})
+
+        for step, pattern in PROGRESS_MARKERS:
+            if step not in self._steps and pattern.search(line):
+                self._steps.add(step)
+                self.job.emit("progress", {"step": step})
+
+
+def sse_event(event: str, data: dict, event_id: Optional[int] = None) -> str:
+    message = f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return f"id: {event_id}\n{message}" if event_id is not None else message
+
+
+async def stream_job_events(job: BuildJob, last_event_id: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Server-sent events of a build, ending with a done or error event.
+
+    Every event carries its id, a client or proxy that reconnects with
+    Last-Event-ID continues after the last event it received.
+    """
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else -1
+    async for item in job.follow(after, keepalive=KEEPALIVE_SECONDS):
+        if item is None:
+            yield ": keep-alive\n\n"
+            continue
+        event_id, event, data = item
+        yield sse_event(event, data, event_id)
+    yield sse_event("done" if job.status == "succeeded" else "error", job.to_dict())
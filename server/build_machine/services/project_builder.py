@@ -0,0 +1,168 @@
+import asyncio
+import os
+import re
+from typing import Callable, List, Optional
+
+from config.logger import logger
+from services.analysis_cache import analysis_cache, fingerprint
+from services.build_job import BuildJob
+from services.core_notifier import core_notifier
+from services.dependency_cache import dependency_cache
+from services.deploy_config import deploy_config_transformer
+from services.genezio_cli import CommandResult, genezio_env, run_genezio
+from services.genezio_session import genezio_session
+from services.log_stream import DeployOutputParser
+from services.project_fetch import fetch_project
+from services.workspace import workspace_manager
+
+DATABASE_URI_VALUE_PATTERN = re.compile(r"(mongodb\+srv://[^\s]+|postgresql://[^\s]+)")
+
+
+class BuildError(Exception):
+    pass
+
+
+async def _genezio(
+    job: BuildJob,
+    args: List[str],
+    cwd: Optional[str] = None,
+    env: Optional[dict] = None,
+    check: bool = True,
+    on_line: Optional[Callable[[str], None]] = None,
+) -> CommandResult:
+    on_line = on_line or job.log
+    job.log(f"Running genezio {args[0]}")
+    result = await run_genezio(args, cwd=cwd, env=env, on_line=on_line)
+    if genezio_session.is_auth_error(result):
+        # The session expired since the last check, log in again and retry once
+        job.log("genezio session expired, logging in again")
+        genezio_session.invalidate()
+        with job.phase("login"):
+            await genezio_session.ensure()
+        result = await run_genezio(args, cwd=cwd, env=env, on_line=on_line)
+    if check and result.returncode != 0:
+        raise BuildError(f"genezio {args[0]} failed with return code {result.returncode}: {result.stderr}")
+    return result
+
+
+def rewrite_genezio_yaml(yaml_path: str, project_id: str, database_name: str, source: Optional[str] = None) -> str:
+    """
+    Write the genezio.yaml to deploy with, returns the analyzed source it came from.
+
+    `source` is a cached analysis, without it the file analyze just wrote is read.
+    """
+    if source is None:
+        if not os.path.exists(yaml_path):
+            raise BuildError(f"genezio.yaml not found at {yaml_path}")
+        with open(yaml_path, "r") as f:
+            source = f.read()
+    with open(yaml_path, "w") as f:
+        f.write(deploy_config_transformer.transform(source, project_id, database_name))
+    return source
+
+
+async def read_database_uri(job: BuildJob, job_dir: str, project_name: str, env: dict) -> Optional[str]:
+    await _genezio(
+        job,
+        ["getenv", "--projectName", project_name, "--output", ".env", "--format", "env"],
+        cwd=job_dir,
+        env=env,
+        check=False,
+    )
+    env_file_path = os.path.join(job_dir, ".env")
+    if not os.path.exists(env_file_path):
+        job.log("No environment file was created")
+        return None
+    with open(env_file_path, "r") as f:
+        db_uri_match = DATABASE_URI_VALUE_PATTERN.search(f.read())
+    return db_uri_match.group(1) if db_uri_match else None
+
+
+async def build_project(job: BuildJob) -> dict:
+    """Analyze, deploy and register one project, all files of the build live in its own directory."""
+    data = job.data
+    if not data.project_name or not isinstance(data.project_name, str):
+        raise BuildError(f"Invalid project name: {data.project_name}")
+    if not data.region or not isinstance(data.region, str):
+        raise BuildError(f"Invalid region: {data.region}")
+
+    with job.phase("workspace"):
+        workspace = await workspace_manager.allocate(job.id)
+    try:
+        job_dir = workspace.path
+        env = {**genezio_env(tmp_dir=workspace.tmp_dir), **dependency_cache.npm_env()}
+
+        with job.phase("download"):
+            code_dir = await fetch_project(data.presigned_url, job_dir, max_bytes=workspace.quota)
+            await workspace.check_quota()
+        job.log(f"Extracted {len(os.listdir(code_dir))} entries into the code directory")
+
+        with job.phase("login"):
+            if await genezio_session.ensure():
+                job.log("Logged in to genezio")
+
+        with job.phase("analyze"):
+            analysis_key = await asyncio.to_thread(fingerprint, code_dir, data.project_name, data.region)
+            analysis = analysis_cache.get(analysis_key)
+            job.cache["analysis"] = "miss" if analysis is None else "hit"
+            if analysis is None:
+                await _genezio(
+                    job, ["analyze", "--name", data.project_name, "--region", data.region], cwd=code_dir, env=env
+                )
+            else:
+                job.log("Project layout unchanged, reusing the previous analysis")
+
+        with job.phase("rewrite"):
+            source = rewrite_genezio_yaml(
+                os.path.join(code_dir, "genezio.yaml"), data.project_id, data.database_name, source=analysis
+            )
+        if analysis is None:
+            analysis_cache.put(analysis_key, source)
+
+        dependencies_key = dependency_cache.key(code_dir)
+        if dependencies_key:
+            with job.phase("dependencies"):
+                restored = await dependency_cache.restore(dependencies_key, code_dir)
+            job.cache["dependencies"] = "hit" if restored else "miss"
+            job.log(f"Dependency cache {job.cache['dependencies']}")
+
+        deploy_output = DeployOutputParser(job)
+        with job.phase("deploy"):
+            # The janitor aborts the deploy if installing dependencies runs over the quota
+            deploy_result = await workspace.guard(
+                _genezio(job, ["deploy"], cwd=code_dir, env=env, check=False, on_line=deploy_output.feed)
+            )
+        deploy_url = deploy_output.deployment_url
+        if not deploy_url:
+            if "ENOSPC" in deploy_result.stdout or "ENOSPC" in deploy_result.stderr:
+                raise BuildError("No space left on device")
+            raise BuildError("Failed to extract deployment URL from output")
+        if dependencies_key and job.cache["dependencies"] == "miss":
+            try:
+                await dependency_cache.store(dependencies_key, code_dir)
+            except OSError as e:
+                logger.warning(f"Error caching dependencies of build {job.id}: {str(e)}")
+        genezio_project_id = deploy_output.genezio_project_id
+
+        with job.phase("getenv"):
+            db_uri = await read_database_uri(job, job_dir, data.project_name, env)
+
+        job.log(f"Deployed to {deploy_url}")
+        update = {"deployment_url": deploy_url}
+        if db_uri:
+            update["database_uri"] = db_uri
+        if genezio_project_id:
+            update["genezio_project_id"] = genezio_project_id
+        with job.phase("notify"):
+            notified = await core_notifier.notify(job.id, data.project_id, job.credentials, update)
+        if not notified:
+            job.log("The core API did not take the deployment yet, it is retried in the background")
+
+        return {
+            "deployment_url": deploy_url,
+            "database_uri": db_uri,
+            "genezio_project_id": genezio_project_id,
+            "notified": notified,
+        }
+    finally:
+        await workspace_manager.release(workspace)
@@ -0,0 +1,68 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import zipfile
+from typing import IO
+
+import aiohttp
+
+# Archives up to this size stay in memory, larger ones spill to the workspace
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+CODE_ARCHIVE = "code/code.zip"
+
+
+class ProjectFetchError(Exception):
+    pass
+
+
+def extract_code(archive: IO[bytes], workspace_dir: str) -> str:
+    """Extract the nested code archive of a project archive, nothing else of it touches the disk."""
+    code_dir = os.path.join(workspace_dir, "code")
+    os.makedirs(code_dir, exist_ok=True)
+    archive.seek(0)
+    with zipfile.ZipFile(archive, "r") as project_zip:
+        try:
+            code_info = project_zip.getinfo(CODE_ARCHIVE)
+        except KeyError:
+            raise ProjectFetchError(f"{CODE_ARCHIVE} not found in the project archive")
+
+        # The nested archive is copied out in chunks, zip members cannot be read from the middle
+        with project_zip.open(code_info) as member, tempfile.SpooledTemporaryFile(
+            max_size=SPOOL_MAX_SIZE, dir=workspace_dir
+        ) as code_zip:
+            shutil.copyfileobj(member, code_zip, COPY_CHUNK_SIZE)
+            code_zip.seek(0)
+            with zipfile.ZipFile(code_zip, "r") as code_zip_ref:
+                code_zip_ref.extractall(code_dir)
+
+        for info in project_zip.infolist():
+            if info.filename.startswith("code/") and info.filename != CODE_ARCHIVE:
+                project_zip.extract(info, workspace_dir)
+    return code_dir
+
+
+async def fetch_project(presigned_url: str, workspace_dir: str, max_bytes: int) -> str:
+    """
+    Download a project archive and extract its code into the workspace.
+
+    The response is streamed into a spooled file, so memory stays bounded by
+    the spool size whatever the size of the project, and downloads larger
+    than `max_bytes` are aborted before they fill the disk.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, dir=workspace_dir) as archive:
+        async with aiohttp.ClientSession() as session:
+            async with session.get(presigned_url) as response:
+                if response.status != 200:
+                    raise ProjectFetchError(f"Failed to download from S3: {response.status}")
+                size = 0
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ProjectFetchError(f"The project archive is larger than {max_bytes} bytes")
+                    archive.write(chunk)
+
+        return await asyncio.to_thread(extract_code, archive, workspace_dir)
@@ -0,0 +1,203 @@
+import asyncio
+import os
+import shutil
+import time
+from typing import Awaitable, Dict, Optional, TypeVar
+
+from config.env_handler import (
+    BUILD_WORKSPACE_JANITOR_SECONDS,
+    BUILD_WORKSPACE_MAX_AGE_SECONDS,
+    BUILD_WORKSPACE_QUOTA_BYTES,
+    BUILD_WORKSPACE_ROOT,
+    BUILD_WORKSPACE_TMPFS,
+)
+from config.logger import logger
+
+TMPFS_ROOT = "/dev/shm/build-workspaces"
+
+T = TypeVar("T")
+
+
+class WorkspaceQuotaExceeded(Exception):
+    pass
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for dir_path, _, file_names in os.walk(path):
+        for file_name in file_names:
+            try:
+                total += os.lstat(os.path.join(dir_path, file_name)).st_size
+            except OSError:
+                # Removed while walking
+                pass
+    return total
+
+
+class Workspace:
+    """
+    The directory of one build, its CLI temporary files live in `tmp_dir`.
+
+    Work run through `guard` is cancelled as soon as the janitor finds the
+    workspace over its quota, it then fails with `WorkspaceQuotaExceeded`.
+    """
+
+    def __init__(self, job_id: str, path: str, quota: int):
+        self.job_id = job_id
+        self.path = path
+        self.tmp_dir = os.path.join(path, "tmp")
+        self.quota = quota
+        self.usage = 0
+        self.created_at = time.time()
+        self._guarded: Optional[asyncio.Future] = None
+        self._exceeded: Optional[WorkspaceQuotaExceeded] = None
+
+    def _over_quota(self) -> WorkspaceQuotaExceeded:
+        return WorkspaceQuotaExceeded(f"The build uses {self.usage} bytes, over its quota of {self.quota} bytes")
+
+    async def check_quota(self):
+        self.usage = await asyncio.to_thread(directory_size, self.path)
+        if self.usage > self.quota:
+            raise self._over_quota()
+
+    async def guard(self, awaitable: Awaitable[T]) -> T:
+        self._guarded = asyncio.ensure_future(awaitable)
+        if self._exceeded:
+            self._guarded.cancel()
+        try:
+            return await self._guarded
+        except asyncio.CancelledError:
+            # Cancelled by `abort` rather than by the caller
+            if self._exceeded is None:
+                raise
+            raise self._exceeded from None
+        finally:
+            self._guarded = None
+
+    def abort(self):
+        if self._exceeded:
+            return
+        self._exceeded = self._over_quota()
+        if self._guarded:
+            self._guarded.cancel()
+
+
+class WorkspaceManager:
+    """
+    Hands out a private directory per build under one root.
+
+    A workspace is only allocated when the disk has room for its full quota on
+    top of what the running builds may still write, otherwise the build waits
+    for one to finish instead of failing with ENOSPC halfway through a deploy.
+    Only directories under the root are ever removed: a build's own on release,
+    and by the janitor those that no running build owns once they are older
+    than `max_age`.
+    """
+
+    def __init__(
+        self,
+        root: str = TMPFS_ROOT if BUILD_WORKSPACE_TMPFS and os.path.isdir("/dev/shm") else BUILD_WORKSPACE_ROOT,
+        quota: int = BUILD_WORKSPACE_QUOTA_BYTES,
+        max_age: int = BUILD_WORKSPACE_MAX_AGE_SECONDS,
+        janitor_interval: int = BUILD_WORKSPACE_JANITOR_SECONDS,
+    ):
+        self.root = root
+        self.quota = quota
+        self.max_age = max_age
+        self.janitor_interval = janitor_interval
+        self._active: Dict[str, Workspace] = {}
+        self._released = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self.evicted = 0
+        self.waits = 0
+
+    def _outstanding_bytes(self) -> int:
+        return sum(max(0, workspace.quota - workspace.usage) for workspace in self._active.values())
+
+    def _has_room(self) -> bool:
+        # A lone build always runs, the quota check stops it if the disk really is too small
+        if not self._active:
+            return True
+        return shutil.disk_usage(self.root).free - self._outstanding_bytes() >= self.quota
+
+    async def allocate(self, job_id: str) -> Workspace:
+        async with self._released:
+            if not self._has_room():
+                self.waits += 1
+                logger.info(f"Build {job_id} is waiting for disk space")
+                await self._released.wait_for(self._has_room)
+            workspace = Workspace(job_id, os.path.join(self.root, job_id), self.quota)
+            os.makedirs(workspace.tmp_dir)
+            self._active[job_id] = workspace
+            return workspace
+
+    async def release(self, workspace: Workspace):
+        await asyncio.to_thread(shutil.rmtree, workspace.path, True)
+        async with self._released:
+            self._active.pop(workspace.job_id, None)
+            self._released.notify_all()
+
+    async def start(self):
+        os.makedirs(self.root, exist_ok=True)
+        # Nothing runs yet, whatever is left belongs to a previous run
+        await self._evict(max_age=0)
+        self._task = asyncio.create_task(self._janitor_loop())
+        logger.info(f"Build workspaces in {self.root}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _evict(self, max_age: int):
+        expired_before = time.time() - max_age
+        evicted = 0
+        for entry in os.scandir(self.root):
+            if entry.name in self._active:
+                continue
+            try:
+                if entry.stat(follow_symlinks=False).st_mtime > expired_before:
+                    continue
+            except OSError:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                await asyncio.to_thread(shutil.rmtree, entry.path, True)
+            else:
+                os.remove(entry.path)
+            evicted += 1
+        if evicted:
+            self.evicted += evicted
+            logger.info(f"Evicted {evicted} stale build workspaces")
+            async with self._released:
+                self._released.notify_all()
+
+    async def _janitor_loop(self):
+        while True:
+            await asyncio.sleep(self.janitor_interval)
+            try:
+                await self._evict(self.max_age)
+                for workspace in list(self._active.values()):
+                    workspace.usage = await asyncio.to_thread(directory_size, workspace.path)
+                    if workspace.usage > workspace.quota:
+                        logger.warning(f"Build {workspace.job_id} is over its disk quota: {workspace.usage} bytes")
+                        workspace.abort()
+                # Measured usage lowers the outstanding reservations
+                async with self._released:
+                    self._released.notify_all()
+            except Exception as e:
+                logger.error(f"Error cleaning build workspaces: {str(e)}")
+
+    def stats(self) -> dict:
+        disk = shutil.disk_usage(self.root) if os.path.isdir(self.root) else None
+        return {
+            "root": self.root,
+            "active": len(self._active),
+            "used_bytes": sum(workspace.usage for workspace in self._active.values()),
+            "outstanding_bytes": self._outstanding_bytes(),
+            "free_bytes": disk.free if disk else None,
+            "waits": self.waits,
+            "evicted": self.evicted,
+        }
+
+
+workspace_manager = WorkspaceManager()
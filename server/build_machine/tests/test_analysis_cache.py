@@ -0,0 +1,109 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.analysis_cache import AnalysisCache, entry_points, fingerprint
+
+PACKAGE = {
+    "name": "todo-api",
+    "type": "module",
+    "main": "app.mjs",
+    "scripts": {"start": "node app.mjs"},
+    "dependencies": {"express": "^4.21.0", "mongoose": "^8.0.0"},
+}
+
+
+def write(root, path, content):
+    full_path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w") as f:
+        f.write(content)
+
+
+@pytest.fixture
+def code_dir(tmp_path):
+    write(tmp_path, "package.json", json.dumps(PACKAGE))
+    write(tmp_path, "app.mjs", "import express from 'express';\nconst app = express();\napp.listen(8080);\n")
+    write(tmp_path, "src/routes/todos.mjs", "export const router = {};\n")
+    write(tmp_path, "README.md", "# Todo API\n")
+    return str(tmp_path)
+
+
+def test_fingerprint_is_stable(code_dir):
+    assert fingerprint(code_dir, "todo-api", "eu-central-1") == fingerprint(code_dir, "todo-api", "eu-central-1")
+
+
+def test_fingerprint_ignores_edits_outside_entry_points(code_dir):
+    before = fingerprint(code_dir, "todo-api", "eu-central-1")
+    write(code_dir, "src/routes/todos.mjs", "export const router = { list: [] };\n")
+    write(code_dir, "README.md", "# Todo API\n\nNow with tags.\n")
+    assert fingerprint(code_dir, "todo-api", "eu-central-1") == before
+
+
+def test_fingerprint_ignores_package_metadata(code_dir):
+    before = fingerprint(code_dir, "todo-api", "eu-central-1")
+    write(code_dir, "package.json", json.dumps({**PACKAGE, "name": "renamed", "version": "1.0.1"}))
+    assert fingerprint(code_dir, "todo-api", "eu-central-1") == before
+
+
+def test_fingerprint_ignores_node_modules(code_dir):
+    before = fingerprint(code_dir, "todo-api", "eu-central-1")
+    write(code_dir, "node_modules/express/index.js", "module.exports = {};\n")
+    assert fingerprint(code_dir, "todo-api", "eu-central-1") == before
+
+
+def test_fingerprint_changes_with_file_paths(code_dir):
+    before = fingerprint(code_dir, "todo-api", "eu-central-1")
+    write(code_dir, "src/routes/tags.mjs", "export const router = {};\n")
+    assert fingerprint(code_dir, "todo-api", "eu-central-1") != before
+
+
+def test_fingerprint_changes_with_dependencies(code_dir):
+    before = fingerprint(code_dir, "todo-api", "eu-central-1")
+    package = {**PACKAGE, "dependencies": {**PACKAGE["dependencies"], "cors": "^2.8.5"}}
+    write(code_dir, "package.json", json.dumps(package))
+    assert fingerprint(code_dir, "todo-api", "eu-central-1") != before
+
+
+def test_fingerprint_changes_with_entry_point(code_dir):
+    before = fingerprint(code_dir, "todo-api", "eu-central-1")
+    write(code_dir, "app.mjs", "import express from 'express';\nconst app = express();\napp.listen(3000);\n")
+    assert fingerprint(code_dir, "todo-api", "eu-central-1") != before
+
+
+def test_fingerprint_changes_with_analyze_arguments(code_dir):
+    before = fingerprint(code_dir, "todo-api", "eu-central-1")
+    assert fingerprint(code_dir, "other-name", "eu-central-1") != before
+    assert fingerprint(code_dir, "todo-api", "us-east-1") != before
+
+
+def test_entry_points_from_package_and_scripts(code_dir):
+    package = {
+        **PACKAGE,
+        "main": "src/server.mjs",
+        "scripts": {"start": "node ./src/server.mjs", "dev": "node app.mjs"},
+    }
+    write(code_dir, "src/server.mjs", "export {};\n")
+    assert entry_points(code_dir, package) == ["app.mjs", "src/server.mjs"]
+
+
+def test_cache_round_trip_and_eviction(tmp_path):
+    cache = AnalysisCache(root=str(tmp_path / "cache"), max_entries=2)
+    cache.load()
+    assert cache.get("a") is None
+
+    cache.put("a", "name: a\n")
+    cache.put("b", "name: b\n")
+    assert cache.get("a") == "name: a\n"
+
+    # b is the least recently used entry now
+    cache.put("c", "name: c\n")
+    assert cache.get("b") is None
+    assert cache.get("a") == "name: a\n"
+
+    reloaded = AnalysisCache(root=str(tmp_path / "cache"), max_entries=2)
+    reloaded.load()
+    assert reloaded.get("c") == "name: c\n"
@@ -9,6 +9,13 @@ ENVIRONMENT = os.getenv("ENVIRONMENT", "dev")
 SECRET_KEY = os.getenv("SECRET_KEY", "secret")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 1440))
+# "session" checks every token against ActiveSession, "jwt" only verifies the signature locally
+AUTH_MODE = os.getenv("AUTH_MODE", "session")
+REVOCATION_SYNC_SECONDS = int(os.getenv("REVOCATION_SYNC_SECONDS", 30))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", 10000))
+SESSION_CACHE_TTL_SECONDS = int(os.getenv("SESSION_CACHE_TTL_SECONDS", 60))
+# 0 charges every request with its own atomic update
+QUOTA_FLUSH_SECONDS = int(os.getenv("QUOTA_FLUSH_SECONDS", 0))
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -27,7 +34,44 @@ AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 AWS_REGION = os.getenv("AWS_REGION", "eu-central-1")
 AWS_BUCKET_NAME = os.getenv("AWS_BUCKET_NAME")
+AWS_ENDPOINT_URL = os.getenv("AWS_ENDPOINT_URL")
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 50))
+S3_MULTIPART_CHUNK_SIZE = int(os.getenv("S3_MULTIPART_CHUNK_SIZE", 8 * 1024 * 1024))
+S3_MULTIPART_CONCURRENCY = int(os.getenv("S3_MULTIPART_CONCURRENCY", 4))
+PRESIGNED_URL_CACHE_SIZE = int(os.getenv("PRESIGNED_URL_CACHE_SIZE", 10000))
+PRESIGNED_URL_REFRESH_MARGIN = int(os.getenv("PRESIGNED_URL_REFRESH_MARGIN", 300))
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", 120))
+LLM_FIRST_TOKEN_TIMEOUT_SECONDS = float(os.getenv("LLM_FIRST_TOKEN_TIMEOUT_SECONDS", 30))
+LLM_FAILOVER = os.getenv("LLM_FAILOVER", "true").lower() == "true"
+LLM_HEDGING = os.getenv("LLM_HEDGING", "true").lower() == "true"
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", 1.0))
+LLM_STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", 200))
+LLM_ERROR_RATE_THRESHOLD = float(os.getenv("LLM_ERROR_RATE_THRESHOLD", 0.5))
+LLM_COOLDOWN_SECONDS = float(os.getenv("LLM_COOLDOWN_SECONDS", 10))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 64))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", 500))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", 120))
+# Vendor rate limits of the account, requests and tokens per minute
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", 500))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", 200_000))
+ANTHROPIC_RPM = int(os.getenv("ANTHROPIC_RPM", 50))
+ANTHROPIC_TPM = int(os.getenv("ANTHROPIC_TPM", 40_000))
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", 2000))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", 4_000_000))
 LANGFUSE_SECRET_KEY = os.getenv("LANGFUSE_SECRET_KEY")
 LANGFUSE_PUBLIC_KEY = os.getenv("LANGFUSE_PUBLIC_KEY")
 LANGFUSE_HOST = os.getenv("LANGFUSE_HOST")
+PROMPT_REFRESH_SECONDS = int(os.getenv("PROMPT_REFRESH_SECONDS", 60))
+# Where fetched prompt versions are kept, outside the source tree
+PROMPT_SNAPSHOT_DIR = os.getenv("PROMPT_SNAPSHOT_DIR", "/tmp/prompt-snapshots")
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 1000))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 3600))
+# Cosine similarity of the user input above which a cached response is reused, 0 disables the similarity tier
+RESPONSE_CACHE_SIMILARITY_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SIMILARITY_THRESHOLD", 0))
 GENEZIO_TOKEN = os.getenv("GENEZIO_TOKEN")
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", 4))
+GENERATION_JOB_POLL_SECONDS = int(os.getenv("GENERATION_JOB_POLL_SECONDS", 5))
+# Running jobs without a heartbeat for this long belonged to a worker that died
+GENERATION_JOB_STALE_SECONDS = int(os.getenv("GENERATION_JOB_STALE_SECONDS", 120))
+GENERATION_JOB_MAX_ATTEMPTS = int(os.getenv("GENERATION_JOB_MAX_ATTEMPTS", 2))
+BUILD_MACHINE_URL = os.getenv("BUILD_MACHINE_URL", "http://localhost:8081")
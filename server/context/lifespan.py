@@ -1,10 +1,18 @@
 import time
 from contextlib import asynccontextmanager
 
+from config.env_handler import AUTH_MODE
 from config.logger import logger
 from db.connection import db_connection
 from fastapi import FastAPI
+from prompts.get_prompt import prompt_factory
+from services.generation_jobs import generation_job_queue
+from services.quota_service import quota_service
+from services.s3_service import s3_service
+from services.token_revocation import token_revocation_list
+from services.usage_meter import usage_meter
 from utils.register_agents import register_agents
+from utils.token_counter import load_encodings
 
 
 @asynccontextmanager
@@ -16,8 +24,23 @@ async def lifespan(app: FastAPI):
     logger.info(f"Database connection initialized in {time.time() - start_time:.2f} seconds")
     await register_agents()
     logger.info("Agents registered")
+    await prompt_factory.start()
+    logger.info("Prompts loaded")
+    await load_encodings()
+    s3_service.initialize()
+    await quota_service.start()
+    if AUTH_MODE == "jwt":
+        await token_revocation_list.start()
+    logger.info(f"Auth mode: {AUTH_MODE}")
+    await generation_job_queue.start()
     yield
     # Shutdown
+    await generation_job_queue.stop()
+    await prompt_factory.stop()
+    await token_revocation_list.stop()
+    await usage_meter.drain()
+    await quota_service.stop()
+    s3_service.close()
     logger.info("Closing database connection")
     await db_connection.close_db()
     logger.info("Database connection closed")
@@ -1,11 +1,36 @@
-from beanie import init_beanie
+from beanie import PydanticObjectId, init_beanie
 from config.env_handler import BACHELOR_PROJECT_DATABASE_URL
 from config.logger import logger
+from db.migrations import run_migrations
 from models.active_session import ActiveSession
+from models.generation_job import GenerationJob
 from models.project import Project
+from models.revoked_token import RevokedToken
 from models.user import User
 from motor.motor_asyncio import AsyncIOMotorClient
 
+# The lookups on the login and auth paths, each must be served by an index
+HOT_QUERIES = [
+    (User, {"email": ""}),
+    (User, {"otp_code": ""}),
+    (ActiveSession, {"session_token": ""}),
+    (ActiveSession, {"user_id": PydanticObjectId()}),
+    (Project, {"user_id": ""}),
+    (RevokedToken, {"created_at": {"$gte": 0}}),
+    (GenerationJob, {"user_id": "", "idempotency_key": ""}),
+    (GenerationJob, {"status": "queued"}),
+]
+
+
+def _plan_stages(plan: dict):
+    # Plans from the slot based engine wrap the classic plan in `queryPlan`
+    plan = plan.get("queryPlan", plan)
+    yield plan.get("stage")
+    if "inputStage" in plan:
+        yield from _plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
 
 class DatabaseConnection:
     def __init__(self):
@@ -14,11 +39,33 @@ class DatabaseConnection:
 
     async def initialize(self):
         try:
-            await init_beanie(database=self.db, document_models=[User, ActiveSession, Project])
+            await run_migrations(self.db)
+            # Builds the indexes declared in each model's Settings
+            await init_beanie(
+                database=self.db, document_models=[User, ActiveSession, Project, RevokedToken, GenerationJob]
+            )
             logger.info("Database connection initialized")
         except Exception as e:
             logger.error(f"Error initializing database connection: {e}")
             raise e
+        await self.check_query_plans()
+
+    async def check_query_plans(self):
+        """Explain the hot queries and report any of them that would scan a whole collection."""
+        for model, query in HOT_QUERIES:
+            collection = model.get_collection_name()
+            try:
+                explain = await self.db.command(
+                    {"explain": {"find": collection, "filter": query}, "verbosity": "queryPlanner"}
+                )
+            except Exception as e:
+                logger.warning(f"Could not explain query {query} on {collection}: {e}")
+                continue
+            stages = set(_plan_stages(explain["queryPlanner"]["winningPlan"]))
+            if "COLLSCAN" in stages:
+                logger.warning(f"Query {list(query)} on {collection} runs a collection scan, check its index")
+            else:
+                logger.debug(f"Query {list(query)} on {collection} uses {', '.join(sorted(filter(None, stages)))}")
 
     def get_db(self):
         return self.db
@@ -0,0 +1,51 @@
+from config.logger import logger
+from models.active_session import ActiveSession
+from models.user import HOBBY_MAX_TOKENS, User
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+
+async def _duplicate_groups(db: AsyncIOMotorDatabase, model, field: str, index_name: str):
+    """Yield the ids of documents sharing a value of `field`, oldest first, while its unique index is missing."""
+    collection = db[model.__name__]
+    if index_name in await collection.index_information():
+        return
+    pipeline = [
+        {"$group": {"_id": f"${field}", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ]
+    async for group in collection.aggregate(pipeline, allowDiskUse=True):
+        yield group["_id"], sorted(group["ids"])
+
+
+async def resolve_session_token_duplicates(db: AsyncIOMotorDatabase):
+    # Sessions with the same token are the same session, one of them is enough
+    collection = db[ActiveSession.__name__]
+    async for token, ids in _duplicate_groups(db, ActiveSession, "session_token", "session_token_unique"):
+        result = await collection.delete_many({"_id": {"$in": ids[1:]}})
+        logger.warning(f"Removed {result.deleted_count} duplicate sessions")
+
+
+async def resolve_email_duplicates(db: AsyncIOMotorDatabase):
+    # Logins found the oldest account, it keeps the address and the newer ones are renamed rather than deleted
+    collection = db[User.__name__]
+    async for email, ids in _duplicate_groups(db, User, "email", "email_unique"):
+        for user_id in ids[1:]:
+            await collection.update_one({"_id": user_id}, {"$set": {"email": f"{email}#duplicate-{user_id}"}})
+        logger.warning(f"Renamed {len(ids) - 1} duplicate accounts of {email}")
+
+
+async def raise_hobby_token_limits(db: AsyncIOMotorDatabase):
+    # The default only applies to new documents, accounts created before it was raised keep the old limit
+    result = await db[User.__name__].update_many(
+        {"subscription.name": "Hobby", "subscription.max_tokens": {"$lt": HOBBY_MAX_TOKENS}},
+        {"$set": {"subscription.max_tokens": HOBBY_MAX_TOKENS}},
+    )
+    if result.modified_count:
+        logger.info(f"Raised the token limit of {result.modified_count} Hobby accounts to {HOBBY_MAX_TOKENS}")
+
+
+async def run_migrations(db: AsyncIOMotorDatabase):
+    """Bring existing data in line with the models before init_beanie builds their indexes."""
+    await resolve_session_token_duplicates(db)
+    await resolve_email_duplicates(db)
+    await raise_hobby_token_limits(db)
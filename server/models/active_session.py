@@ -1,7 +1,9 @@
 from datetime import datetime, timedelta
 
+import pymongo
 from beanie import Document, PydanticObjectId
 from config.env_handler import ACCESS_TOKEN_EXPIRE_MINUTES
+from pymongo import IndexModel
 
 
 class ActiveSession(Document):
@@ -9,3 +11,11 @@ class ActiveSession(Document):
     session_token: str
     expire_at: datetime = datetime.now() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     created_at: datetime = datetime.now()
+
+    class Settings:
+        indexes = [
+            IndexModel([("session_token", pymongo.ASCENDING)], name="session_token_unique", unique=True),
+            IndexModel([("user_id", pymongo.ASCENDING)], name="user_id"),
+            # Mongo removes sessions once expire_at has passed
+            IndexModel([("expire_at", pymongo.ASCENDING)], name="expire_at_ttl", expireAfterSeconds=0),
+        ]
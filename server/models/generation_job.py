@@ -0,0 +1,33 @@
+from datetime import datetime
+from typing import Optional
+
+import pymongo
+from beanie import Document
+from pymongo import IndexModel
+
+
+class GenerationJob(Document):
+    user_id: str
+    project_id: str
+    idempotency_key: str
+    # The ChatRequest the job was submitted with
+    request: dict
+    status: str = "queued"
+    files: int = 0
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    heartbeat_at: Optional[datetime] = None
+    created_at: datetime = datetime.now()
+    updated_at: datetime = datetime.now()
+    finished_at: Optional[datetime] = None
+
+    class Settings:
+        indexes = [
+            IndexModel(
+                [("user_id", pymongo.ASCENDING), ("idempotency_key", pymongo.ASCENDING)],
+                name="user_id_idempotency_key_unique",
+                unique=True,
+            ),
+            IndexModel([("status", pymongo.ASCENDING), ("created_at", pymongo.ASCENDING)], name="status_created_at"),
+        ]
@@ -1,7 +1,9 @@
 from datetime import datetime
 from typing import Optional
 
+import pymongo
 from beanie import Document
+from pymongo import IndexModel
 
 
 class Project(Document):
@@ -10,6 +12,8 @@ class Project(Document):
     is_public: bool = True
     s3_folder_name: Optional[str] = None
     s3_presigned_url: Optional[str] = None
+    # Set when the project store holds files that project.zip does not contain yet
+    archive_outdated: bool = False
     db_uri: Optional[str] = None
     database_name: Optional[str] = None
     genezio_project_id: Optional[str] = None
@@ -20,3 +24,8 @@ class Project(Document):
     created_at: datetime = datetime.now()
     updated_at: datetime = datetime.now()
     deleted_at: Optional[datetime] = None
+
+    class Settings:
+        indexes = [
+            IndexModel([("user_id", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)], name="user_id_created_at"),
+        ]
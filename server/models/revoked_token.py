@@ -0,0 +1,18 @@
+from datetime import datetime
+
+import pymongo
+from beanie import Document
+from pymongo import IndexModel
+
+
+class RevokedToken(Document):
+    token_hash: str
+    expire_at: datetime
+    created_at: datetime = datetime.now()
+
+    class Settings:
+        indexes = [
+            # Revocations are only needed until the token itself expires
+            IndexModel([("expire_at", pymongo.ASCENDING)], name="expire_at_ttl", expireAfterSeconds=0),
+            IndexModel([("created_at", pymongo.ASCENDING)], name="created_at"),
+        ]
@@ -1,7 +1,12 @@
 from datetime import datetime
 from typing import Optional
 
+import pymongo
 from beanie import Document
+from pymongo import IndexModel
+
+# Tokens of the free plan, measured from the provider reported usage
+HOBBY_MAX_TOKENS = 500_000
 
 
 class User(Document):
@@ -20,5 +25,12 @@ class User(Document):
         "name": "Hobby",
         "description": "Hobby subscription",
         "price": 0.0,
-        "max_tokens": 2000,
-    }
\ No newline at end of file
+        "max_tokens": HOBBY_MAX_TOKENS,
+    }
+
+    class Settings:
+        indexes = [
+            IndexModel([("email", pymongo.ASCENDING)], name="email_unique", unique=True),
+            # Most users have no pending code, keep them out of the index
+            IndexModel([("otp_code", pymongo.ASCENDING)], name="otp_code", sparse=True),
+        ]
@@ -1,15 +1,27 @@
+import asyncio
+import json
+import os
+import re
+from datetime import datetime
 from enum import Enum
-from typing import Dict, Type
+from typing import Dict, List, Optional, Tuple, Type
 
 from agents.backend_requirements_builder.types import (
     BackendRequirementsAgentPromptInput,
 )
 from agents.enchant_user_prompt.types import EnchantUserPromptAgentPromptInput
 from agents.project_generator.types import ProjectGeneratorAgentPromptInput
+from config.env_handler import PROMPT_REFRESH_SECONDS, PROMPT_SNAPSHOT_DIR
 from config.logger import logger
+from fastapi import HTTPException, status
 from langfuse import Langfuse
 from prompts.prompt_types import AgentPrompt, BaseAgentPromptInput
 
+# Same placeholder syntax as Langfuse prompt templates
+TEMPLATE_VARIABLE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+# Shipped with the code and never written, the last resort when Langfuse is unreachable at startup
+BUNDLED_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots")
+
 
 class AgentType(Enum):
     """Enum representing different types of agents."""
@@ -19,16 +31,45 @@ class AgentType(Enum):
     ENCHANT_USER_PROMPT = "enchant_user_prompt"
 
 
-class PromptFactory:
-    """Factory for creating agent prompts."""
+def _compile(template: str, variables: dict) -> str:
+    """Fill the `{{variable}}` placeholders, unknown ones are left untouched."""
+    return TEMPLATE_VARIABLE.sub(
+        lambda match: str(variables[match.group(1)]) if match.group(1) in variables else match.group(0),
+        template,
+    )
 
-    def __init__(self):
+
+class PromptFactory:
+    """
+    Factory for creating agent prompts.
+
+    Prompt templates are kept in memory and compiled locally, so resolving a
+    prompt never waits on Langfuse. They are preloaded at startup and refreshed
+    in the background, requests keep being served the previous version until a
+    refresh completes. Every fetched version is also written to an on-disk
+    snapshot in the data directory, which is used when Langfuse cannot be
+    reached, falling back to the snapshots bundled with the code. A prompt that
+    is still missing fails the request right away instead of fetching it on the
+    event loop.
+    """
+
+    def __init__(
+        self,
+        refresh_interval: int = PROMPT_REFRESH_SECONDS,
+        snapshot_dir: Optional[str] = PROMPT_SNAPSHOT_DIR,
+    ):
         self.langfuse = Langfuse()
+        self.refresh_interval = refresh_interval
+        self.snapshot_dir = snapshot_dir
         self._input_mapping: Dict[AgentType, Type[BaseAgentPromptInput]] = {
             AgentType.BACKEND_REQUIREMENTS: BackendRequirementsAgentPromptInput,
             AgentType.PROJECT_GENERATOR: ProjectGeneratorAgentPromptInput,
             AgentType.ENCHANT_USER_PROMPT: EnchantUserPromptAgentPromptInput,
         }
+        # agent type -> (version, source, system template, user template)
+        self._templates: Dict[AgentType, Tuple[Optional[int], str, str, str]] = {}
+        self._last_refresh: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
 
     def _validate_input(
         self, agent_type: AgentType, input_args: BaseAgentPromptInput
@@ -45,6 +86,100 @@ class PromptFactory:
                 f"Expected {expected_type.__name__}, got {type(input_args).__name__}"
             )
 
+    def _snapshot_path(self, agent_type: AgentType, directory: Optional[str] = None) -> str:
+        return os.path.join(directory or self.snapshot_dir, f"{agent_type.value}.json")
+
+    def _store(
+        self, agent_type: AgentType, version: Optional[int], messages: List[dict], source: str
+    ) -> None:
+        def template(role: str) -> str:
+            return next((message["content"] for message in messages if message["role"] == role), "")
+
+        self._templates[agent_type] = (version, source, template("system"), template("user"))
+
+    def _fetch(self, agent_type: AgentType) -> Tuple[Optional[int], List[dict]]:
+        """Fetch the current version from Langfuse, bypassing the SDK cache."""
+        prompt = self.langfuse.get_prompt(agent_type.value, type="chat", cache_ttl_seconds=0)
+        return prompt.version, prompt.prompt
+
+    def _read_snapshot(self, agent_type: AgentType) -> Tuple[Optional[int], List[dict], str]:
+        """The last fetched version, or the bundled one if this host never fetched the prompt."""
+        path = self._snapshot_path(agent_type)
+        source = "snapshot"
+        if not os.path.exists(path):
+            path = self._snapshot_path(agent_type, BUNDLED_SNAPSHOT_DIR)
+            source = "bundled"
+        with open(path) as f:
+            snapshot = json.load(f)
+        return snapshot["version"], snapshot["prompt"], source
+
+    def _write_snapshot(
+        self, agent_type: AgentType, version: Optional[int], messages: List[dict]
+    ) -> None:
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        path = self._snapshot_path(agent_type)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump({"name": agent_type.value, "version": version, "prompt": messages}, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+    async def _load(self, agent_type: AgentType) -> None:
+        current = self._templates.get(agent_type)
+        try:
+            version, messages = await asyncio.to_thread(self._fetch, agent_type)
+        except Exception as e:
+            if current is not None:
+                # Keep serving what we have, the next refresh tries again
+                logger.warning(f"Could not refresh prompt {agent_type.value}: {str(e)}")
+                return
+            logger.warning(f"Could not fetch prompt {agent_type.value}, using snapshot: {str(e)}")
+            version, messages, source = await asyncio.to_thread(self._read_snapshot, agent_type)
+            self._store(agent_type, version, messages, source)
+            return
+
+        if current is not None and current[0] == version and current[1] == "langfuse":
+            return
+        self._store(agent_type, version, messages, "langfuse")
+        logger.info(f"Loaded prompt {agent_type.value} version {version}")
+        try:
+            await asyncio.to_thread(self._write_snapshot, agent_type, version, messages)
+        except Exception as e:
+            logger.warning(f"Could not write snapshot for prompt {agent_type.value}: {str(e)}")
+
+    async def refresh(self) -> None:
+        results = await asyncio.gather(
+            *(self._load(agent_type) for agent_type in self._input_mapping), return_exceptions=True
+        )
+        for agent_type, result in zip(self._input_mapping, results):
+            if isinstance(result, Exception):
+                logger.error(f"No prompt available for {agent_type.value}: {str(result)}")
+        self._last_refresh = datetime.now()
+
+    async def start(self) -> None:
+        await self.refresh()
+        self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing prompts: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "prompts": {
+                agent_type.value: {"version": version, "source": source}
+                for agent_type, (version, source, _, _) in self._templates.items()
+            },
+            "last_refresh": self._last_refresh.isoformat() if self._last_refresh else None,
+        }
+
     def create_prompt(
         self, agent_type: AgentType, input_args: BaseAgentPromptInput
     ) -> AgentPrompt:
@@ -60,32 +195,27 @@ class PromptFactory:
 
         Raises:
             ValueError: If the agent type is not supported or input type is invalid
+            HTTPException: 503 if the prompt could not be loaded yet
         """
         logger.info(f"Creating prompt for agent type: {agent_type.value}")
 
         self._validate_input(agent_type, input_args)
 
-        try:
-            prompt = self.langfuse.get_prompt(agent_type.value, type="chat")
-            compiled_prompt = prompt.compile(**input_args.model_dump())
+        if agent_type not in self._templates:
+            # Neither the preload nor a snapshot provided the prompt, the refresh loop keeps trying
+            logger.error(f"Prompt {agent_type.value} is not loaded")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"The {agent_type.value} prompt is not available yet, please try again shortly",
+                headers={"Retry-After": str(self.refresh_interval)},
+            )
 
+        try:
+            _, _, system, client = self._templates[agent_type]
+            variables = input_args.model_dump()
             agent_prompt = AgentPrompt(
-                system=next(
-                    (
-                        prompt["content"]
-                        for prompt in compiled_prompt
-                        if prompt["role"] == "system"
-                    ),
-                    "",
-                ),
-                client=next(
-                    (
-                        prompt["content"]
-                        for prompt in compiled_prompt
-                        if prompt["role"] == "user"
-                    ),
-                    "",
-                ),
+                system=_compile(system, variables),
+                client=_compile(client, variables),
             )
 
             logger.info(f"Created prompt for {agent_type.value}")
@@ -13,7 +13,6 @@ from dtos.user import ForgotPassword, GoogleLogin, UserInput, UserLogin, UserUpd
 from fastapi import HTTPException, status
 from google.auth.transport import requests
 from google.oauth2 import id_token
-from models.active_session import ActiveSession
 from models.user import User
 from repository.session import SessionRepository
 from services.email_service import email_service
@@ -97,7 +96,7 @@ class AuthRepository:
 
     @staticmethod
     async def logout(session_token: str):
-        await ActiveSession.find_one({"session_token": session_token}).delete()
+        await SessionRepository.delete_session(session_token)
 
     @staticmethod
     async def update_user(id: str, properties: UserUpdate):
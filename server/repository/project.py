@@ -10,13 +10,14 @@ from fastapi import HTTPException
 from fastapi.encoders import jsonable_encoder
 from models.project import Project
 from repository.session import SessionRepository
-from services.s3_service import S3Service
+from services.project_store import ProjectStore, project_store
+from services.s3_service import s3_service
 from utils.name_generator import NameGenerator
 
 
 class ProjectRepository:
     def __init__(self):
-        self.s3_service = S3Service()
+        self.s3_service = s3_service
 
     @staticmethod
     async def create_project(project_input: ProjectInput, session_token: str):
@@ -69,17 +70,30 @@ class ProjectRepository:
             if str(session.user_id) != str(project.user_id):
                 raise HTTPException(status_code=403, detail="You don't have access to this project")
 
-            s3_service = S3Service()
-            if project.s3_folder_name:
-                project.s3_presigned_url = s3_service.get_file_url(f"{project.s3_folder_name}/project.zip")
-                await project.save()
-
             logger.info(f"Project: {project}")
             return project
         except Exception as e:
             logger.error(f"Error finding project: {str(e)}")
             raise HTTPException(status_code=404, detail="Project not found")
 
+    @staticmethod
+    async def presign_archive(project: Project) -> Project:
+        """Hand out a download URL for project.zip, rebuilding it first if the project store is ahead of it."""
+        if not project.s3_folder_name:
+            return project
+
+        if project.archive_outdated:
+            # Cleared before the rebuild, so a write that lands meanwhile marks it outdated again
+            await project.set({Project.archive_outdated: False})
+            try:
+                await project_store.materialize_archive(project.s3_folder_name)
+            except Exception:
+                await project.set({Project.archive_outdated: True})
+                raise
+        # The URL is only handed out, it is never written back on read
+        project.s3_presigned_url = s3_service.get_file_url(ProjectStore.archive_key(project.s3_folder_name))
+        return project
+
     @staticmethod
     async def get_all_projects(user_id: str):
         try:
@@ -1,19 +1,47 @@
 from datetime import datetime, timedelta
 
-from config.env_handler import ACCESS_TOKEN_EXPIRE_MINUTES
+from beanie import PydanticObjectId
+from config.env_handler import ACCESS_TOKEN_EXPIRE_MINUTES, AUTH_MODE
+from fastapi import HTTPException
 from models.active_session import ActiveSession
+from services.session_cache import session_cache
+from services.token_revocation import token_revocation_list
+from utils.jwt_helper import decode_access_token, get_token_expiration
 
 
 class SessionRepository:
+    @staticmethod
+    def get_session_from_token_claims(session_token: str):
+        """Build the session from the signed token itself, only logged-out tokens are looked up."""
+        try:
+            claims = decode_access_token(session_token)
+        except HTTPException:
+            return None
+        if token_revocation_list.is_revoked(session_token):
+            return None
+        return ActiveSession(
+            user_id=PydanticObjectId(claims["sub"]),
+            session_token=session_token,
+            expire_at=datetime.fromtimestamp(claims["exp"]),
+            created_at=datetime.now(),
+        )
+
     @staticmethod
     async def get_session(session_token: str):
+        if AUTH_MODE == "jwt":
+            return SessionRepository.get_session_from_token_claims(session_token)
+
+        session = session_cache.get(session_token)
+        if session:
+            return session
         session = await ActiveSession.find_one({"session_token": session_token})
+        if session:
+            session_cache.put(session)
         return session
 
     @staticmethod
     async def get_session_by_token(token: str):
-        session = await ActiveSession.find_one({"session_token": token})
-        return session
+        return await SessionRepository.get_session(token)
 
     @staticmethod
     async def get_session_by_user_id(user_id: str):
@@ -32,28 +60,46 @@ class SessionRepository:
 
         return response
 
+    @staticmethod
+    async def revoke_token(session_token: str):
+        # In jwt mode a token stays valid until it expires unless it is revoked
+        expire_at = get_token_expiration(session_token)
+        if expire_at and expire_at > datetime.now():
+            await token_revocation_list.revoke(session_token, expire_at)
+
     @staticmethod
     async def delete_session(session_token: str):
+        session_cache.invalidate(session_token)
+        await SessionRepository.revoke_token(session_token)
         await ActiveSession.find_one({"session_token": session_token}).delete()
 
     @staticmethod
     async def delete_session_by_user_id(user_id: str):
-        await ActiveSession.find_one({"user_id": user_id}).delete()
+        session_cache.invalidate_user(user_id)
+        session = await ActiveSession.find_one({"user_id": user_id})
+        if session:
+            await SessionRepository.revoke_token(session.session_token)
+            await session.delete()
 
     @staticmethod
     async def delete_all_sessions_by_user_id(user_id: str):
+        session_cache.invalidate_user(user_id)
+        async for session in ActiveSession.find({"user_id": user_id}):
+            await SessionRepository.revoke_token(session.session_token)
         await ActiveSession.find({"user_id": user_id}).delete()
 
     @staticmethod
     async def delete_all_sessions():
+        session_cache.clear()
         await ActiveSession.delete_many({})
 
     @staticmethod
     async def check_session_expiration(session_token: str):
-        session = await ActiveSession.find_one({"session_token": session_token})
+        session = await SessionRepository.get_session(session_token)
         if not session:
             return False
         if session.expire_at < datetime.now():
+            session_cache.invalidate(session_token)
             await session.delete()
             return False
         return True
@@ -64,13 +110,14 @@ class SessionRepository:
         if not session:
             return False
         if session.expire_at < datetime.now():
+            session_cache.invalidate_user(user_id)
             await session.delete()
             return False
         return True
 
     @staticmethod
     async def get_user_by_session_token(session_token: str):
-        session = await ActiveSession.find_one({"session_token": session_token})
+        session = await SessionRepository.get_session(session_token)
         if not session:
             return None
         return session.user_id
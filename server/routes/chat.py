@@ -1,36 +1,44 @@
-import io
+import asyncio
 import json
-import os
 import random
-import re
-import shutil
 import traceback
 import uuid
-import zipfile
+from typing import Optional
 
 from agents.agent_factory import AgentFactory, AgentType
 from config.logger import logger
 from dtos.agent import ChatRequest
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials
-from repository.auth import AuthRepository
+from models.project import Project
 from repository.project import ProjectRepository
 from repository.session import SessionRepository
 from routes.utils import BearerToken
+from services.admission_controller import admission_controller
+from services.generation_jobs import generation_job_queue
 from services.genezio_service import create_mongodb_uri, create_postgres_uri
-from services.s3_service import (
-    create_files_for_s3_json_content,
-    download_from_s3,
-    upload_zip_to_s3,
+from services.project_generation import (
+    generate_project,
+    parse_project_structure,
+    prepare_structure_item,
+    store_generated_project,
 )
+from services.project_store import project_store
+from services.zip_service import CodeArchiveWriter
 from utils.name_generator import NameGenerator
 
 router = APIRouter()
 
 security = BearerToken()
 
+QUEUE_POLL_SECONDS = 0.5
+# How long the queue stream waits for a call to show up and stays open after the last one left
+QUEUE_IDLE_POLLS = 10
+# Jobs running on another process are only visible through Mongo
+JOB_EVENTS_POLL_SECONDS = 2
+
 
 @router.post("/")
 async def chat(
@@ -56,9 +64,11 @@ async def chat(
 
         logger.debug(f"Langfuse session id: {langfuse_session_id}")
 
+        user_id = await SessionRepository.get_user_by_session_token(session_token=credentials.credentials)
+
         try:
             logger.debug(f"Getting agent: {request_data.agent}")
-            agent = AgentFactory.get_agent(request_data.agent, langfuse_session_id)
+            agent = AgentFactory.get_agent(request_data.agent, langfuse_session_id, user_id)
             logger.debug(f"Factory agent retrieved: {agent.name}")
         except ValueError as e:
             available_agents = AgentFactory.list_available_agents()
@@ -78,6 +88,8 @@ async def chat(
         return response
 
     except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error: {str(e)}")
 
 
@@ -108,22 +120,6 @@ async def backend_requirements(
             session_token=credentials.credentials
         )
 
-        user_repository = AuthRepository()
-        user = await user_repository.get_user(
-            id=user_id
-        )
-
-        subscription = user.subscription
-        max_tokens = subscription["max_tokens"]
-        token_usage = user.token_usage + 100
-
-        if token_usage >= max_tokens:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You have reached the maximum number of tokens")
-
-        # Update user token usage
-        user.token_usage = token_usage
-        await user.save()
-
         if not project:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
 
@@ -134,7 +130,7 @@ async def backend_requirements(
         else:
             langfuse_session_id = request_data.langfuse_session_id
 
-        requirements_agent = AgentFactory.get_agent(AgentType.BACKEND_REQUIREMENTS, langfuse_session_id)
+        requirements_agent = AgentFactory.get_agent(AgentType.BACKEND_REQUIREMENTS, langfuse_session_id, user_id)
         requirements_response = await requirements_agent.chat(
             message=request_data.message,
             history=request_data.history,
@@ -164,20 +160,15 @@ async def backend_requirements(
                 ]
                 jsonl_content = "\n".join(json.dumps(msg) for msg in messages)
 
-                # Create project folder structure
+                # Only the conversation changes, project.zip is rebuilt when it is downloaded
                 project_folder = request_data.project.projectId
                 project_structure = {
                     "structure": [{"type": "file", "path": "./history/conversation.jsonl", "content": jsonl_content}]
                 }
+                await project_store.put_structure(project_folder, project_structure)
 
-                # Save requirements in the project folder
-                project_path = await create_files_for_s3_json_content(project_structure, project_folder)
-                project_url = await upload_zip_to_s3(project_path, project_folder)
-
-                # Update project with the new URL and folder
-                project.s3_presigned_url = project_url
-                project.s3_folder_name = project_folder
-                await project.save()
+                # Only the changed fields are written, transient ones like the presigned URL stay out
+                await project.set({Project.s3_folder_name: project_folder, Project.archive_outdated: True})
 
         # Create streaming response
         response = StreamingResponse(stream_and_collect(), media_type="text/plain")
@@ -194,6 +185,18 @@ async def backend_requirements(
         )
 
 
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+
+async def _stream_project_generation(project, request_data: ChatRequest, generator_response: StreamingResponse):
+    """Report every written file as a server-sent event while the project is generated."""
+    async for event, data in generate_project(project, request_data, generator_response):
+        if event == "done":
+            data = {"code": status.HTTP_200_OK, **data}
+        yield _sse_event(event, data)
+
+
 @router.post("/project-generator")
 async def project_generator(
     request_data: ChatRequest,
@@ -224,27 +227,14 @@ async def project_generator(
             session_token=credentials.credentials
         )
 
-        user_repository = AuthRepository()
-        user = await user_repository.get_user(
-            id=user_id
-        )
-
-        subscription = user.subscription
-        max_tokens = subscription["max_tokens"]
-        token_usage = user.token_usage + 150
-
-        if token_usage >= max_tokens:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You have reached the maximum number of tokens")
-
-        # Update user token usage
-        user.token_usage = token_usage
-        await user.save()
-
         langfuse_session_id = None
 
         if not request_data.langfuse_session_id:
             langfuse_session_id = str(uuid.uuid4())
-        generator_agent = AgentFactory.get_agent(AgentType.PROJECT_GENERATOR, langfuse_session_id)
+
+        streaming = bool(request_data.options and request_data.options.streaming)
+
+        generator_agent = AgentFactory.get_agent(AgentType.PROJECT_GENERATOR, langfuse_session_id, user_id)
         project_structure = await generator_agent.chat(
             message=request_data.message,
             history=request_data.history,
@@ -255,160 +245,36 @@ async def project_generator(
             json_mode=True,
         )
 
-        json_patterns = [
-            r"```json\n(.*?)\n```",
-            r"```\n(.*?)\n```",
-            r"\{.*\}",
-        ]
-
-        json_content = None
-        for pattern in json_patterns:
-            json_match = re.search(pattern, project_structure, re.DOTALL)
-            if json_match:
-                try:
-                    # Try to get the first group, if it exists
-                    group_content = json_match.group(1) if len(json_match.groups()) > 0 else json_match.group(0)
-                    json_content = json.loads(group_content)
-
-                    database_name = project.database_name.replace("-", "_")
-
-                    group_content = group_content.replace("MONGODB_URI", f"{database_name.upper()}_DATABASE_URL")
-                    group_content = group_content.replace("POSTGRES_URI", f"{database_name.upper()}_DATABASE_URL")
-                    json_content = json.loads(group_content)
+        if streaming:
+            return StreamingResponse(
+                _stream_project_generation(project, request_data, project_structure),
+                media_type="text/event-stream",
+            )
 
-                    break
-                except json.JSONDecodeError:
-                    continue
+        json_content = parse_project_structure(project_structure)
 
-        if not json_content:
+        if not json_content or not isinstance(json_content, dict) or "structure" not in json_content:
             logger.error(f"Project generator response: {project_structure}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Could not find valid JSON structure in the response. Please try again.",
             )
 
-        # Remove .env file from structure if llm returns it
-        if isinstance(json_content, dict) and "structure" in json_content:
-            json_content["structure"] = [
-                item for item in json_content["structure"] if not (item["type"] == "file" and item["path"] == ".env")
-            ]
+        logger.debug(f"Project generator response: {json_content}")
 
-        try:
-            logger.debug(f"Project generator response: {json_content}")
-            logger.info(f"Project generator response: {json_content}")
-
-            project_folder = request_data.project.projectId
-            # Create temporary directory for project files
-            tmp_dir = f"/tmp/{project_folder}"
-            os.makedirs(tmp_dir, exist_ok=True)
-
-            # First, download existing files from S3 if they exist
-            if project.s3_presigned_url:
-                try:
-                    response = await download_from_s3(project.s3_presigned_url)
-                    with zipfile.ZipFile(io.BytesIO(response), "r") as zip_ref:
-                        zip_ref.extractall(tmp_dir)
-                except Exception as e:
-                    logger.warning(f"Could not download existing files from S3: {str(e)}")
-
-            # Create required directories
-            structure_dir = os.path.join(tmp_dir, "structure")
-            history_dir = os.path.join(tmp_dir, "history")
-            code_dir = os.path.join(tmp_dir, "code")
-            os.makedirs(structure_dir, exist_ok=True)
-            os.makedirs(history_dir, exist_ok=True)
-            os.makedirs(code_dir, exist_ok=True)
-
-            # Check if conversation.jsonl exists from backend requirements
-            conversation_path = os.path.join(history_dir, "conversation.jsonl")
-            if not os.path.exists(conversation_path):
-                # Only create new conversation.jsonl if it doesn't exist
-                messages = [
-                    {"role": "user", "content": request_data.message},
-                ]
-                jsonl_content = "\n".join(json.dumps(msg) for msg in messages)
-                with open(conversation_path, "w") as f:
-                    f.write(jsonl_content)
-
-            # Save the json_content as project.json
-            with open(os.path.join(structure_dir, "project.json"), "w") as f:
-                json.dump(json_content, f, indent=2)
-
-            db_created, db_uri = False, None
-
-            # Create actual code files in the code directory based on json_content
-            async def create_files_from_structure(structure, base_path):
-                for item in structure:
-                    if item["type"] == "file":
-                        # Create directory structure if needed
-                        file_path = os.path.join(base_path, item["path"].replace("./", ""))
-                        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-
-                        # Write file content
-                        with open(file_path, "w") as f:
-                            if isinstance(item["content"], dict):
-                                f.write(json.dumps(item["content"], indent=2))
-                            else:
-                                f.write(str(item["content"]))
-                    elif item["type"] == "directory":
-                        # Create directory and process its contents if they exist
-                        dir_path = os.path.join(base_path, item["path"].replace("./", ""))
-                        os.makedirs(dir_path, exist_ok=True)
-                        if isinstance(item.get("content"), list):
-                            await create_files_from_structure(item["content"], base_path)
-
-            if isinstance(json_content, dict) and "structure" in json_content:
-                await create_files_from_structure(json_content["structure"], code_dir)
-            # Create ZIP for files in code directory
-            zip_path = os.path.join(code_dir, "code.zip")
-            with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-                for root, dirs, files in os.walk(code_dir):
-                    for file in files:
-                        if file != "code.zip":  # Skip the zip file itself
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, code_dir)
-                            zipf.write(file_path, arcname)
-
-            # Clean up all files in code directory except the zip
-            for root, dirs, files in os.walk(code_dir):
-                for file in files:
-                    if file != "code.zip":
-                        os.remove(os.path.join(root, file))
-                for dir in dirs:
-                    shutil.rmtree(os.path.join(root, dir))
-
-            # Create a zip of the entire project folder
-            project_zip_path = f"/tmp/{project_folder}.zip"
-            with zipfile.ZipFile(project_zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-                for root, dirs, files in os.walk(tmp_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, tmp_dir)
-                        zipf.write(file_path, arcname)
-
-            # Upload the project zip to S3
-            project_url = await upload_zip_to_s3(project_zip_path, project_folder)
-
-            # Clean up temporary files
-            shutil.rmtree(tmp_dir)
-            os.remove(project_zip_path)
-
-            # Update project with the new URL and folder
-            project.s3_presigned_url = project_url
-            project.s3_folder_name = project_folder
-            if db_created:
-                project.db_uri = db_uri
-            await project.save()
-
-            project_dict = jsonable_encoder(project)
-            return JSONResponse(
-                status_code=status.HTTP_200_OK, content={"code": status.HTTP_200_OK, "project": project_dict}
-            )
+        database_name = project.database_name.replace("-", "_")
+        writer = CodeArchiveWriter()
+        for item in json_content["structure"]:
+            item = prepare_structure_item(item, database_name)
+            if item is not None:
+                writer.add_item(item)
 
-        except json.JSONDecodeError as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Invalid JSON in response: {str(e)}"
-            )
+        project = await store_generated_project(project, request_data, writer)
+
+        project_dict = jsonable_encoder(project)
+        return JSONResponse(
+            status_code=status.HTTP_200_OK, content={"code": status.HTTP_200_OK, "project": project_dict}
+        )
 
     except Exception as e:
         logger.error(f"Error in project generator: {str(e)}")
@@ -419,6 +285,111 @@ async def project_generator(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error generating project: {str(e)}"
         )
 
+
+def _job_dict(job) -> dict:
+    return jsonable_encoder(job, exclude={"request", "idempotency_key"})
+
+
+@router.post("/project-generator/jobs")
+async def submit_project_generation(
+    request_data: ChatRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    idempotency_key: Optional[str] = Header(None),
+):
+    """Queue a project generation, the result is polled or followed with server-sent events."""
+    try:
+        if not request_data.message.strip():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Message cannot be empty",
+            )
+
+        if not request_data.agent == AgentType.PROJECT_GENERATOR:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Agent must be PROJECT_GENERATOR")
+
+        if not request_data.project:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Project is required")
+
+        project_repository = ProjectRepository()
+        project = await project_repository.get_project(
+            id=request_data.project.projectId, session_token=credentials.credentials
+        )
+
+        if not project:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+
+        user_id = await SessionRepository.get_user_by_session_token(session_token=credentials.credentials)
+
+        job = await generation_job_queue.submit(str(user_id), request_data, idempotency_key)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED, content={"code": status.HTTP_202_ACCEPTED, "job": _job_dict(job)}
+        )
+
+    except Exception as e:
+        logger.error(f"Error submitting project generation: {str(e)}")
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error submitting project generation: {str(e)}"
+        )
+
+
+@router.get("/project-generator/jobs/{job_id}")
+async def get_project_generation(job_id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    user_id = await SessionRepository.get_user_by_session_token(session_token=credentials.credentials)
+    job = await generation_job_queue.get(job_id, str(user_id))
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return JSONResponse(status_code=status.HTTP_200_OK, content={"code": status.HTTP_200_OK, "job": _job_dict(job)})
+
+
+async def _stream_job_events(job_id: str, user_id: str):
+    last_state = None
+    while True:
+        job = await generation_job_queue.get(job_id, user_id)
+        if not job:
+            yield _sse_event("error", {"detail": "Job not found"})
+            return
+        state = (job.status, job.files)
+        if state != last_state:
+            yield _sse_event("status", {"status": job.status, "files": job.files})
+            last_state = state
+        if job.status == "completed":
+            yield _sse_event("done", {"code": status.HTTP_200_OK, "project": job.result})
+            return
+        if job.status == "failed":
+            yield _sse_event("error", {"detail": job.error})
+            return
+        await generation_job_queue.wait_for_update(job_id, JOB_EVENTS_POLL_SECONDS)
+
+
+@router.get("/project-generator/jobs/{job_id}/events")
+async def project_generation_events(job_id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Server-sent events with the progress of a job, reconnecting resumes from its current state."""
+    user_id = await SessionRepository.get_user_by_session_token(session_token=credentials.credentials)
+    return StreamingResponse(_stream_job_events(job_id, str(user_id)), media_type="text/event-stream")
+
+
+async def _stream_queue_positions(user_id: str):
+    last_positions = None
+    idle_polls = 0
+    while idle_polls < QUEUE_IDLE_POLLS:
+        positions = admission_controller.queue_positions(user_id)
+        if positions != last_positions:
+            yield _sse_event("queue", {"positions": positions, "queued": len(positions)})
+            last_positions = positions
+        idle_polls = 0 if positions else idle_polls + 1
+        await asyncio.sleep(QUEUE_POLL_SECONDS)
+    yield _sse_event("done", {})
+
+
+@router.get("/queue")
+async def queue_position(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Server-sent events with the positions of the caller's LLM calls waiting for admission."""
+    user_id = await SessionRepository.get_user_by_session_token(session_token=credentials.credentials)
+    return StreamingResponse(_stream_queue_positions(str(user_id)), media_type="text/event-stream")
+
+
 @router.post("/enhance-prompt")
 async def enhance_prompt(
     request_data: ChatRequest,
@@ -438,27 +409,12 @@ async def enhance_prompt(
             session_token=credentials.credentials
         )
         
-        user_repository = AuthRepository()
-        user = await user_repository.get_user(
-            id=user_id
-        )
-
-        subscription = user.subscription
-        max_tokens = subscription["max_tokens"]
-        token_usage = user.token_usage + 50
-
-        if token_usage >= max_tokens:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="You have reached the maximum number of tokens, please upgrade your subscription")
-        
-        user.token_usage = token_usage
-        await user.save()
-
         langfuse_session_id = None
 
         if not request_data.langfuse_session_id:
             langfuse_session_id = str(uuid.uuid4())
 
-        enchant_user_prompt_agent = AgentFactory.get_agent(AgentType.ENCHANT_USER_PROMPT, langfuse_session_id)
+        enchant_user_prompt_agent = AgentFactory.get_agent(AgentType.ENCHANT_USER_PROMPT, langfuse_session_id, user_id)
         response = await enchant_user_prompt_agent.chat(
             message=request_data.message,
             history=request_data.history,
@@ -0,0 +1,39 @@
+from agents.response_cache import response_cache
+from agents.utils import llm_router
+from config.env_handler import AUTH_MODE
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import JSONResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from prompts.get_prompt import prompt_factory
+from routes.utils import BearerToken
+from services.admission_controller import admission_controller
+from services.generation_jobs import generation_job_queue
+from services.quota_service import quota_service
+from services.session_cache import session_cache
+from services.token_revocation import token_revocation_list
+from services.usage_meter import usage_meter
+
+router = APIRouter()
+security = BearerToken()
+
+
+@router.get("/")
+async def get_metrics(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "code": status.HTTP_200_OK,
+            "metrics": {
+                "admission": admission_controller.stats(),
+                "auth_mode": AUTH_MODE,
+                "generation_jobs": generation_job_queue.stats(),
+                "llm_router": llm_router.stats(),
+                "prompts": prompt_factory.stats(),
+                "quota": quota_service.stats(),
+                "response_cache": response_cache.stats(),
+                "session_cache": session_cache.stats(),
+                "token_revocation": token_revocation_list.stats(),
+                "token_usage": usage_meter.stats(),
+            },
+        },
+    )
@@ -3,14 +3,15 @@ from typing import Optional
 
 from config.logger import logger
 from dtos.project import ProjectInput
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, status
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from repository.project import ProjectRepository
 from repository.session import SessionRepository
 from routes.utils import BearerToken
+from services.build_machine_service import get_build, stream_build_events, submit_build
 
 router = APIRouter()
 
@@ -43,6 +44,7 @@ async def get_project(id: str, credentials: HTTPAuthorizationCredentials = Depen
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Project not found"
             )
+        project = await ProjectRepository.presign_archive(project)
         return {"code": 200, "project": project}
     except Exception as e:
         if isinstance(e, HTTPException):
@@ -107,6 +109,7 @@ async def check_project_s3(id: str, credentials: HTTPAuthorizationCredentials =
                 detail="Project not found"
             )
 
+        project = await ProjectRepository.presign_archive(project)
         s3_info = {"s3_folder_name": project.s3_folder_name, "s3_presigned_url": project.s3_presigned_url}
         return JSONResponse(status_code=status.HTTP_200_OK, content={"code": status.HTTP_200_OK, "s3_info": s3_info})
     except Exception as e:
@@ -121,12 +124,15 @@ async def check_project_s3(id: str, credentials: HTTPAuthorizationCredentials =
 class UpdateProjectRequest(BaseModel):
     deployment_url: Optional[str] = None
     database_uri: Optional[str] = None
+    genezio_project_id: Optional[str] = None
 
 
 @router.put("/update/{id}/deployment-url")
 async def update_project(id: str, request: UpdateProjectRequest, credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
-        project = await ProjectRepository.update_project_deployment_url(id, request.deployment_url, request.database_uri)
+        project = await ProjectRepository.update_project_deployment_url(
+            id, request.deployment_url, request.database_uri, request.genezio_project_id
+        )
         if not project:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -139,4 +145,57 @@ async def update_project(id: str, request: UpdateProjectRequest, credentials: HT
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/build/{id}")
+async def project_build(id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Queue a deploy of the project, its progress is followed on /build/{job_id}/logs."""
+    try:
+        session_token = credentials.credentials
+        project = await ProjectRepository.get_project(id, session_token)
+        if not project.s3_folder_name:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="The project has not been generated yet"
+            )
+
+        project = await ProjectRepository.presign_archive(project)
+        job = await submit_build(
+            {
+                "project_id": str(project.id),
+                "presigned_url": project.s3_presigned_url,
+                "project_name": project.name,
+                "region": project.region,
+                "database_name": project.database_name,
+            },
+            session_token,
+        )
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"code": status.HTTP_202_ACCEPTED, "job": job})
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@router.get("/build/{job_id}")
+async def project_build_status(job_id: str, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    job = await get_build(job_id, credentials.credentials)
+    return {"code": 200, "job": job}
+
+
+@router.get("/build/{job_id}/logs")
+async def project_build_logs(
+    job_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    last_event_id: Optional[str] = Header(None),
+):
+    """Server-sent events of a deploy, relayed from the build machine."""
+    return StreamingResponse(
+        stream_build_events(job_id, credentials.credentials, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -19,25 +19,23 @@ class BearerToken(HTTPBearer):
         token = authorization.split(" ")[1]
 
         try:
-            # Try to find session with token
+            # Served from the session cache, the routes reuse it for the rest of the request
             session = await SessionRepository.get_session(token)
             if not session:
-                # If not found, try to find session with apiToken
-                session = await SessionRepository.get_session_by_token(token)
-                if not session:
-                    raise HTTPException(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        detail="Invalid authorization token",
-                    )
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid authorization token",
+                )
 
             # Check if session is expired
             if session.expire_at < datetime.now():
-                await session.delete()
+                await SessionRepository.delete_session(token)
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Session expired",
                 )
 
+            request.state.session = session
             return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
 
         except Exception as e:
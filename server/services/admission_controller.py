@@ -0,0 +1,281 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Dict, List, Optional, Tuple
+
+from agents.utils import LLMProvider
+from beanie import PydanticObjectId
+from config.env_handler import (
+    ANTHROPIC_RPM,
+    ANTHROPIC_TPM,
+    GEMINI_RPM,
+    GEMINI_TPM,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_QUEUE,
+    LLM_QUEUE_TIMEOUT_SECONDS,
+    OPENAI_RPM,
+    OPENAI_TPM,
+)
+from config.logger import logger
+from fastapi import HTTPException, status
+from models.user import User
+
+# Concurrent LLM calls and fair-queue weight per subscription
+SUBSCRIPTION_LIMITS = {
+    "Hobby": (2, 1),
+    "Pro": (4, 2),
+    "Enterprise": (8, 4),
+}
+DEFAULT_SUBSCRIPTION = "Hobby"
+SUBSCRIPTION_CACHE_SECONDS = 60
+# Completion tokens assumed when a request does not set max_tokens
+DEFAULT_OUTPUT_TOKENS = 1024
+# A slot whose stream is never consumed is reclaimed after this long
+TICKET_LEASE_SECONDS = 600
+
+
+class TokenBucket:
+    """Refills `limit` units per minute, up to `limit`."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.tokens = float(limit)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.limit / 60)
+        self.updated = now
+
+    def wait_time(self, amount: int) -> float:
+        """Seconds until `amount` units are available, requests larger than the bucket wait for a full one."""
+        missing = min(amount, self.limit) - self.tokens
+        return max(missing, 0) * 60 / self.limit
+
+    def take(self, amount: int):
+        self.tokens -= min(amount, self.limit)
+
+
+class Ticket:
+    """An admitted LLM call, releasing it hands the slot to the next request in the queue."""
+
+    def __init__(self, controller: "AdmissionController", user_key: str):
+        self._controller = controller
+        self.user_key = user_key
+        self.released = False
+        self._lease = asyncio.get_running_loop().call_later(TICKET_LEASE_SECONDS, self.release)
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._lease.cancel()
+            self._controller._release(self)
+
+
+class _Waiter:
+    def __init__(self, user_key: str, provider: LLMProvider, tokens: int, concurrency: int):
+        self.user_key = user_key
+        self.provider = provider
+        self.tokens = tokens
+        self.concurrency = concurrency
+        self.start_tag = 0.0
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class AdmissionController:
+    """
+    Admission control for LLM calls.
+
+    Each provider has a requests-per-minute and a tokens-per-minute bucket sized
+    to the vendor limits, each user a number of concurrent calls set by their
+    subscription, and the process a global cap. Requests that cannot start yet
+    wait in a weighted fair queue: a request's finish tag grows with its token
+    cost divided by the subscription weight, so a user submitting a burst only
+    delays their own later requests. A full queue or a request waiting longer
+    than the queue timeout is rejected with a 503 instead of being sent on to
+    collect a 429 from the provider.
+    """
+
+    def __init__(self):
+        self.buckets: Dict[LLMProvider, Tuple[TokenBucket, TokenBucket]] = {
+            LLMProvider.OPENAI: (TokenBucket(OPENAI_RPM), TokenBucket(OPENAI_TPM)),
+            LLMProvider.ANTHROPIC: (TokenBucket(ANTHROPIC_RPM), TokenBucket(ANTHROPIC_TPM)),
+            LLMProvider.GEMINI: (TokenBucket(GEMINI_RPM), TokenBucket(GEMINI_TPM)),
+        }
+        self._queue: List[Tuple[float, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._finish_tags: Dict[str, float] = {}
+        self._active: Dict[str, int] = {}
+        self._subscriptions: Dict[str, Tuple[str, float]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    async def _subscription(self, user_id: str) -> str:
+        cached = self._subscriptions.get(user_id)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        user = await User.get(PydanticObjectId(user_id))
+        name = user.subscription.get("name", DEFAULT_SUBSCRIPTION) if user else DEFAULT_SUBSCRIPTION
+        self._subscriptions[user_id] = (name, time.monotonic() + SUBSCRIPTION_CACHE_SECONDS)
+        return name
+
+    async def _limits(self, user_id: Optional[str]) -> Tuple[str, int, int]:
+        """The queue key, concurrent calls and fair-queue weight of a caller."""
+        if not user_id:
+            # Internal calls are only bound by the global cap
+            return "internal", LLM_MAX_CONCURRENCY, 1
+        subscription = await self._subscription(str(user_id))
+        concurrency, weight = SUBSCRIPTION_LIMITS.get(subscription, SUBSCRIPTION_LIMITS[DEFAULT_SUBSCRIPTION])
+        return str(user_id), concurrency, weight
+
+    async def acquire(
+        self, user_id: Optional[str], provider: LLMProvider, input_tokens: int, max_tokens: Optional[int] = None
+    ) -> Ticket:
+        user_key, concurrency, weight = await self._limits(user_id)
+        tokens = input_tokens + (max_tokens or DEFAULT_OUTPUT_TOKENS)
+
+        if len(self._queue) >= LLM_MAX_QUEUE:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="The service is at capacity, please try again shortly",
+                headers={"Retry-After": "10"},
+            )
+
+        waiter = _Waiter(user_key, provider, tokens, concurrency)
+        waiter.start_tag = max(self._virtual_time, self._finish_tags.get(user_key, 0.0))
+        finish_tag = waiter.start_tag + tokens / weight
+        self._finish_tags[user_key] = finish_tag
+        heapq.heappush(self._queue, (finish_tag, next(self._sequence), waiter))
+        self._dispatch()
+
+        if not waiter.future.done():
+            self.queued += 1
+            logger.info(f"LLM call for {user_key} queued at position {self.position(waiter)}")
+        try:
+            return await asyncio.wait_for(asyncio.shield(waiter.future), timeout=LLM_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="The service is at capacity, please try again shortly",
+                headers={"Retry-After": "10"},
+            )
+        except asyncio.CancelledError:
+            # The client went away while waiting
+            self._abandon(waiter)
+            raise
+
+    async def try_acquire(
+        self, user_id: Optional[str], provider: LLMProvider, input_tokens: int, max_tokens: Optional[int] = None
+    ) -> Optional[Ticket]:
+        """Admit a speculative call only if it can start right away, it never queues or jumps the queue."""
+        user_key, concurrency, _ = await self._limits(user_id)
+        tokens = input_tokens + (max_tokens or DEFAULT_OUTPUT_TOKENS)
+
+        now = time.monotonic()
+        request_bucket, token_bucket = self.buckets[provider]
+        request_bucket.refill(now)
+        token_bucket.refill(now)
+        if (
+            any(not entry[2].future.done() for entry in self._queue)
+            or sum(self._active.values()) >= LLM_MAX_CONCURRENCY
+            or self._active.get(user_key, 0) >= concurrency
+            or request_bucket.wait_time(1) > 0
+            or token_bucket.wait_time(tokens) > 0
+        ):
+            return None
+        return self._admit(user_key, provider, tokens)
+
+    def _admit(self, user_key: str, provider: LLMProvider, tokens: int) -> Ticket:
+        request_bucket, token_bucket = self.buckets[provider]
+        request_bucket.take(1)
+        token_bucket.take(tokens)
+        self._active[user_key] = self._active.get(user_key, 0) + 1
+        self.admitted += 1
+        return Ticket(self, user_key)
+
+    def _abandon(self, waiter: _Waiter):
+        if waiter.future.done() and not waiter.future.cancelled():
+            # Admitted just as the caller gave up, hand the slot on
+            waiter.future.result().release()
+        else:
+            waiter.future.cancel()
+            self._dispatch()
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        now = time.monotonic()
+        for request_bucket, token_bucket in self.buckets.values():
+            request_bucket.refill(now)
+            token_bucket.refill(now)
+
+        next_check = None
+        remaining = []
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            waiter = entry[2]
+            if waiter.future.done():
+                continue
+            at_capacity = sum(self._active.values()) >= LLM_MAX_CONCURRENCY
+            if at_capacity or self._active.get(waiter.user_key, 0) >= waiter.concurrency:
+                remaining.append(entry)
+                continue
+            request_bucket, token_bucket = self.buckets[waiter.provider]
+            wait = max(request_bucket.wait_time(1), token_bucket.wait_time(waiter.tokens))
+            if wait > 0:
+                next_check = wait if next_check is None else min(next_check, wait)
+                remaining.append(entry)
+                continue
+
+            self._virtual_time = max(self._virtual_time, waiter.start_tag)
+            waiter.future.set_result(self._admit(waiter.user_key, waiter.provider, waiter.tokens))
+
+        for entry in remaining:
+            heapq.heappush(self._queue, entry)
+        if not self._queue:
+            # Idle, tags start over so they cannot grow without bound
+            self._virtual_time = 0.0
+            self._finish_tags = {user_key: 0.0 for user_key in self._active}
+        if next_check is not None:
+            self._timer = asyncio.get_running_loop().call_later(next_check, self._dispatch)
+
+    def _release(self, ticket: Ticket):
+        active = self._active.get(ticket.user_key, 0) - 1
+        if active > 0:
+            self._active[ticket.user_key] = active
+        else:
+            self._active.pop(ticket.user_key, None)
+        self._dispatch()
+
+    def position(self, waiter: _Waiter) -> Optional[int]:
+        ordered = [entry[2] for entry in sorted(self._queue) if not entry[2].future.done()]
+        return ordered.index(waiter) + 1 if waiter in ordered else None
+
+    def queue_positions(self, user_id: str) -> List[int]:
+        """1-based positions of the user's waiting calls in dispatch order."""
+        ordered = [entry[2] for entry in sorted(self._queue) if not entry[2].future.done()]
+        return [index + 1 for index, waiter in enumerate(ordered) if waiter.user_key == str(user_id)]
+
+    def stats(self) -> dict:
+        return {
+            "active": sum(self._active.values()),
+            "queued_now": len(self._queue),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "buckets": {
+                provider.value: {"requests": int(request_bucket.tokens), "tokens": int(token_bucket.tokens)}
+                for provider, (request_bucket, token_bucket) in self.buckets.items()
+            },
+        }
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,64 @@
+import json
+from typing import AsyncIterator, Optional
+
+import httpx
+from config.env_handler import BUILD_MACHINE_URL
+from config.logger import logger
+from fastapi import HTTPException, status
+
+
+async def _request_build_machine(method: str, path: str, session_token: str, json_body: Optional[dict] = None) -> dict:
+    """Call the build machine with the caller's session token, its errors are raised as HTTPException."""
+    try:
+        async with httpx.AsyncClient(base_url=BUILD_MACHINE_URL, timeout=httpx.Timeout(30)) as client:
+            response = await client.request(
+                method, path, json=json_body, headers={"Authorization": f"Bearer {session_token}"}
+            )
+    except httpx.HTTPError as e:
+        logger.error(f"Error calling the build machine at {path}: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Build machine unavailable")
+
+    if response.status_code == status.HTTP_404_NOT_FOUND:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Build not found")
+    if response.status_code >= 400:
+        logger.error(f"Build machine returned {response.status_code} for {path}: {response.text}")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Build machine unavailable")
+    return response.json()
+
+
+async def submit_build(build: dict, session_token: str) -> dict:
+    """Queue a deploy on the build machine and return the job, it is followed with `stream_build_events`."""
+    return (await _request_build_machine("POST", "/builds", session_token, build))["job"]
+
+
+async def get_build(job_id: str, session_token: str) -> dict:
+    return (await _request_build_machine("GET", f"/builds/{job_id}", session_token))["job"]
+
+
+async def stream_build_events(
+    job_id: str, session_token: str, last_event_id: Optional[str] = None
+) -> AsyncIterator[bytes]:
+    """
+    Relay the server-sent events of a build from the build machine as they arrive.
+
+    The caller's session token is forwarded, the build machine only streams
+    builds that were submitted with it. Last-Event-ID is passed on so a
+    reconnecting client resumes where it left off.
+    """
+    headers = {"Authorization": f"Bearer {session_token}"}
+    if last_event_id:
+        headers["Last-Event-ID"] = last_event_id
+
+    try:
+        # No read timeout, deploys stay quiet for minutes between lines
+        async with httpx.AsyncClient(base_url=BUILD_MACHINE_URL, timeout=httpx.Timeout(10, read=None)) as client:
+            async with client.stream("GET", f"/builds/{job_id}/logs", headers=headers) as response:
+                if response.status_code != 200:
+                    detail = "Build not found" if response.status_code == 404 else "Build machine unavailable"
+                    yield f"event: error\ndata: {json.dumps({'detail': detail})}\n\n".encode()
+                    return
+                async for chunk in response.aiter_raw():
+                    yield chunk
+    except httpx.HTTPError as e:
+        logger.error(f"Error streaming build {job_id}: {str(e)}")
+        yield f"event: error\ndata: {json.dumps({'detail': 'Build machine unavailable'})}\n\n".encode()
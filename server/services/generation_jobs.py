@@ -0,0 +1,292 @@
+import asyncio
+import hashlib
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from agents.agent_factory import AgentFactory, AgentType
+from beanie import PydanticObjectId, UpdateResponse
+from bson import ObjectId
+from bson.errors import InvalidId
+from config.env_handler import (
+    GENERATION_JOB_MAX_ATTEMPTS,
+    GENERATION_JOB_POLL_SECONDS,
+    GENERATION_JOB_STALE_SECONDS,
+    GENERATION_WORKERS,
+)
+from config.logger import logger
+from dtos.agent import AgentOptions, ChatRequest
+from fastapi.encoders import jsonable_encoder
+from models.generation_job import GenerationJob
+from models.project import Project
+from pymongo.errors import DuplicateKeyError
+from services.project_generation import generate_project
+
+HEARTBEAT_SECONDS = 10
+
+
+class GenerationJobQueue:
+    """
+    Runs project generations in background workers, detached from the HTTP request.
+
+    Jobs are persisted as GenerationJob documents. A worker claims a queued job with
+    an atomic status update, so with several API processes each job runs once, and
+    the queue polls Mongo for queued jobs so that jobs submitted to another process
+    or interrupted by a restart are picked up. Progress of the jobs running here is
+    kept in memory for subscribers and written to Mongo with every heartbeat.
+    """
+
+    def __init__(self, workers: int = GENERATION_WORKERS, poll_interval: int = GENERATION_JOB_POLL_SECONDS):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._queued: Set[str] = set()
+        # Jobs running in this process, by id
+        self._running: Dict[str, GenerationJob] = {}
+        self._updates: Dict[str, asyncio.Event] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.completed = 0
+        self.failed = 0
+        self.deduplicated = 0
+
+    @staticmethod
+    def idempotency_key(user_id: str, request_data: ChatRequest) -> str:
+        """
+        Identical submissions of a user share a key unless the client sends its own.
+
+        The derived key only deduplicates while its job is queued or running, submitting
+        the same prompt after it finished starts a new generation.
+        """
+        payload = [user_id, request_data.project.projectId, request_data.message.strip(), request_data.model]
+        return hashlib.sha256(json.dumps(payload).encode()).hexdigest()
+
+    async def submit(
+        self, user_id: str, request_data: ChatRequest, idempotency_key: Optional[str] = None
+    ) -> GenerationJob:
+        """Queue a generation, a repeated submit returns the existing job instead of running the llm again."""
+        key = idempotency_key or self.idempotency_key(user_id, request_data)
+        query = {"user_id": user_id, "idempotency_key": key}
+        now = datetime.now()
+
+        job = await GenerationJob.find_one(query)
+        if job is not None and idempotency_key is None and job.status in ("completed", "failed"):
+            # A finished job gives the derived key up, its id keeps the retired key unique
+            await GenerationJob.find_one({"_id": job.id, "idempotency_key": key}).update(
+                {"$set": {"idempotency_key": f"{key}:{job.id}", "updated_at": now}}
+            )
+            job = None
+
+        if job is None:
+            job = GenerationJob(
+                user_id=user_id,
+                project_id=request_data.project.projectId,
+                idempotency_key=key,
+                request=request_data.model_dump(),
+                created_at=now,
+                updated_at=now,
+            )
+            try:
+                await job.insert()
+            except DuplicateKeyError:
+                # A concurrent submit of the same request got there first
+                self.deduplicated += 1
+                return await GenerationJob.find_one(query)
+        elif job.status == "failed":
+            # Only failed jobs run again, the retry starts with a fresh attempt budget
+            job = await GenerationJob.find_one({"_id": job.id, "status": "failed"}).update(
+                {"$set": {"status": "queued", "error": None, "attempts": 0, "files": 0, "updated_at": now}},
+                response_type=UpdateResponse.NEW_DOCUMENT,
+            ) or await GenerationJob.get(job.id)
+        else:
+            self.deduplicated += 1
+            return job
+
+        self._enqueue(str(job.id))
+        return job
+
+    async def get(self, job_id: str, user_id: str) -> Optional[GenerationJob]:
+        job = self._running.get(job_id)
+        if job is None:
+            try:
+                job = await GenerationJob.get(PydanticObjectId(job_id))
+            except InvalidId:
+                return None
+        if job is None or job.user_id != str(user_id):
+            return None
+        return job
+
+    async def wait_for_update(self, job_id: str, timeout: float):
+        """Return once a job running here changed, or after `timeout` for jobs running elsewhere."""
+        event = self._updates.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _notify(self, job_id: str):
+        event = self._updates.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    def _enqueue(self, job_id: str):
+        if job_id not in self._queued and job_id not in self._running:
+            self._queued.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._poll_loop()))
+        logger.info(f"Started {self.workers} generation workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Hand interrupted jobs back to the queue without counting the attempt
+        for job_id in list(self._running):
+            await GenerationJob.find_one({"_id": PydanticObjectId(job_id), "status": "running"}).update(
+                {"$set": {"status": "queued", "updated_at": datetime.now()}, "$inc": {"attempts": -1}}
+            )
+        self._running.clear()
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                await self._recover_stale_jobs()
+                async for job in GenerationJob.find({"status": "queued"}).sort("created_at").limit(self.workers * 4):
+                    self._enqueue(str(job.id))
+            except Exception as e:
+                logger.error(f"Error polling generation jobs: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _recover_stale_jobs(self):
+        now = datetime.now()
+        stale = {"status": "running", "heartbeat_at": {"$lt": now - timedelta(seconds=GENERATION_JOB_STALE_SECONDS)}}
+        await GenerationJob.find({**stale, "attempts": {"$gte": GENERATION_JOB_MAX_ATTEMPTS}}).update(
+            {
+                "$set": {
+                    "status": "failed",
+                    "error": "The generation was interrupted",
+                    "finished_at": now,
+                    "updated_at": now,
+                }
+            }
+        )
+        await GenerationJob.find({**stale, "attempts": {"$lt": GENERATION_JOB_MAX_ATTEMPTS}}).update(
+            {"$set": {"status": "queued", "updated_at": now}}
+        )
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Error running generation job {job_id}: {str(e)}")
+
+    async def _run(self, job_id: str):
+        now = datetime.now()
+        job = await GenerationJob.find_one({"_id": PydanticObjectId(job_id), "status": "queued"}).update(
+            {"$set": {"status": "running", "heartbeat_at": now, "updated_at": now}, "$inc": {"attempts": 1}},
+            response_type=UpdateResponse.NEW_DOCUMENT,
+        )
+        if job is None:
+            # Claimed by another process or no longer queued
+            return
+
+        self._running[job_id] = job
+        self._notify(job_id)
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await self._generate(job)
+        except Exception as e:
+            logger.error(f"Generation job {job_id} failed: {str(e)}")
+            await self._finish(job, "failed", error=getattr(e, "detail", None) or str(e))
+        finally:
+            heartbeat.cancel()
+            self._running.pop(job_id, None)
+
+    async def _generate(self, job: GenerationJob):
+        request_data = ChatRequest(**job.request)
+        project = await Project.find_one({"_id": ObjectId(job.project_id)})
+        if not project:
+            await self._finish(job, "failed", error="Project not found")
+            return
+
+        # Always streamed, files are extracted while the llm is still writing
+        options = AgentOptions(
+            **{**(request_data.options.model_dump() if request_data.options else {}), "streaming": True}
+        )
+        agent = AgentFactory.get_agent(
+            AgentType.PROJECT_GENERATOR, request_data.langfuse_session_id or str(uuid.uuid4()), job.user_id
+        )
+        generator_response = await agent.chat(
+            message=request_data.message,
+            history=request_data.history,
+            model=request_data.model,
+            options=options,
+            project=request_data.project,
+            json_mode=True,
+        )
+
+        async for event, data in generate_project(project, request_data, generator_response):
+            if event == "file":
+                job.files = data["files"]
+                self._notify(str(job.id))
+            elif event == "done":
+                await self._finish(job, "completed", result=jsonable_encoder(data["project"]))
+            else:
+                await self._finish(job, "failed", error=data["detail"])
+
+    async def _heartbeat(self, job: GenerationJob):
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                await GenerationJob.find_one({"_id": job.id, "status": "running"}).update(
+                    {"$set": {"files": job.files, "heartbeat_at": datetime.now()}}
+                )
+            except Exception as e:
+                logger.error(f"Error updating generation job {job.id}: {str(e)}")
+
+    async def _finish(
+        self, job: GenerationJob, status: str, result: Optional[dict] = None, error: Optional[str] = None
+    ):
+        now = datetime.now()
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = now
+        job.updated_at = now
+        await GenerationJob.find_one({"_id": job.id}).update(
+            {
+                "$set": {
+                    "status": status,
+                    "files": job.files,
+                    "result": result,
+                    "error": error,
+                    "finished_at": now,
+                    "updated_at": now,
+                }
+            }
+        )
+        if status == "completed":
+            self.completed += 1
+        else:
+            self.failed += 1
+        self._notify(str(job.id))
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "running": len(self._running),
+            "completed": self.completed,
+            "failed": self.failed,
+            "deduplicated": self.deduplicated,
+        }
+
+
+generation_job_queue = GenerationJobQueue()
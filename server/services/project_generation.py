@@ -0,0 +1,116 @@
+import json
+import re
+import traceback
+from typing import AsyncIterator, Tuple
+
+from config.logger import logger
+from dtos.agent import ChatRequest
+from fastapi.responses import StreamingResponse
+from models.project import Project
+from services.project_store import ProjectStore, project_store
+from services.s3_service import s3_service
+from services.zip_service import CodeArchiveWriter
+from utils.json_stream import StructureStreamParser
+
+
+def prepare_structure_item(item: dict, database_name: str):
+    """Rename database env vars to the project's database and drop .env files returned by the llm."""
+    if item.get("type") == "file" and item.get("path") == ".env":
+        return None
+
+    content = json.dumps(item)
+    content = content.replace("MONGODB_URI", f"{database_name.upper()}_DATABASE_URL")
+    content = content.replace("POSTGRES_URI", f"{database_name.upper()}_DATABASE_URL")
+    return json.loads(content)
+
+
+def parse_project_structure(project_structure: str):
+    json_patterns = [
+        r"```json\n(.*?)\n```",
+        r"```\n(.*?)\n```",
+        r"\{.*\}",
+    ]
+
+    for pattern in json_patterns:
+        json_match = re.search(pattern, project_structure, re.DOTALL)
+        if json_match:
+            try:
+                # Try to get the first group, if it exists
+                group_content = json_match.group(1) if len(json_match.groups()) > 0 else json_match.group(0)
+                return json.loads(group_content)
+            except json.JSONDecodeError:
+                continue
+
+    return None
+
+
+async def store_generated_project(project: Project, request_data: ChatRequest, writer: CodeArchiveWriter):
+    writer.close()
+    project_folder = request_data.project.projectId
+
+    try:
+        # The spooled artifacts are streamed to the store, never read into memory as a whole
+        files = {
+            "code/code.zip": writer.code_zip,
+            "structure/project.json": writer.structure_json,
+        }
+
+        manifest = await project_store.get_manifest(project_folder)
+        # Check if conversation.jsonl exists from backend requirements
+        if "history/conversation.jsonl" not in manifest.files:
+            # Only create new conversation.jsonl if it doesn't exist
+            messages = [
+                {"role": "user", "content": request_data.message},
+            ]
+            files["history/conversation.jsonl"] = "\n".join(json.dumps(msg) for msg in messages).encode()
+
+        manifest = await project_store.put_files(project_folder, files, manifest=manifest)
+        # Cleared before the rebuild, so a write that lands meanwhile marks it outdated again
+        await project.set({Project.s3_folder_name: project_folder, Project.archive_outdated: False})
+        # The generated project is downloaded right after, so build the archive now from the files at hand
+        await project_store.materialize_archive(
+            project_folder, blobs={manifest.files[path]: data for path, data in files.items()}
+        )
+    finally:
+        writer.discard()
+
+    # Marks the project as generated in the project list
+    await project.set({Project.s3_presigned_url: s3_service.get_file_url(ProjectStore.archive_key(project_folder))})
+    return project
+
+
+async def generate_project(
+    project: Project, request_data: ChatRequest, generator_response: StreamingResponse
+) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Extract files while the llm streams and store the project once it is complete.
+
+    Yields `("file", ...)` for every written file, then either `("done", {"project": ...})`
+    or `("error", {"detail": ...})`.
+    """
+    parser = StructureStreamParser()
+    writer = CodeArchiveWriter()
+    database_name = project.database_name.replace("-", "_")
+
+    try:
+        async for chunk in generator_response.body_iterator:
+            for item in parser.feed(chunk):
+                item = prepare_structure_item(item, database_name)
+                if item is None:
+                    continue
+                for path in writer.add_item(item):
+                    yield "file", {"path": path, "files": writer.files}
+
+        if not parser.started or writer.files == 0:
+            writer.discard()
+            yield "error", {"detail": "Could not find valid JSON structure in the response. Please try again."}
+            return
+
+        project = await store_generated_project(project, request_data, writer)
+        yield "done", {"project": project}
+
+    except Exception as e:
+        writer.discard()
+        logger.error(f"Error in project generator stream: {str(e)}")
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        yield "error", {"detail": f"Error generating project: {str(e)}"}
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import tempfile
+import zipfile
+from typing import IO, Dict, Optional, Union
+
+from config.logger import logger
+from pydantic import BaseModel, PrivateAttr
+from services.s3_service import PreconditionFailed, s3_service
+from services.zip_service import COPY_CHUNK_SIZE, SPOOL_MAX_SIZE, ProjectArchiveBuilder
+
+# File content, either in memory or as a file object that is streamed
+Blob = Union[bytes, IO[bytes]]
+# Conditional manifest writes retried against concurrent writers before giving up
+MANIFEST_WRITE_ATTEMPTS = 5
+
+
+class ProjectManifest(BaseModel):
+    """Maps every project path to the hash of its content object."""
+
+    files: Dict[str, str] = {}
+    # The files the current project.zip was built from
+    archive: Dict[str, str] = {}
+    # ETag of the stored manifest this one was read from, None if it does not exist yet
+    _etag: Optional[str] = PrivateAttr(None)
+
+    @property
+    def archive_outdated(self) -> bool:
+        return self.files != self.archive
+
+
+def content_hash(data: Union[bytes, IO[bytes]]) -> str:
+    """Hash bytes or a file object, file objects are hashed in chunks and rewound."""
+    if isinstance(data, bytes):
+        return hashlib.sha256(data).hexdigest()
+    digest = hashlib.sha256()
+    data.seek(0)
+    for chunk in iter(lambda: data.read(COPY_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    data.seek(0)
+    return digest.hexdigest()
+
+
+class ProjectStore:
+    """
+    Content-addressed storage for project files.
+
+    Each file lives in S3 as `{folder}/objects/{sha256}` and a small manifest maps
+    project paths to hashes, so updating a file costs one object PUT plus the
+    manifest. `project.zip` is only rebuilt when somebody asks for it, copying
+    the members that did not change from the previous archive.
+
+    The manifest is only replaced while it still has the ETag it was read with.
+    A writer that loses against a concurrent one reads it again and reapplies
+    its change, so no update is lost.
+    """
+
+    @staticmethod
+    def manifest_key(folder: str) -> str:
+        return f"{folder}/manifest.json"
+
+    @staticmethod
+    def object_key(folder: str, digest: str) -> str:
+        return f"{folder}/objects/{digest}"
+
+    @staticmethod
+    def archive_key(folder: str) -> str:
+        return f"{folder}/project.zip"
+
+    async def get_manifest(self, folder: str) -> ProjectManifest:
+        if await s3_service.object_exists(self.manifest_key(folder)):
+            data, etag = await s3_service.get_object_with_etag(self.manifest_key(folder))
+            manifest = ProjectManifest.model_validate_json(data)
+            manifest._etag = etag
+            return manifest
+        if await s3_service.object_exists(self.archive_key(folder)):
+            return await self._import_archive(folder)
+        return ProjectManifest()
+
+    async def put_files(
+        self, folder: str, files: Dict[str, Blob], manifest: Optional[ProjectManifest] = None
+    ) -> ProjectManifest:
+        """
+        Store the given files and record them in the manifest, the archive is not touched.
+
+        File objects are uploaded from their current content without being read into memory.
+        """
+        digests = {path: content_hash(data) for path, data in files.items()}
+        stored = set()
+        for _ in range(MANIFEST_WRITE_ATTEMPTS):
+            if manifest is None:
+                manifest = await self.get_manifest(folder)
+
+            changed = False
+            for path, digest in digests.items():
+                if manifest.files.get(path) == digest:
+                    continue
+                if digest not in stored:
+                    await self._put_blob(self.object_key(folder, digest), files[path])
+                    stored.add(digest)
+                manifest.files[path] = digest
+                changed = True
+
+            if not changed or await self._save_manifest(folder, manifest):
+                return manifest
+            manifest = None
+        raise PreconditionFailed(self.manifest_key(folder))
+
+    async def put_structure(self, folder: str, data_json: dict) -> ProjectManifest:
+        """Store the files of a `{"structure": [...]}` document."""
+        files = {}
+        for item in data_json["structure"]:
+            if item["type"] == "file":
+                content = item["content"]
+                if isinstance(content, dict):
+                    content = json.dumps(content, indent=2)
+                files[item["path"].replace("./", "")] = str(content).encode()
+        return await self.put_files(folder, files)
+
+    async def materialize_archive(self, folder: str, blobs: Optional[Dict[str, Blob]] = None) -> ProjectManifest:
+        """
+        Rebuild project.zip from the manifest if it is out of date.
+
+        `blobs` maps hashes to content the caller already holds, so freshly
+        written files do not have to be downloaded again.
+        """
+        blobs = blobs or {}
+        for _ in range(MANIFEST_WRITE_ATTEMPTS):
+            manifest = await self.get_manifest(folder)
+            if not manifest.archive_outdated:
+                return manifest
+
+            await self._build_archive(folder, manifest, blobs)
+            manifest.archive = dict(manifest.files)
+            if await self._save_manifest(folder, manifest):
+                logger.info(f"Materialized project archive for {folder}")
+                return manifest
+        raise PreconditionFailed(self.manifest_key(folder))
+
+    async def _build_archive(self, folder: str, manifest: ProjectManifest, blobs: Dict[str, Blob]):
+        base_archive = None
+        if manifest.archive:
+            base_archive = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            await s3_service.download_fileobj(self.archive_key(folder), base_archive)
+            base_archive.seek(0)
+
+        builder = ProjectArchiveBuilder(base_archive)
+        try:
+            for path, digest in manifest.files.items():
+                if manifest.archive.get(path) == digest:
+                    continue
+                data = blobs.get(digest)
+                if data is None:
+                    data = await s3_service.get_object(self.object_key(folder, digest))
+                # Nested archives are already compressed
+                compress_type = zipfile.ZIP_STORED if path.endswith(".zip") else zipfile.ZIP_DEFLATED
+                if isinstance(data, bytes):
+                    builder.add_bytes(path, data, compress_type=compress_type)
+                else:
+                    data.seek(0)
+                    builder.add_fileobj(path, data, compress_type=compress_type)
+
+            for path in manifest.archive:
+                if path not in manifest.files:
+                    builder.drop(path)
+
+            await s3_service.upload_fileobj(builder.finish(), self.archive_key(folder))
+        finally:
+            builder.discard()
+
+    async def _import_archive(self, folder: str) -> ProjectManifest:
+        """Create the manifest of a project that was stored as a single zip."""
+        manifest = ProjectManifest()
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as archive:
+            await s3_service.download_fileobj(self.archive_key(folder), archive)
+            archive.seek(0)
+            with zipfile.ZipFile(archive, "r") as zipf:
+                for info in zipf.infolist():
+                    if info.is_dir():
+                        continue
+                    data = zipf.read(info)
+                    digest = content_hash(data)
+                    await s3_service.put_object(self.object_key(folder, digest), data)
+                    manifest.files[info.filename] = digest
+
+        manifest.archive = dict(manifest.files)
+        if not await self._save_manifest(folder, manifest):
+            # Another request imported it first
+            return await self.get_manifest(folder)
+        logger.info(f"Imported project archive for {folder} into the project store")
+        return manifest
+
+    @staticmethod
+    async def _put_blob(key: str, data: Blob):
+        if isinstance(data, bytes):
+            await s3_service.put_object(key, data)
+            return
+        data.seek(0)
+        await s3_service.upload_fileobj(data, key)
+
+    async def _save_manifest(self, folder: str, manifest: ProjectManifest) -> bool:
+        """Write the manifest unless it changed since it was read, returns False if it did."""
+        try:
+            manifest._etag = await s3_service.put_object(
+                self.manifest_key(folder),
+                manifest.model_dump_json().encode(),
+                content_type="application/json",
+                if_match=manifest._etag,
+                if_none_match="*" if manifest._etag is None else None,
+            )
+        except PreconditionFailed:
+            logger.warning(f"Manifest of {folder} changed concurrently, retrying")
+            return False
+        return True
+
+
+project_store = ProjectStore()
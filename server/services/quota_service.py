@@ -0,0 +1,131 @@
+import asyncio
+from typing import Dict, Optional, Tuple
+
+from beanie import PydanticObjectId, UpdateResponse
+from config.env_handler import QUOTA_FLUSH_SECONDS
+from config.logger import logger
+from models.user import User
+
+
+class QuotaService:
+    """
+    Token quota accounting on `User.token_usage`.
+
+    By default every charge is a single conditional `$inc` that only matches
+    while the new usage stays below the subscription's `max_tokens`, so
+    concurrent requests can never lose an update or overshoot the quota.
+
+    With `flush_interval` set, charges are admitted against the usage read at
+    the last flush and accumulated in memory, then written with one `$inc` per
+    user every `flush_interval` seconds. Other workers' charges are only seen
+    after a flush, so the quota may be overshot by what they admit in between.
+    """
+
+    def __init__(self, flush_interval: int = QUOTA_FLUSH_SECONDS):
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, int] = {}
+        # user_id -> (token_usage, max_tokens) as of the last read
+        self._known: Dict[str, Tuple[int, int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.charges = 0
+        self.rejections = 0
+        self.flushes = 0
+
+    @property
+    def batched(self) -> bool:
+        return self.flush_interval > 0
+
+    async def charge(self, user_id: str, amount: int) -> bool:
+        """Add `amount` tokens to the user's usage, returns False if that would reach the quota."""
+        if self.batched:
+            charged = await self._charge_batched(str(user_id), amount)
+        else:
+            charged = await self._charge_atomic(str(user_id), amount)
+        if charged:
+            self.charges += 1
+        else:
+            self.rejections += 1
+        return charged
+
+    async def add_usage(self, user_id: str, amount: int):
+        """Add usage that was already spent, unlike `charge` this never rejects."""
+        user_id = str(user_id)
+        if self.batched:
+            self._pending[user_id] = self._pending.get(user_id, 0) + amount
+            return
+        await User.find_one({"_id": PydanticObjectId(user_id)}).update({"$inc": {"token_usage": amount}})
+
+    async def _charge_atomic(self, user_id: str, amount: int) -> bool:
+        user = await User.find_one(
+            {
+                "_id": PydanticObjectId(user_id),
+                "$expr": {"$lt": [{"$add": ["$token_usage", amount]}, "$subscription.max_tokens"]},
+            }
+        ).update({"$inc": {"token_usage": amount}}, response_type=UpdateResponse.NEW_DOCUMENT)
+        return user is not None
+
+    async def _charge_batched(self, user_id: str, amount: int) -> bool:
+        known = self._known.get(user_id)
+        if known is None:
+            user = await User.get(PydanticObjectId(user_id))
+            if not user:
+                return False
+            known = self._known[user_id] = (user.token_usage, user.subscription["max_tokens"])
+
+        token_usage, max_tokens = known
+        pending = self._pending.get(user_id, 0)
+        if token_usage + pending + amount >= max_tokens:
+            return False
+        self._pending[user_id] = pending + amount
+        return True
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        # Users without charges are read again on their next one, picking up subscription changes
+        known = {}
+        for user_id, amount in pending.items():
+            try:
+                user = await User.find_one({"_id": PydanticObjectId(user_id)}).update(
+                    {"$inc": {"token_usage": amount}}, response_type=UpdateResponse.NEW_DOCUMENT
+                )
+            except Exception as e:
+                logger.error(f"Error flushing token usage for user {user_id}: {str(e)}")
+                self._pending[user_id] = self._pending.get(user_id, 0) + amount
+                known[user_id] = self._known.get(user_id)
+                continue
+            if user:
+                known[user_id] = (user.token_usage, user.subscription["max_tokens"])
+        self._known = {user_id: value for user_id, value in known.items() if value is not None}
+        self.flushes += 1
+
+    def stats(self) -> dict:
+        return {
+            "mode": "batched" if self.batched else "atomic",
+            "charges": self.charges,
+            "rejections": self.rejections,
+            "pending_users": len(self._pending),
+            "pending_tokens": sum(self._pending.values()),
+            "flushes": self.flushes,
+        }
+
+    async def start(self):
+        if self.batched:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._pending:
+            await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing token usage: {str(e)}")
+
+
+quota_service = QuotaService()
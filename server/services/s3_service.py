@@ -1,94 +1,277 @@
-import os
-import uuid
-import zipfile
-from pathlib import Path
+import asyncio
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Optional, Tuple
 
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
 from config.env_handler import (
     AWS_ACCESS_KEY_ID,
     AWS_BUCKET_NAME,
+    AWS_ENDPOINT_URL,
     AWS_REGION,
     AWS_SECRET_ACCESS_KEY,
+    PRESIGNED_URL_CACHE_SIZE,
+    PRESIGNED_URL_REFRESH_MARGIN,
+    S3_MAX_POOL_CONNECTIONS,
+    S3_MULTIPART_CHUNK_SIZE,
+    S3_MULTIPART_CONCURRENCY,
 )
+from config.logger import logger
+
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class PreconditionFailed(Exception):
+    """A conditional write lost against a concurrent writer of the same object."""
+
+
+class _BorrowedFile:
+    """Hands a file object to boto3 without letting the transfer close it, the caller still owns it."""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+    def close(self):
+        pass
+
+
+class PresignedUrlCache:
+    """LRU cache of presigned URLs that hands a URL out until shortly before it expires."""
+
+    def __init__(self, max_size: int = PRESIGNED_URL_CACHE_SIZE, refresh_margin: int = PRESIGNED_URL_REFRESH_MARGIN):
+        self.max_size = max_size
+        self.refresh_margin = refresh_margin
+        self._urls: OrderedDict = OrderedDict()
+
+    def get(self, key: str, expires_in: int) -> Optional[str]:
+        entry = self._urls.get((key, expires_in))
+        if entry is None:
+            return None
+        url, expires_at = entry
+        if time.monotonic() >= expires_at - min(self.refresh_margin, expires_in / 2):
+            del self._urls[(key, expires_in)]
+            return None
+        self._urls.move_to_end((key, expires_in))
+        return url
+
+    def put(self, key: str, expires_in: int, url: str):
+        self._urls[(key, expires_in)] = (url, time.monotonic() + expires_in)
+        self._urls.move_to_end((key, expires_in))
+        while len(self._urls) > self.max_size:
+            self._urls.popitem(last=False)
 
 
 class S3Service:
-    s3_client: boto3.client
+    """
+    Application-wide object storage access.
+
+    One pooled boto3 client is created in the lifespan and shared by every
+    request. Blocking calls run in worker threads so they never stall the event
+    loop, large uploads go through concurrent multipart transfers.
+    """
+
     bucket_name: str
 
     def __init__(self):
-        self.s3_client = boto3.client(
+        self._s3_client = None
+        self.bucket_name = AWS_BUCKET_NAME
+        self.url_cache = PresignedUrlCache()
+        self.transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_CHUNK_SIZE,
+            multipart_chunksize=S3_MULTIPART_CHUNK_SIZE,
+            max_concurrency=S3_MULTIPART_CONCURRENCY,
+        )
+
+    def initialize(self):
+        if self._s3_client is not None:
+            return
+        self._s3_client = boto3.session.Session().client(
             "s3",
             aws_access_key_id=AWS_ACCESS_KEY_ID,
             aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
             region_name=AWS_REGION,
+            endpoint_url=AWS_ENDPOINT_URL,
+            config=Config(max_pool_connections=S3_MAX_POOL_CONNECTIONS, retries={"mode": "standard"}),
         )
-        self.bucket_name = AWS_BUCKET_NAME
+        logger.info("S3 client initialized")
+
+    def close(self):
+        if self._s3_client is not None:
+            self._s3_client.close()
+            self._s3_client = None
+
+    @property
+    def s3_client(self):
+        # Scripts and tests may use the service without the app lifespan
+        if self._s3_client is None:
+            self.initialize()
+        return self._s3_client
 
     def get_file_url(self, key: str, expires_in: int = 3600):
-        return self.s3_client.generate_presigned_url(
-            "get_object", Params={"Bucket": self.bucket_name, "Key": key}, ExpiresIn=expires_in
+        url = self.url_cache.get(key, expires_in)
+        if url is None:
+            url = self.s3_client.generate_presigned_url(
+                "get_object", Params={"Bucket": self.bucket_name, "Key": key}, ExpiresIn=expires_in
+            )
+            self.url_cache.put(key, expires_in, url)
+        return url
+
+    async def upload_file(self, file_path: str, key: str):
+        await asyncio.to_thread(
+            self.s3_client.upload_file, file_path, self.bucket_name, key, Config=self.transfer_config
+        )
+
+    async def upload_fileobj(self, fileobj, key: str):
+        await asyncio.to_thread(
+            self.s3_client.upload_fileobj,
+            _BorrowedFile(fileobj),
+            self.bucket_name,
+            key,
+            Config=self.transfer_config,
         )
 
-    def upload_file(self, file_path: str, key: str):
-        self.s3_client.upload_file(file_path, self.bucket_name, key)
+    async def download_file(self, key: str, file_path: str):
+        await asyncio.to_thread(
+            self.s3_client.download_file, self.bucket_name, key, file_path, Config=self.transfer_config
+        )
 
-    def download_file(self, key: str, file_path: str):
-        self.s3_client.download_file(self.bucket_name, key, file_path)
+    async def download_fileobj(self, key: str, fileobj):
+        await asyncio.to_thread(
+            self.s3_client.download_fileobj, self.bucket_name, key, fileobj, Config=self.transfer_config
+        )
 
+    async def put_object(
+        self,
+        key: str,
+        body: bytes,
+        content_type: str = "application/octet-stream",
+        if_match: Optional[str] = None,
+        if_none_match: Optional[str] = None,
+    ) -> str:
+        """
+        Write an object and return its ETag.
 
-async def create_files_for_s3_json_content(data_json: dict, s3_folder_name: str):
-    temp_dir = Path("/tmp") / str(uuid.uuid4())
-    temp_dir.mkdir(parents=True, exist_ok=True)
+        `if_match` only replaces the object while it still has that ETag and
+        `if_none_match="*"` only creates it, otherwise PreconditionFailed is raised.
+        """
+        conditions = {}
+        if if_match is not None:
+            conditions["IfMatch"] = if_match
+        if if_none_match is not None:
+            conditions["IfNoneMatch"] = if_none_match
+        try:
+            response = await asyncio.to_thread(
+                self.s3_client.put_object,
+                Bucket=self.bucket_name,
+                Key=key,
+                Body=body,
+                ContentType=content_type,
+                **conditions,
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("PreconditionFailed", "ConditionalRequestConflict"):
+                raise PreconditionFailed(key) from e
+            raise
+        return response["ETag"]
 
-    # Download existing zip if it exists
-    s3_service = S3Service()
-    existing_zip_path = temp_dir / "existing.zip"
-    try:
-        s3_service.download_file(f"{s3_folder_name}/project.zip", str(existing_zip_path))
-    except Exception:
-        # If no existing zip, create an empty one
-        with zipfile.ZipFile(existing_zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-            pass
+    async def get_object(self, key: str) -> bytes:
+        body, _ = await self.get_object_with_etag(key)
+        return body
 
-    # Extract existing zip to temp directory
-    with zipfile.ZipFile(existing_zip_path, "r") as zipf:
-        zipf.extractall(temp_dir)
+    async def get_object_with_etag(self, key: str) -> Tuple[bytes, str]:
+        response = await asyncio.to_thread(self.s3_client.get_object, Bucket=self.bucket_name, Key=key)
+        return await asyncio.to_thread(response["Body"].read), response["ETag"]
 
-    # Add new files
-    for item in data_json["structure"]:
-        if item["type"] == "file":
-            file_path = temp_dir / item["path"].replace("./", "")
-            file_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(file_path, "w") as f:
-                f.write(item["content"])
+    async def object_exists(self, key: str) -> bool:
+        try:
+            await asyncio.to_thread(self.s3_client.head_object, Bucket=self.bucket_name, Key=key)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
 
-    # Create new zip with all files
-    zip_path = temp_dir / "project.zip"
-    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
-        for root, _, files in os.walk(temp_dir):
-            for file in files:
-                if file != "project.zip" and file != "existing.zip":
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, temp_dir)
-                    zipf.write(file_path, arcname)
+    async def stream_object(self, key: str, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Yield an object in chunks without holding it in memory."""
+        response = await asyncio.to_thread(self.s3_client.get_object, Bucket=self.bucket_name, Key=key)
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await asyncio.to_thread(body.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
 
-    return zip_path
+    async def put_stream(
+        self,
+        key: str,
+        chunks: AsyncIterator[bytes],
+        content_type: str = "application/octet-stream",
+    ):
+        """
+        Upload an async stream of chunks as a multipart upload.
 
+        Parts are cut at the multipart chunk size and up to the configured number
+        of them are uploaded concurrently while the stream is still being read.
+        """
+        upload = await asyncio.to_thread(
+            self.s3_client.create_multipart_upload, Bucket=self.bucket_name, Key=key, ContentType=content_type
+        )
+        upload_id = upload["UploadId"]
+        semaphore = asyncio.Semaphore(S3_MULTIPART_CONCURRENCY)
+        tasks = []
 
-async def upload_zip_to_s3(zip_path: str, s3_folder_name: str):
-    s3_service = S3Service()
-    s3_service.upload_file(file_path=zip_path, key=f"{s3_folder_name}/project.zip")
+        async def upload_part(part_number: int, body: bytes):
+            try:
+                response = await asyncio.to_thread(
+                    self.s3_client.upload_part,
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=body,
+                )
+                return {"ETag": response["ETag"], "PartNumber": part_number}
+            finally:
+                semaphore.release()
 
-    return s3_service.get_file_url(key=f"{s3_folder_name}/project.zip")
+        try:
+            buffer = bytearray()
+            async for chunk in chunks:
+                buffer.extend(chunk)
+                while len(buffer) >= S3_MULTIPART_CHUNK_SIZE:
+                    part = bytes(buffer[:S3_MULTIPART_CHUNK_SIZE])
+                    del buffer[:S3_MULTIPART_CHUNK_SIZE]
+                    # A part holds its slot until it is uploaded, reading waits for a free one
+                    await semaphore.acquire()
+                    tasks.append(asyncio.create_task(upload_part(len(tasks) + 1, part)))
+            if buffer or not tasks:
+                await semaphore.acquire()
+                tasks.append(asyncio.create_task(upload_part(len(tasks) + 1, bytes(buffer))))
 
+            parts = await asyncio.gather(*tasks)
+            await asyncio.to_thread(
+                self.s3_client.complete_multipart_upload,
+                Bucket=self.bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": list(parts)},
+            )
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.to_thread(
+                self.s3_client.abort_multipart_upload, Bucket=self.bucket_name, Key=key, UploadId=upload_id
+            )
+            raise
 
-async def download_from_s3(url: str) -> bytes:
-    """Download a file from S3 using a presigned URL and return its content as bytes."""
-    import aiohttp
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status != 200:
-                raise Exception(f"Failed to download from S3: {response.status}")
-            return await response.read()
+s3_service = S3Service()
@@ -0,0 +1,75 @@
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from config.env_handler import SESSION_CACHE_SIZE, SESSION_CACHE_TTL_SECONDS
+from models.active_session import ActiveSession
+
+
+class SessionCache:
+    """
+    Process-wide LRU/TTL cache of active sessions keyed by session token.
+
+    Entries live at most `ttl` seconds and never past the session's own expiry.
+    Other workers only see a logout once their entry times out, so the TTL
+    bounds how long a revoked session can keep working there.
+    """
+
+    def __init__(self, max_size: int = SESSION_CACHE_SIZE, ttl: int = SESSION_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._sessions: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, session_token: str) -> Optional[ActiveSession]:
+        entry = self._sessions.get(session_token)
+        if entry is None:
+            self.misses += 1
+            return None
+        session, cached_until = entry
+        if time.monotonic() >= cached_until:
+            del self._sessions[session_token]
+            self.misses += 1
+            return None
+        self._sessions.move_to_end(session_token)
+        self.hits += 1
+        return session
+
+    def put(self, session: ActiveSession):
+        ttl = min(self.ttl, (session.expire_at - datetime.now()).total_seconds())
+        if ttl <= 0:
+            return
+        self._sessions[session.session_token] = (session, time.monotonic() + ttl)
+        self._sessions.move_to_end(session.session_token)
+        while len(self._sessions) > self.max_size:
+            self._sessions.popitem(last=False)
+
+    def invalidate(self, session_token: str):
+        if self._sessions.pop(session_token, None) is not None:
+            self.invalidations += 1
+
+    def invalidate_user(self, user_id: str):
+        tokens = [token for token, (session, _) in self._sessions.items() if str(session.user_id) == str(user_id)]
+        for token in tokens:
+            self.invalidate(token)
+
+    def clear(self):
+        self.invalidations += len(self._sessions)
+        self._sessions.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._sessions),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saved_db_round_trips": self.hits,
+            "invalidations": self.invalidations,
+        }
+
+
+session_cache = SessionCache()
@@ -0,0 +1,82 @@
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from config.env_handler import REVOCATION_SYNC_SECONDS
+from config.logger import logger
+from models.revoked_token import RevokedToken
+
+
+class TokenRevocationList:
+    """
+    In-memory set of logged-out access tokens, shared across workers through Mongo.
+
+    Tokens are kept as short hashes until their own expiry. Revocations from other
+    workers are pulled in the background every `sync_interval` seconds, so
+    checking a token never needs a database round trip.
+    """
+
+    def __init__(self, sync_interval: int = REVOCATION_SYNC_SECONDS):
+        self.sync_interval = sync_interval
+        self._revoked: Dict[str, datetime] = {}
+        self._last_sync: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def token_hash(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+    def is_revoked(self, token: str) -> bool:
+        token_hash = self.token_hash(token)
+        expire_at = self._revoked.get(token_hash)
+        if expire_at is None:
+            return False
+        if expire_at < datetime.now():
+            # The token is expired anyway, the signature check rejects it from now on
+            del self._revoked[token_hash]
+            return False
+        return True
+
+    async def revoke(self, token: str, expire_at: datetime):
+        token_hash = self.token_hash(token)
+        self._revoked[token_hash] = expire_at
+        await RevokedToken(token_hash=token_hash, expire_at=expire_at, created_at=datetime.now()).insert()
+
+    async def sync(self):
+        now = datetime.now()
+        query = {"expire_at": {"$gt": now}}
+        if self._last_sync:
+            # Overlap the previous window so inserts racing the last sync are not missed
+            query["created_at"] = {"$gte": self._last_sync - timedelta(seconds=self.sync_interval)}
+        async for revoked in RevokedToken.find(query):
+            self._revoked[revoked.token_hash] = revoked.expire_at
+        self._last_sync = now
+        self._revoked = {token_hash: expire_at for token_hash, expire_at in self._revoked.items() if expire_at > now}
+
+    def stats(self) -> dict:
+        return {
+            "revoked_tokens": len(self._revoked),
+            "last_sync": self._last_sync.isoformat() if self._last_sync else None,
+        }
+
+    async def start(self):
+        await self.sync()
+        logger.info(f"Loaded {len(self._revoked)} revoked tokens")
+        self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.error(f"Error syncing revoked tokens: {str(e)}")
+
+
+token_revocation_list = TokenRevocationList()
@@ -0,0 +1,63 @@
+import asyncio
+from typing import Dict, Optional, Set
+
+from config.logger import logger
+from services.quota_service import quota_service
+
+
+class UsageMeter:
+    """
+    Collects the token usage reported by the LLM providers.
+
+    Before a call the agent reserves its local estimate through the quota
+    service, once the provider reports the real prompt and completion tokens
+    the difference is written to `User.token_usage` in the background, so the
+    response is never held up by the accounting.
+    """
+
+    def __init__(self):
+        self._tasks: Set[asyncio.Task] = set()
+        self.calls = 0
+        self.estimated_tokens = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.models: Dict[str, Dict[str, int]] = {}
+
+    def record(self, user_id: Optional[str], model: str, input_tokens: int, output_tokens: int, reserved: int = 0):
+        self.calls += 1
+        self.estimated_tokens += reserved
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        model_usage = self.models.setdefault(model, {"calls": 0, "input_tokens": 0, "output_tokens": 0})
+        model_usage["calls"] += 1
+        model_usage["input_tokens"] += input_tokens
+        model_usage["output_tokens"] += output_tokens
+
+        correction = input_tokens + output_tokens - reserved
+        if user_id and correction:
+            task = asyncio.create_task(self._write(user_id, correction))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, user_id: str, amount: int):
+        try:
+            await quota_service.add_usage(user_id, amount)
+        except Exception as e:
+            logger.error(f"Error recording token usage for user {user_id}: {str(e)}")
+
+    async def drain(self):
+        """Wait for the usage writes still in flight."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "estimated_tokens": self.estimated_tokens,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "models": self.models,
+        }
+
+
+usage_meter = UsageMeter()
@@ -0,0 +1,171 @@
+import copy
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zipfile
+from typing import IO, Optional
+
+# Keep small projects in memory, spill larger ones to disk
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
+
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+LOCAL_HEADER_SIZE = 30
+DATA_DESCRIPTOR_FLAG = 0x08
+ZIP64_EXTRA_ID = 0x0001
+
+
+class CodeArchiveWriter:
+    """
+    Writes generated structure items straight into `code.zip` while they arrive.
+
+    The `structure/project.json` document is written alongside it, item by item,
+    so neither the archive nor the JSON has to be held in memory as a whole.
+    """
+
+    def __init__(self):
+        self.code_zip = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        self.structure_json = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        self._zipf = zipfile.ZipFile(self.code_zip, "w", zipfile.ZIP_DEFLATED)
+        self.structure_json.write(b'{\n  "structure": [')
+        self.items = 0
+        self.files = 0
+
+    def add_item(self, item: dict) -> list[str]:
+        """Add one top-level structure item and return the paths of the files it wrote."""
+        self.structure_json.write((("," if self.items else "") + "\n    " + json.dumps(item)).encode())
+        self.items += 1
+        return self._write(item)
+
+    def _write(self, item: dict) -> list[str]:
+        if item["type"] == "file":
+            arcname = item["path"].replace("./", "")
+            if isinstance(item["content"], dict):
+                content = json.dumps(item["content"], indent=2)
+            else:
+                content = str(item["content"])
+            self._zipf.writestr(arcname, content)
+            self.files += 1
+            return [arcname]
+
+        written = []
+        if item["type"] == "directory" and isinstance(item.get("content"), list):
+            for child in item["content"]:
+                written.extend(self._write(child))
+        return written
+
+    def close(self):
+        """Finish both documents and rewind them so they can be read back."""
+        self._zipf.close()
+        self.structure_json.write(b"\n  ]\n}\n")
+        self.code_zip.seek(0)
+        self.structure_json.seek(0)
+
+    def discard(self):
+        self.code_zip.close()
+        self.structure_json.close()
+
+
+def _strip_zip64_extra(extra: bytes) -> bytes:
+    """Drop the zip64 extra record, the target archive writes its own when it needs one."""
+    stripped = b""
+    offset = 0
+    while offset + 4 <= len(extra):
+        header_id, size = struct.unpack("<HH", extra[offset : offset + 4])
+        if header_id != ZIP64_EXTRA_ID:
+            stripped += extra[offset : offset + 4 + size]
+        offset += 4 + size
+    return stripped
+
+
+class ProjectArchiveBuilder:
+    """
+    Builds a new project archive on top of an existing one without extracting it.
+
+    New entries are written as they are added; on `finish()` every member of the
+    base archive that was not replaced is copied over as raw compressed bytes, so
+    unchanged files are never decompressed or recompressed.
+    """
+
+    def __init__(self, base_archive: Optional[IO[bytes]] = None):
+        self._base = zipfile.ZipFile(base_archive, "r") if base_archive is not None else None
+        self.archive = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        self._target = zipfile.ZipFile(self.archive, "w", zipfile.ZIP_DEFLATED)
+        self._written = set()
+        self._dropped = set()
+
+    def has(self, name: str) -> bool:
+        if name in self._dropped:
+            return False
+        if name in self._written:
+            return True
+        return self._base is not None and name in self._base.NameToInfo
+
+    def add_bytes(self, name: str, data: bytes, compress_type: int = zipfile.ZIP_DEFLATED):
+        self._target.writestr(name, data, compress_type=compress_type)
+        self._written.add(name)
+
+    def add_fileobj(self, name: str, fileobj: IO[bytes], compress_type: int = zipfile.ZIP_DEFLATED):
+        """Stream a file object into the archive, archives should be added with ZIP_STORED."""
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = compress_type
+        info.external_attr = 0o644 << 16
+        with self._target.open(info, "w") as dest:
+            shutil.copyfileobj(fileobj, dest, COPY_CHUNK_SIZE)
+        self._written.add(name)
+
+    def drop(self, name: str):
+        """Leave a base member out of the new archive."""
+        self._dropped.add(name)
+
+    def finish(self) -> IO[bytes]:
+        """Copy the untouched base members and return the rewound archive."""
+        if self._base is not None:
+            for info in self._base.infolist():
+                if info.filename not in self._written and info.filename not in self._dropped:
+                    self._copy_raw_member(info)
+            self._base.close()
+        self._target.close()
+        self.archive.seek(0)
+        return self.archive
+
+    def discard(self):
+        if self._base is not None:
+            self._base.close()
+        self.archive.close()
+
+    def _copy_raw_member(self, info: zipfile.ZipInfo):
+        # Appends through ZipFile internals, tests/test_zip_service.py checks the result stays a valid archive
+        source = self._base.fp
+        source.seek(info.header_offset)
+        header = source.read(LOCAL_HEADER_SIZE)
+        if header[:4] != LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+        name_length, extra_length = struct.unpack("<HH", header[26:30])
+        source.seek(name_length + extra_length, os.SEEK_CUR)
+
+        # Sizes come from the central directory, so the copy never needs a data descriptor
+        copied = copy.copy(info)
+        copied.extra = _strip_zip64_extra(info.extra)
+        copied.flag_bits &= ~DATA_DESCRIPTOR_FLAG
+
+        target = self._target
+        target.fp.seek(target.start_dir)
+        copied.header_offset = target.fp.tell()
+        target.fp.write(copied.FileHeader())
+        remaining = info.compress_size
+        while remaining:
+            chunk = source.read(min(COPY_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Truncated member {info.filename}")
+            target.fp.write(chunk)
+            remaining -= len(chunk)
+
+        target.filelist.append(copied)
+        target.NameToInfo[copied.filename] = copied
+        target.start_dir = target.fp.tell()
+        target._didModify = True
+        self._written.add(info.filename)
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import pytest
+from data.value import random_email, random_string
+from httpx import AsyncClient
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest_asyncio
+from config.env_handler import API_URL, AUTH_MODE
+
+CONCURRENT_GENERATIONS = int(os.getenv("LOAD_TEST_CONCURRENT_GENERATIONS", 4))
+PROBE_REQUESTS = int(os.getenv("LOAD_TEST_PROBE_REQUESTS", 40))
+MAX_P95_SECONDS = float(os.getenv("LOAD_TEST_MAX_P95_SECONDS", 1.0))
+SESSION_CHECK_REQUESTS = int(os.getenv("LOAD_TEST_SESSION_CHECK_REQUESTS", 500))
+SESSION_CHECK_CONCURRENCY = int(os.getenv("LOAD_TEST_SESSION_CHECK_CONCURRENCY", 50))
+MAX_P99_SECONDS = float(os.getenv("LOAD_TEST_MAX_P99_SECONDS", 1.0))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+@pytest_asyncio.fixture
+async def client():
+    async with AsyncClient(base_url=API_URL, timeout=120) as client:
+        yield client
+
+
+@pytest_asyncio.fixture
+async def session_token(client):
+    register_data = {
+        "username": random_string(),
+        "email": random_email(),
+        "auth_provider": "email&password",
+        "password": random_string(),
+    }
+    response = await client.post("/auth/register", json=register_data)
+    assert response.status_code == 200
+    otp_code = response.json()["user"]["otp_code"]
+
+    response = await client.get(f"/auth/user/verify-otp?email={register_data['email']}&otp_code={otp_code}")
+    assert response.status_code == 200
+
+    response = await client.post(
+        "/auth/login", json={"email": register_data["email"], "password": register_data["password"]}
+    )
+    assert response.status_code == 200
+    return response.json()["session_token"]
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    response = await coro
+    return time.perf_counter() - start, response
+
+
+@pytest.mark.asyncio
+async def test_auth_and_project_latency_during_generations(client, session_token):
+    headers = {"Authorization": f"Bearer {session_token}"}
+
+    generations = [
+        asyncio.create_task(
+            client.post(
+                "/chat/enhance-prompt",
+                headers=headers,
+                json={
+                    "message": "A todo list API with users and tags",
+                    "agent": "enchant_user_prompt",
+                    "model": "gemini-2.0-flash",
+                    "options": {"streaming": False},
+                },
+            )
+        )
+        for _ in range(CONCURRENT_GENERATIONS)
+    ]
+
+    # Give the generations time to reach the provider before probing
+    await asyncio.sleep(0.5)
+
+    latencies = []
+    for i in range(PROBE_REQUESTS):
+        if i % 2 == 0:
+            latency, response = await timed(client.get("/auth/session/check", headers=headers))
+        else:
+            latency, response = await timed(client.get("/project/get-all", headers=headers))
+        assert response.status_code == 200
+        latencies.append(latency)
+
+    in_flight = sum(1 for task in generations if not task.done())
+    await asyncio.gather(*generations, return_exceptions=True)
+
+    p50 = statistics.median(latencies)
+    p95 = percentile(latencies, 95)
+    print(f"Probes: {len(latencies)}, generations in flight: {in_flight}, p50: {p50:.3f}s, p95: {p95:.3f}s")
+    assert p95 < MAX_P95_SECONDS
+
+
+@pytest.mark.asyncio
+async def test_session_check_p99(client, session_token):
+    """
+    Benchmark of the auth path, run it once against a server started with
+    AUTH_MODE=session and once with AUTH_MODE=jwt to compare both modes.
+    """
+    headers = {"Authorization": f"Bearer {session_token}"}
+    semaphore = asyncio.Semaphore(SESSION_CHECK_CONCURRENCY)
+
+    async def check():
+        async with semaphore:
+            latency, response = await timed(client.get("/auth/session/check", headers=headers))
+            assert response.status_code == 200
+            return latency
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(check() for _ in range(SESSION_CHECK_REQUESTS)))
+    elapsed = time.perf_counter() - start
+
+    p50 = statistics.median(latencies)
+    p99 = percentile(latencies, 99)
+    print(
+        f"Auth mode: {AUTH_MODE}, requests: {len(latencies)}, concurrency: {SESSION_CHECK_CONCURRENCY}, "
+        f"throughput: {len(latencies) / elapsed:.1f} req/s, p50: {p50:.4f}s, p99: {p99:.4f}s"
+    )
+    assert p99 < MAX_P99_SECONDS
@@ -0,0 +1,79 @@
+import io
+import os
+import sys
+
+import boto3
+import pytest
+from moto import mock_aws
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest_asyncio
+from config.env_handler import AWS_REGION
+from services.s3_service import PreconditionFailed, S3Service
+
+TEST_BUCKET = "bachelor-project-test"
+
+
+@pytest_asyncio.fixture
+async def s3():
+    with mock_aws():
+        boto3.client("s3", region_name=AWS_REGION).create_bucket(
+            Bucket=TEST_BUCKET, CreateBucketConfiguration={"LocationConstraint": AWS_REGION}
+        )
+        service = S3Service()
+        service.bucket_name = TEST_BUCKET
+        service.initialize()
+        yield service
+        service.close()
+
+
+async def chunked(data: bytes, size: int):
+    for offset in range(0, len(data), size):
+        yield data[offset : offset + size]
+
+
+@pytest.mark.asyncio
+async def test_put_and_get_object(s3):
+    await s3.put_object("project/manifest.json", b"{}", content_type="application/json")
+    assert await s3.object_exists("project/manifest.json")
+    assert not await s3.object_exists("project/missing.json")
+    assert await s3.get_object("project/manifest.json") == b"{}"
+
+
+@pytest.mark.asyncio
+async def test_shared_client_is_reused(s3):
+    client = s3.s3_client
+    await s3.put_object("a", b"a")
+    await s3.put_object("b", b"b")
+    assert s3.s3_client is client
+
+
+@pytest.mark.asyncio
+async def test_upload_fileobj_multipart(s3):
+    data = os.urandom(s3.transfer_config.multipart_threshold + 1024)
+    await s3.upload_fileobj(io.BytesIO(data), "project/project.zip")
+
+    target = io.BytesIO()
+    await s3.download_fileobj("project/project.zip", target)
+    assert target.getvalue() == data
+
+
+@pytest.mark.asyncio
+async def test_stream_put_and_get(s3):
+    data = os.urandom(2 * s3.transfer_config.multipart_chunksize + 12345)
+    await s3.put_stream("project/streamed.zip", chunked(data, 256 * 1024))
+
+    received = b"".join([chunk async for chunk in s3.stream_object("project/streamed.zip", chunk_size=64 * 1024)])
+    assert received == data
+
+
+@pytest.mark.asyncio
+async def test_conditional_put_object(s3):
+    etag = await s3.put_object("project/manifest.json", b"{}", if_none_match="*")
+    with pytest.raises(PreconditionFailed):
+        await s3.put_object("project/manifest.json", b"{}", if_none_match="*")
+
+    new_etag = await s3.put_object("project/manifest.json", b'{"files": {}}', if_match=etag)
+    with pytest.raises(PreconditionFailed):
+        await s3.put_object("project/manifest.json", b"{}", if_match=etag)
+    assert await s3.get_object_with_etag("project/manifest.json") == (b'{"files": {}}', new_etag)
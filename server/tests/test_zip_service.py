@@ -0,0 +1,73 @@
+import io
+import os
+import sys
+import zipfile
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.zip_service import DATA_DESCRIPTOR_FLAG, ProjectArchiveBuilder
+
+SOURCE = b"export const handler = async () => ({ statusCode: 200 });\n" * 200
+
+
+class UnseekableWriter:
+    """Makes zipfile write data descriptors, as archives streamed by other tools have."""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+    def flush(self):
+        pass
+
+
+def base_archive() -> io.BytesIO:
+    writer = UnseekableWriter()
+    with zipfile.ZipFile(writer, "w", zipfile.ZIP_DEFLATED) as zipf:
+        zipf.writestr("code/index.mjs", SOURCE)
+        zipf.writestr("code/package.json", b'{"name": "todo-api"}', compress_type=zipfile.ZIP_STORED)
+        zipf.writestr("code/old.mjs", b"export {};\n")
+        with zipf.open("code/large.mjs", "w", force_zip64=True) as dest:
+            dest.write(SOURCE)
+    return io.BytesIO(writer.buffer.getvalue())
+
+
+def test_raw_copied_members_round_trip():
+    base = base_archive()
+    with zipfile.ZipFile(base) as zipf:
+        base_infos = {info.filename: info for info in zipf.infolist()}
+    assert base_infos["code/index.mjs"].flag_bits & DATA_DESCRIPTOR_FLAG
+
+    builder = ProjectArchiveBuilder(base)
+    builder.add_bytes("code/package.json", b'{"name": "todo-api", "version": "1.0.0"}')
+    builder.add_bytes("structure/project.json", b"{}")
+    builder.drop("code/old.mjs")
+    archive = builder.finish()
+
+    with zipfile.ZipFile(archive) as zipf:
+        assert zipf.testzip() is None
+        assert sorted(zipf.namelist()) == [
+            "code/index.mjs",
+            "code/large.mjs",
+            "code/package.json",
+            "structure/project.json",
+        ]
+        for name in ("code/index.mjs", "code/large.mjs"):
+            info = zipf.getinfo(name)
+            # Copied as compressed bytes, not recompressed
+            assert info.compress_type == zipfile.ZIP_DEFLATED
+            assert info.compress_size == base_infos[name].compress_size
+            assert not info.flag_bits & DATA_DESCRIPTOR_FLAG
+            assert zipf.read(name) == SOURCE
+        assert zipf.read("code/package.json") == b'{"name": "todo-api", "version": "1.0.0"}'
+
+
+def test_builder_on_top_of_its_own_output():
+    first = ProjectArchiveBuilder(base_archive()).finish()
+    second = ProjectArchiveBuilder(first)
+    second.add_bytes("code/new.mjs", b"export {};\n")
+    with zipfile.ZipFile(second.finish()) as zipf:
+        assert zipf.testzip() is None
+        assert zipf.read("code/index.mjs") == SOURCE
+        assert zipf.read("code/new.mjs") == b"export {};\n"
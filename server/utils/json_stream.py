@@ -0,0 +1,118 @@
+import json
+import re
+from typing import Iterator, List
+
+STRUCTURE_START = re.compile(r'"structure"\s*:\s*\[')
+OUTSIDE_STRING = re.compile(r'[{}"]')
+INSIDE_STRING = re.compile(r'["\\]')
+
+# Enough to hold a `"structure" : [` prefix split across two chunks
+SEEK_TAIL = 64
+
+
+class StructureStreamParser:
+    """
+    Incrementally extracts the items of a `{"structure": [...]}` document.
+
+    Chunks are fed as they arrive from the LLM and every top-level entry of the
+    `structure` array is returned as soon as its closing brace is seen. Only the
+    entry currently being parsed is kept in memory.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._state = "seek"
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._item_start = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    @property
+    def started(self) -> bool:
+        return self._state != "seek"
+
+    def feed(self, chunk: str) -> List[dict]:
+        if self.done:
+            return []
+        self._buffer += chunk
+        return list(self._drain())
+
+    def _drain(self) -> Iterator[dict]:
+        while not self.done:
+            if self._state == "seek":
+                match = STRUCTURE_START.search(self._buffer)
+                if not match:
+                    self._buffer = self._buffer[-SEEK_TAIL:]
+                    return
+                self._buffer = self._buffer[match.end() :]
+                self._pos = 0
+                self._state = "array"
+
+            elif self._state == "array":
+                while self._pos < len(self._buffer) and self._buffer[self._pos] in " \t\r\n,":
+                    self._pos += 1
+                if self._pos >= len(self._buffer):
+                    self._buffer = ""
+                    self._pos = 0
+                    return
+                char = self._buffer[self._pos]
+                if char == "]":
+                    self._state = "done"
+                    self._buffer = ""
+                    return
+                if char != "{":
+                    raise ValueError(f"Unexpected character in structure array: {char!r}")
+                self._buffer = self._buffer[self._pos :]
+                self._pos = 0
+                self._item_start = 0
+                self._depth = 0
+                self._state = "item"
+
+            elif self._state == "item":
+                item_end = self._scan_item()
+                if item_end is None:
+                    return
+                item = json.loads(self._buffer[self._item_start : item_end])
+                self._buffer = self._buffer[item_end:]
+                self._pos = 0
+                self._state = "array"
+                yield item
+
+    def _scan_item(self):
+        """Advance through the current item, returning its end offset once the braces balance."""
+        buffer = self._buffer
+        while True:
+            if self._escaped:
+                if self._pos >= len(buffer):
+                    return None
+                self._escaped = False
+                self._pos += 1
+                continue
+            pattern = INSIDE_STRING if self._in_string else OUTSIDE_STRING
+            match = pattern.search(buffer, self._pos)
+            if not match:
+                self._pos = len(buffer)
+                return None
+            char = match.group(0)
+            self._pos = match.end()
+            if self._in_string:
+                if char == "\\":
+                    if self._pos >= len(buffer):
+                        self._escaped = True
+                        return None
+                    self._pos += 1
+                else:
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    return self._pos
@@ -1,11 +1,12 @@
 import random
 import string
+import uuid
 from datetime import datetime, timedelta
 from typing import Optional
 
 from config.env_handler import ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY
 from fastapi import HTTPException
-from jose import jwt
+from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=12)
@@ -25,17 +26,30 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    # The token id keeps two logins within the same second from producing the same token
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
 def decode_access_token(token: str):
+    """Verify the signature and expiry locally, no database lookup is involved."""
     try:
         decoded_token = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return decoded_token
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
+def get_token_expiration(token: str) -> Optional[datetime]:
+    """Read the expiry of a token without verifying it, used when revoking it."""
+    try:
+        claims = jwt.get_unverified_claims(token)
+    except JWTError:
+        return None
+    return datetime.fromtimestamp(claims["exp"]) if "exp" in claims else None
 
 
 def generate_random_password():
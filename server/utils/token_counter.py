@@ -0,0 +1,53 @@
+import asyncio
+from functools import lru_cache
+from typing import Dict
+
+from config.logger import logger
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - the estimate falls back to characters
+    tiktoken = None
+
+# Used for models tiktoken does not know, close enough for a pre-flight estimate
+DEFAULT_ENCODING = "o200k_base"
+ENCODINGS = ("o200k_base", "cl100k_base")
+CHARS_PER_TOKEN = 4
+
+# Filled at startup, tiktoken downloads an encoding the first time it is used
+_encodings: Dict[str, "tiktoken.Encoding"] = {}
+
+
+def _load_encodings():
+    for name in ENCODINGS:
+        try:
+            _encodings[name] = tiktoken.get_encoding(name)
+        except Exception as e:
+            logger.warning(f"Error loading the {name} encoding, its token counts are estimated: {str(e)}")
+
+
+async def load_encodings():
+    """Load the encodings off the event loop, count_tokens never downloads one itself."""
+    if tiktoken is None:
+        return
+    await asyncio.to_thread(_load_encodings)
+
+
+@lru_cache(maxsize=32)
+def _encoding_name(model: str) -> str:
+    if model.startswith("gpt"):
+        try:
+            return tiktoken.encoding_name_for_model(model)
+        except KeyError:
+            pass
+    return DEFAULT_ENCODING
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Estimate the number of tokens of `text` locally, without calling the provider."""
+    if not text:
+        return 0
+    encoding = _encodings.get(_encoding_name(model)) if tiktoken is not None else None
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))